@@ -0,0 +1,224 @@
+import collections
+import logging
+import threading
+import time
+
+from diagnostics import DIAG
+from pipeline import EventType
+from sinks import close_pool
+from webhooks import WebhookPool
+
+log = logging.getLogger("abuse")
+
+# Regla -> (descripcion, umbral por defecto "eventos/segundos")
+ABUSE_RULES = {
+    "joins_per_ip": ("entradas desde la IP", "6/60"),
+    "joins_per_user": ("entradas del jugador", "5/60"),
+    "names_per_ip": ("nombres distintos desde la IP", "3/300"),
+    "chat_per_user": ("lineas de chat del jugador", "6/5"),
+    "chat_per_game": ("lineas de chat en la partida", "25/10"),
+}
+
+
+def parse_threshold(value):
+    # "6/60" -> (6, 60.0): 6 eventos en 60 segundos; "" o "0" -> None (regla desactivada)
+    count, _, seconds = (value or "").partition("/")
+    count = int(count.strip() or 0)
+    if count <= 0:
+        return None
+    return count, float(seconds.strip() or 60)
+
+
+# ==========================
+#  VENTANAS DESLIZANTES
+# ==========================
+
+class RateWindow:
+    """``count`` eventos en ``seconds``: solo guarda los ``count`` ultimos instantes.
+
+    Se supera el umbral cuando el mas antiguo de esos ``count`` cae dentro
+    de la ventana: O(1) por evento y memoria fija por clave.
+    """
+
+    __slots__ = ("times",)
+
+    def __init__(self, count):
+        self.times = collections.deque(maxlen=count)
+
+    def add(self, now, count, seconds):
+        times = self.times
+        times.append(now)
+        return len(times) >= count and now - times[0] <= seconds
+
+    def last(self):
+        return self.times[-1]
+
+
+class DistinctWindow:
+    """Valores distintos (p.ej. nombres de una IP) vistos en los ultimos ``seconds``.
+
+    Cada valor cuenta una vez con su ultima aparicion; los caducados salen
+    por la izquierda (O(1) amortizado) y como mucho se guardan ``limit``.
+    """
+
+    __slots__ = ("seen", "limit")
+
+    def __init__(self, limit):
+        self.seen = collections.OrderedDict()
+        self.limit = limit
+
+    def add(self, now, value, count, seconds):
+        seen = self.seen
+        seen[value] = now
+        seen.move_to_end(value)
+        while seen:
+            oldest = next(iter(seen.values()))
+            if now - oldest <= seconds and len(seen) <= self.limit:
+                break
+            seen.popitem(last=False)
+        return len(seen) >= count
+
+    def last(self):
+        return next(reversed(self.seen.values()))
+
+
+# ==========================
+#  DETECTOR
+# ==========================
+
+class AbuseDetector:
+    """Etapa de enriquecimiento que detecta spam de entradas y flood de chat.
+
+    Mantiene ventanas deslizantes por IP, por jugador y por partida (todas
+    las de todos los bots en un solo indice, ordenado por ultimo uso: las
+    claves inactivas se expulsan por el principio y nunca hay mas de
+    ``max_keys``). Al superar un umbral marca ``ev.alert`` y avisa por log
+    y, si hay ``webhook``, por Discord; la misma clave no repite aviso
+    antes de ``cooldown`` segundos.
+    """
+
+    def __init__(self, thresholds, webhook=None, mention="", cooldown=60.0, max_keys=100000):
+        self.thresholds = {name: t for name, t in thresholds.items() if t}
+        self.cooldown = float(cooldown)
+        self.max_keys = max(1, int(max_keys))
+        self.mention = mention
+        self.horizon = max((s for _, s in self.thresholds.values()), default=0.0)
+        self.windows = collections.OrderedDict()
+        self.silenced = {}
+        self.alerts = collections.Counter()
+        self.evicted = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.pool = WebhookPool(webhook, name="abuse") if webhook else None
+        DIAG.register("abuse", self.stats)
+
+    def _window(self, rule, key, now):
+        # Devuelve la ventana de (regla, clave) y expulsa las que ya no sirven
+        windows = self.windows
+        wkey = (rule, key)
+        window = windows.get(wkey)
+        if window is None:
+            count = self.thresholds[rule][0]
+            window = DistinctWindow(count * 4) if rule == "names_per_ip" else RateWindow(count)
+            windows[wkey] = window
+        else:
+            windows.move_to_end(wkey)
+        while len(windows) > self.max_keys:
+            windows.popitem(last=False)
+            self.evicted += 1
+        # El principio es la clave usada hace mas tiempo: si ya caduco, fuera
+        for _ in range(2):
+            oldest_key, oldest = next(iter(windows.items()))
+            if oldest_key == wkey or now - oldest.last() <= self.horizon:
+                break
+            windows.popitem(last=False)
+        return window
+
+    def _hit(self, rule, key, now, value=None):
+        count, seconds = self.thresholds[rule]
+        window = self._window(rule, key, now)
+        if value is None:
+            return window.add(now, count, seconds)
+        return window.add(now, value, count, seconds)
+
+    def __call__(self, ev):
+        t = ev.type
+        if t == EventType.JOIN:
+            checks = []
+            if ev.ip:
+                checks.append(("joins_per_ip", ev.ip, None))
+                checks.append(("names_per_ip", ev.ip, ev.user.casefold() if ev.user else None))
+            if ev.user:
+                checks.append(("joins_per_user", ev.user.casefold(), None))
+        elif t == EventType.CHAT:
+            game = (ev.bot, ev.game)
+            checks = [("chat_per_game", game, None)]
+            if ev.user:
+                checks.append(("chat_per_user", (ev.bot, ev.game, ev.user.casefold()), None))
+        else:
+            return ev
+        now = ev.ts or time.time()
+        fired = []
+        with self.lock:
+            for rule, key, value in checks:
+                if rule not in self.thresholds or (rule == "names_per_ip" and value is None):
+                    continue
+                if self._hit(rule, key, now, value) and self.silenced.get((rule, key), 0.0) <= now:
+                    self.silenced[(rule, key)] = now + self.cooldown
+                    if len(self.silenced) > self.max_keys:
+                        self.silenced = {k: v for k, v in self.silenced.items() if v > now}
+                    self.alerts[rule] += 1
+                    fired.append((rule, key))
+        for rule, key in fired:
+            self.alert(ev, rule, key)
+        return ev
+
+    def describe(self, rule, key):
+        count, seconds = self.thresholds[rule]
+        if isinstance(key, tuple):
+            key = " / ".join(str(k) for k in key if k)
+        return f"{count}+ {ABUSE_RULES[rule][0]} {key} en {seconds:g}s"
+
+    def alert(self, ev, rule, key):
+        text = self.describe(rule, key)
+        if not ev.alert:
+            ev.alert = text
+        message = f"⚠️ Abuso [{ev.bot}] {ev.game or ''}: {text}"
+        log.warning(message)
+        if self.pool:
+            content = f"{self.mention} {message}".strip()
+            mentions = {"parse": ["everyone", "roles"]} if self.mention else {"parse": []}
+            # timeout=0: en plena avalancha de alertas el monitor no espera al webhook
+            if not self.pool.submit(rule, {"content": content[:2000], "allowed_mentions": mentions}, timeout=0):
+                self.dropped += 1
+                if self.dropped % 100 == 1:
+                    log.warning(f"Abuso: cola del webhook llena, alertas descartadas: {self.dropped}")
+
+    def stats(self):
+        return {"keys": len(self.windows), "evicted": self.evicted, "alerts": dict(self.alerts),
+                "dropped": self.dropped}
+
+    def close(self, timeout=5.0):
+        DIAG.unregister("abuse")
+        if self.pool:
+            close_pool(self.pool, timeout)
+
+
+def abuse_from_config(config):
+    # [ABUSE] enabled, joins_per_ip, joins_per_user, names_per_ip, chat_per_user, chat_per_game,
+    # webhook, mention, cooldown, max_keys
+    if config is None or config.get("ABUSE", "enabled", "false").lower() != "true":
+        return None
+    thresholds = {}
+    for rule, (_, default) in ABUSE_RULES.items():
+        try:
+            thresholds[rule] = parse_threshold(config.get("ABUSE", rule, default))
+        except ValueError:
+            log.error(f"[ABUSE] {rule}: valor no valido (formato eventos/segundos)")
+    return AbuseDetector(
+        thresholds,
+        webhook=config.get("ABUSE", "webhook", "") or None,
+        mention=config.get("ABUSE", "mention", ""),
+        cooldown=config.get("ABUSE", "cooldown", "60"),
+        max_keys=config.get("ABUSE", "max_keys", "100000"),
+    )
@@ -0,0 +1,189 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(threadName)s] %(name)s: %(message)s"
+
+# Logger para el texto de cada evento (pestana "Logs en vivo"); va limitado
+EVENT_LOG = logging.getLogger("events")
+
+_listener = None
+_handler = None
+
+
+# ==========================
+#  ROTACION POR TAMANO Y TIEMPO
+# ==========================
+
+class RotatingHandler(logging.handlers.RotatingFileHandler):
+    """Rota al pasar ``max_bytes`` o al llegar la hora (``when``).
+
+    ``when``: "" (solo tamano), "midnight", o "s"/"m"/"h"/"d" multiplicado
+    por ``interval``. Las copias son archivo.1 ... archivo.N en ambos casos.
+    """
+
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024, backups=5, when="", interval=1):
+        folder = os.path.dirname(filename)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        super().__init__(filename, maxBytes=int(max_bytes), backupCount=max(1, int(backups)),
+                         encoding="utf-8", delay=True)
+        self.when = (when or "").strip().lower()
+        self.interval = max(1, int(interval))
+        self.rollover_at = self._next_rollover(time.time()) if self.when else None
+
+    def _next_rollover(self, now):
+        if self.when == "midnight":
+            t = time.localtime(now)
+            return time.mktime((t.tm_year, t.tm_mon, t.tm_mday + self.interval, 0, 0, 0, 0, 0, -1))
+        unit = {"s": 1, "m": 60, "h": 3600, "d": 86400}.get(self.when[:1], 86400)
+        return now + unit * self.interval
+
+    def shouldRollover(self, record):
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        if self.rollover_at is not None:
+            self.rollover_at = self._next_rollover(time.time())
+
+
+# ==========================
+#  COLA SIN BLOQUEO
+# ==========================
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    # Los hilos solo encolan; si el escritor no da abasto se descarta y se cuenta
+    def __init__(self, maxsize=10000):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RateLimitFilter(logging.Filter):
+    """Deja pasar como mucho ``rate`` registros por segundo (rafagas de ``burst``).
+
+    Cuando vuelve a dejar pasar uno, anade cuantos se omitieron.
+    """
+
+    def __init__(self, rate=5.0, burst=None):
+        super().__init__()
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, self.rate * 2))
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self.skipped = 0
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if self.rate <= 0:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens < 1.0:
+                self.skipped += 1
+                return False
+            self.tokens -= 1.0
+            skipped, self.skipped = self.skipped, 0
+        if skipped:
+            record.msg = f"{record.getMessage()} (+{skipped} omitidos)"
+            record.args = None
+        return True
+
+
+# ==========================
+#  CONFIGURACION
+# ==========================
+
+def parse_levels(value):
+    # "webhooks:INFO, sinks:WARNING" -> {"webhooks": 20, "sinks": 30}
+    levels = {}
+    for item in (value or "").split(","):
+        name, _, level = item.partition(":")
+        level = getattr(logging, level.strip().upper(), None)
+        if name.strip() and isinstance(level, int):
+            levels[name.strip()] = level
+    return levels
+
+
+def configure_logging(level="INFO", path="logs/app.log", max_bytes=10 * 1024 * 1024, backups=5, when="",
+                      interval=1, levels=None, events_per_second=5.0, queue_size=10000):
+    """Todo el logging pasa por una cola; un solo hilo escribe y rota el archivo.
+
+    Se puede llamar de nuevo (p.ej. al cambiar la configuracion): sustituye
+    la configuracion anterior.
+    """
+    global _listener, _handler
+    root = logging.getLogger()
+    if _listener is not None:
+        _listener.stop()
+        root.removeHandler(_handler)
+        for handler in _listener.handlers:
+            # El archivo anterior (y su rotacion) queda cerrado antes de abrir el nuevo
+            handler.close()
+    for handler in list(root.handlers):
+        # basicConfig u otra configuracion previa: escribia en el hilo que loguea
+        root.removeHandler(handler)
+        handler.close()
+
+    file_handler = RotatingHandler(path, max_bytes, backups, when, interval)
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    _handler = DroppingQueueHandler(int(queue_size))
+    _listener = logging.handlers.QueueListener(_handler.queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    root.addHandler(_handler)
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+
+    for name, lvl in (levels or {}).items():
+        logging.getLogger(name).setLevel(lvl)
+    for f in list(EVENT_LOG.filters):
+        EVENT_LOG.removeFilter(f)
+    EVENT_LOG.addFilter(RateLimitFilter(events_per_second))
+    return _listener
+
+
+def logging_from_config(config, default_level="INFO"):
+    # [LOGGING] file, max_bytes, backups, rotate_when, rotate_interval, levels, events_per_second
+    get = (lambda key, default: config.get("LOGGING", key, default)) if config is not None \
+        else (lambda key, default: default)
+    level = config.get("APP", "log_level", default_level) if config is not None else default_level
+    return configure_logging(
+        level=get("level", "") or level,
+        path=get("file", "logs/app.log"),
+        max_bytes=int(get("max_bytes", str(10 * 1024 * 1024))),
+        backups=int(get("backups", "5")),
+        when=get("rotate_when", "midnight"),
+        interval=int(get("rotate_interval", "1")),
+        levels=parse_levels(get("levels", "")),
+        events_per_second=float(get("events_per_second", "5")),
+    )
+
+
+def dropped():
+    return _handler.dropped if _handler is not None else 0
+
+
+def stop_logging():
+    # Vacia la cola al salir para no perder los ultimos mensajes
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
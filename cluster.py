@@ -0,0 +1,386 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import socket
+import sys
+import threading
+import time
+import uuid
+
+from supervisor import StopSignal, time_left
+
+log = logging.getLogger("cluster")
+
+
+# ==========================
+#  ARCHIVOS COMPARTIDOS
+# ==========================
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    # Escritura atomica: un lector nunca ve un archivo a medias
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _create_json(path, data):
+    # Solo un proceso puede crear el archivo (O_EXCL); False si ya existe
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    return True
+
+
+def _put_back(src, path):
+    # Devuelve un lease apartado sin pisar el que otro nodo haya creado entretanto;
+    # False (y se descarta el apartado) si ya existe
+    try:
+        if os.name == "nt":
+            os.rename(src, path)  # en Windows rename nunca sobrescribe
+        else:
+            os.link(src, path)
+            os.remove(src)
+        return True
+    except OSError:
+        try:
+            os.remove(src)
+        except OSError:
+            pass
+        return False
+
+
+def file_lease_key(entry):
+    # Nombre estable del archivo vigilado en el directorio compartido. Si los
+    # nodos montan los logs en rutas distintas, fijar "cluster_key" en settings.json
+    key = entry.get("cluster_key")
+    if key:
+        return re.sub(r"[^\w.-]", "_", key)
+    path = os.path.normcase(os.path.normpath(entry.get("logfile", "")))
+    base = re.sub(r"[^\w.-]", "_", os.path.basename(path))
+    return f"{base}-{hashlib.sha1(path.encode('utf-8')).hexdigest()[:10]}"
+
+
+# ==========================
+#  CHECKPOINT
+# ==========================
+
+class Checkpoint:
+    """Offset (en bytes) de la primera linea aun no entregada de un archivo.
+
+    El monitor llama a ``update`` cuando ``due`` (cada ``interval``
+    segundos, y siempre al parar) con el offset de la primera linea que
+    algun sink aun no ha entregado. Un nodo que toma el archivo de otro
+    que murio, aunque fuera con SIGKILL, repite lo que estaba en cola
+    pero no pierde nada.
+    """
+
+    def __init__(self, path, interval=1.0):
+        self.path = path
+        self.interval = float(interval)
+        self.offset = None
+        self._saved = None
+        self._next = 0.0
+
+    def load(self):
+        data = _read_json(self.path)
+        if data and isinstance(data.get("offset"), int):
+            self.offset = self._saved = data["offset"]
+        return self.offset
+
+    def due(self):
+        return time.monotonic() >= self._next
+
+    def update(self, offset, force=False):
+        self.offset = offset
+        now = time.monotonic()
+        if not force and now < self._next:
+            return
+        # Tambien sin cambios: ``due`` no debe seguir activo en cada linea
+        self._next = now + self.interval
+        if offset == self._saved:
+            return
+        try:
+            _write_json(self.path, {"offset": offset, "time": time.time()})
+            self._saved = offset
+        except OSError as e:
+            log.error(f"No se pudo guardar el checkpoint {self.path}: {e}")
+
+
+# ==========================
+#  NODO
+# ==========================
+
+class ClusterNode:
+    """Reparto de los archivos de log entre varias instancias SERVICE.
+
+    En el directorio compartido::
+
+        nodes/<nodo>.json          latido de cada instancia viva
+        leases/<archivo>.lease     propietario del archivo y caducidad
+        checkpoints/<archivo>.json offset de la primera linea sin entregar
+
+    Cada ``heartbeat`` segundos el nodo renueva sus leases, suelta uno si
+    tiene mas de su parte justa (archivos / nodos vivos) y toma archivos
+    libres o con el lease caducado (su dueno murio), continuando desde el
+    checkpoint. Las horas de los nodos deben estar sincronizadas (NTP).
+    """
+
+    def __init__(self, directory, node_id=None, lease_seconds=30, heartbeat=10, checkpoint_interval=1.0):
+        self.directory = directory
+        self.node_id = re.sub(r"[^\w.-]", "_", node_id or f"{socket.gethostname()}-{os.getpid()}")
+        self.lease_seconds = float(lease_seconds)
+        self.heartbeat = float(heartbeat)
+        self.checkpoint_interval = float(checkpoint_interval)
+        self.groups = {}
+        self.owned = {}
+        # Monitores soltados que aun vacian sus sinks: clave -> hilo que espera y suelta el lease
+        self.draining = {}
+        self._start = None
+        self._stop = threading.Event()
+        self._thread = None
+        for sub in ("nodes", "leases", "checkpoints"):
+            os.makedirs(os.path.join(directory, sub), exist_ok=True)
+
+    def _path(self, kind, key):
+        ext = {"nodes": "json", "leases": "lease", "checkpoints": "json"}[kind]
+        return os.path.join(self.directory, kind, f"{key}.{ext}")
+
+    # ---- Latido y nodos vivos ---- #
+    def beat(self):
+        _write_json(self._path("nodes", self.node_id), {
+            "node": self.node_id, "host": socket.gethostname(), "pid": os.getpid(),
+            "expires": time.time() + self.lease_seconds, "files": sorted(self.owned),
+        })
+
+    def live_nodes(self):
+        now = time.time()
+        nodes = {self.node_id}
+        folder = os.path.join(self.directory, "nodes")
+        for name in os.listdir(folder):
+            if name.endswith(".json"):
+                data = _read_json(os.path.join(folder, name))
+                if data and data.get("expires", 0) > now:
+                    nodes.add(data.get("node"))
+        return nodes
+
+    # ---- Leases ---- #
+    def _lease_data(self, token):
+        return {"node": self.node_id, "host": socket.gethostname(), "pid": os.getpid(),
+                "token": token, "expires": time.time() + self.lease_seconds}
+
+    def acquire(self, key):
+        path = self._path("leases", key)
+        current = _read_json(path)
+        if current is not None and current.get("node") != self.node_id:
+            if current.get("expires", 0) > time.time():
+                return None
+            # Lease caducado: apartarlo con rename (atomico, solo un nodo lo consigue)
+            stale = f"{path}.{self.node_id}.stale"
+            try:
+                os.rename(path, stale)
+            except OSError:
+                return None
+            moved = _read_json(stale)
+            if not moved or moved.get("token") != current.get("token"):
+                # Otro nodo lo renovo o lo tomo entre la lectura y el rename
+                _put_back(stale, path)
+                return None
+            os.remove(stale)
+            log.warning(f"Cluster: lease de {key} caducado (nodo {current.get('node')}); se toma")
+        elif current is not None:
+            # Lease propio de una ejecucion anterior con el mismo node_id
+            os.remove(path)
+        token = uuid.uuid4().hex
+        return token if _create_json(path, self._lease_data(token)) else None
+
+    def renew(self, key, token):
+        # Se aparta el lease con rename (atomico) antes de reescribirlo: si otro
+        # nodo lo tomo por caducado, el rename falla o el token ya no es el nuestro
+        path = self._path("leases", key)
+        held = f"{path}.{self.node_id}.renew"
+        try:
+            os.rename(path, held)
+        except OSError:
+            return False
+        current = _read_json(held)
+        if not current or current.get("token") != token:
+            _put_back(held, path)
+            return False
+        _write_json(held, self._lease_data(token))
+        if not _put_back(held, path):
+            # Mientras estaba apartado otro nodo creo un lease nuevo: es suyo
+            return False
+        current = _read_json(path)
+        return bool(current) and current.get("token") == token
+
+    def release(self, key, token):
+        path = self._path("leases", key)
+        current = _read_json(path)
+        if current and current.get("token") == token:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # ---- Monitores ---- #
+    def start(self, groups, start_monitor):
+        """``groups``: {clave: entradas}; ``start_monitor(entradas, stop_event,
+        offset, checkpoint)`` arranca un monitor y devuelve su hilo."""
+        self.groups = dict(groups)
+        self._start = start_monitor
+        self._thread = threading.Thread(target=self._run, name="cluster", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                log.error(f"Cluster: error en el ciclo del nodo {self.node_id}: {e}", exc_info=True)
+            self._stop.wait(self.heartbeat)
+
+    def step(self):
+        self.beat()
+        for key, (token, stop, thread, checkpoint) in list(self.owned.items()):
+            if not thread.is_alive():
+                log.warning(f"Cluster: el monitor de {key} termino; se suelta el lease")
+                self._drop(key)
+            elif not self.renew(key, token):
+                log.error(f"Cluster: lease de {key} perdido; se detiene el monitor")
+                self._drop(key, release=False)
+        share = math.ceil(len(self.groups) / max(1, len(self.live_nodes())))
+        if len(self.owned) > share:
+            # Ceder un archivo por ciclo para que lo tome un nodo nuevo
+            key = sorted(self.owned)[-1]
+            log.info(f"Cluster: cediendo {key} ({len(self.owned)} > {share} por nodo)")
+            self._drop(key)
+        # Orden distinto en cada nodo para que no compitan todos por el mismo archivo
+        order = sorted(self.groups, key=lambda k: hashlib.sha1(f"{self.node_id}:{k}".encode()).digest())
+        for key in order:
+            if len(self.owned) >= share:
+                break
+            if key in self.owned or key in self.draining:
+                continue
+            token = self.acquire(key)
+            if token:
+                self._take(key, token)
+
+    def _take(self, key, token):
+        checkpoint = Checkpoint(self._path("checkpoints", key), self.checkpoint_interval)
+        offset = checkpoint.load()
+        stop = StopSignal()
+        try:
+            thread = self._start(self.groups[key], stop, offset, checkpoint)
+        except Exception as e:
+            log.error(f"Cluster: no se pudo iniciar el monitor de {key}: {e}", exc_info=True)
+            self.release(key, token)
+            return
+        self.owned[key] = (token, stop, thread, checkpoint)
+        log.info(f"Cluster: nodo {self.node_id} vigila {key} desde el offset {offset}")
+
+    def _drop(self, key, release=True, timeout=10.0, wait=False):
+        # El vaciado de sinks (hasta ``timeout``) se espera en otro hilo: dentro del
+        # ciclo frenaria la renovacion de los demas leases hasta dejarlos caducar
+        token, stop, thread, checkpoint = self.owned.pop(key)
+        stop.stop(timeout)
+
+        def finish():
+            thread.join(timeout)
+            if release:
+                # El checkpoint final ya esta escrito (lo hace el monitor al parar)
+                self.release(key, token)
+            self.draining.pop(key, None)
+
+        if wait:
+            finish()
+            return
+        worker = threading.Thread(target=finish, name=f"cluster-drop-{key}", daemon=True)
+        self.draining[key] = worker
+        worker.start()
+
+    def threads(self):
+        return [thread for _, _, thread, _ in self.owned.values()]
+
+    def close(self, timeout=10.0):
+        # Parada limpia: soltar los leases para que otro nodo siga sin esperar a que caduquen
+        deadline = StopSignal()
+        deadline.stop(timeout)
+        self._stop.set()
+        if self._thread:
+            self._thread.join(min(self.heartbeat + 5, timeout))
+        # Todos los monitores paran a la vez y comparten el plazo
+        for _, stop, _, _ in self.owned.values():
+            stop.stop(time_left(deadline))
+        for key in list(self.owned):
+            self._drop(key, timeout=time_left(deadline), wait=True)
+        for worker in list(self.draining.values()):
+            worker.join(time_left(deadline))
+        try:
+            os.remove(self._path("nodes", self.node_id))
+        except OSError:
+            pass
+
+
+def cluster_from_config(config):
+    # [CLUSTER] directory (vacio = sin cluster), node_id, lease_seconds, heartbeat, checkpoint_interval
+    if config is None:
+        return None
+    directory = config.get("CLUSTER", "directory", "")
+    if not directory:
+        return None
+    return ClusterNode(
+        directory,
+        node_id=config.get("CLUSTER", "node_id", "") or None,
+        lease_seconds=config.get("CLUSTER", "lease_seconds", "30"),
+        heartbeat=config.get("CLUSTER", "heartbeat", "10"),
+        checkpoint_interval=config.get("CLUSTER", "checkpoint_interval", "1"),
+    )
+
+
+# ==========================
+#  ESTADO POR CONSOLA
+# ==========================
+
+def main(argv):
+    # Uso: python cluster.py <directorio compartido>
+    if len(argv) < 2:
+        print("Uso: python cluster.py directorio_compartido")
+        return 1
+    directory = argv[1]
+    now = time.time()
+    print("Nodos:")
+    for name in sorted(os.listdir(os.path.join(directory, "nodes"))):
+        data = _read_json(os.path.join(directory, "nodes", name)) or {}
+        state = "vivo" if data.get("expires", 0) > now else "caducado"
+        print(f"  {data.get('node')} ({data.get('host')}, pid {data.get('pid')}) {state}: "
+              f"{', '.join(data.get('files', [])) or '-'}")
+    print("Archivos:")
+    for name in sorted(os.listdir(os.path.join(directory, "leases"))):
+        if not name.endswith(".lease"):
+            continue
+        key = name[:-len(".lease")]
+        data = _read_json(os.path.join(directory, "leases", name)) or {}
+        checkpoint = _read_json(os.path.join(directory, "checkpoints", f"{key}.json")) or {}
+        left = data.get("expires", 0) - now
+        print(f"  {key}: {data.get('node')} (caduca en {left:.0f}s), offset {checkpoint.get('offset')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
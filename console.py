@@ -0,0 +1,254 @@
+import collections
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+
+from diagnostics import DIAG
+from pipeline import EventType
+from sinks import Sink
+
+log = logging.getLogger("console")
+
+RESET = "\x1b[0m"
+CLEAR_LINE = "\r\x1b[K"
+ALERT_COLOR = "\x1b[1;31m"
+
+# Tipo de evento -> color ANSI
+EVENT_COLORS = {
+    EventType.STATUS: "\x1b[2m",
+    EventType.CREATE: "\x1b[32m",
+    EventType.JOIN: "\x1b[36m",
+    EventType.LEAVE: "\x1b[33m",
+    EventType.CHAT: "",
+    EventType.DIGEST: "\x1b[35m",
+}
+
+
+def enable_ansi(stream):
+    # True si el terminal admite colores; en Windows 10+ activa las secuencias VT
+    if not hasattr(stream, "isatty") or not stream.isatty():
+        return False
+    if sys.platform != "win32":
+        return True
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)
+        mode = ctypes.c_uint32()
+        if not kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            return False
+        # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+        return bool(kernel32.SetConsoleMode(handle, mode.value | 0x0004))
+    except Exception:
+        return False
+
+
+# ==========================
+#  CONSOLA EN VIVO
+# ==========================
+
+class LiveConsole:
+    """Salida del modo TERMINAL: eventos retransmitidos y una linea de estado.
+
+    Los monitores solo anaden a una cola acotada (``put``/llamada con un
+    texto, O(1) y sin bloquear); un unico hilo escribe cada ``refresh``
+    segundos todo lo acumulado con un solo ``write``. Si la consola no da
+    abasto se descartan los mas antiguos (como mucho ``max_pending``) y se
+    indica cuantos. En un terminal la linea de estado (eventos/s y cola de
+    cada webhook) se redibuja al final; si la salida va a un archivo se
+    escribe cada ``status_interval`` segundos.
+    """
+
+    def __init__(self, stream=None, refresh=0.25, max_pending=10000, color=None, status=True,
+                 status_interval=30.0):
+        self.stream = stream or sys.stdout
+        self.refresh = max(0.05, float(refresh))
+        self.pending = collections.deque(maxlen=max(1, int(max_pending)))
+        # Con secuencias ANSI la linea de estado se redibuja en su sitio
+        self.live = enable_ansi(self.stream)
+        self.color = self.live if color is None else bool(color) and self.live
+        self.status = bool(status)
+        self.status_interval = float(status_interval)
+        self.received = 0
+        self.printed = 0
+        self.omitted = 0
+        self.rate = 0.0
+        self._counted = 0
+        self._last_rate = time.monotonic()
+        self._last_status = 0.0
+        self._status_shown = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="console", daemon=True)
+
+    def start(self):
+        if not self._thread.is_alive():
+            self._thread.start()
+            DIAG.register("console", self.stats)
+        return self
+
+    # ---- Entrada (cualquier hilo) ---- #
+    def put(self, ev):
+        pending = self.pending
+        if len(pending) == pending.maxlen:
+            self.omitted += 1
+        pending.append(ev)
+        self.received += 1
+
+    def __call__(self, text):
+        # Mensajes de estado (output_callback / notify): texto sin tipo
+        pending = self.pending
+        if len(pending) == pending.maxlen:
+            self.omitted += 1
+        pending.append(text)
+
+    def sink(self, name):
+        return ConsoleSink(self, name=name)
+
+    # ---- Escritura (hilo de la consola) ---- #
+    def format(self, item):
+        if isinstance(item, str):
+            return item
+        text = f"[{item.bot}] {item.message}"
+        if item.alert:
+            text += f"  ⚠ {item.alert}"
+        if not self.color:
+            return text
+        color = ALERT_COLOR if item.alert else EVENT_COLORS.get(item.type, "")
+        return f"{color}{text}{RESET}" if color else text
+
+    def status_line(self):
+        sinks = DIAG.snapshot("sink:")
+        queues = []
+        for data in sinks.values():
+            if data.get("kind") != "webhook":
+                continue
+            depth = data.get("queued", 0) + sum(w.get("queued", 0) for w in data.get("webhooks", []))
+            queues.append((depth, data.get("sink", "")))
+        queues.sort(key=lambda q: (-q[0], q[1]))
+        busy = [f"{name}={depth}" for depth, name in queues if depth]
+        idle = len(queues) - len(busy)
+        parts = [f"⏱ {self.rate:.0f} ev/s", f"{self.printed} eventos"]
+        if self.omitted:
+            parts.append(f"{self.omitted} omitidos")
+        if busy:
+            parts.append("colas: " + " ".join(busy) + (f" (+{idle} a 0)" if idle else ""))
+        elif queues:
+            parts.append("colas: vacias")
+        line = " | ".join(parts)
+        if self.live:
+            width = shutil.get_terminal_size((120, 20)).columns - 1
+            if len(line) > width:
+                line = line[:max(0, width - 1)] + "…"
+            if self.color:
+                line = f"\x1b[7m{line}{RESET}"
+        return line
+
+    def flush(self, now=None):
+        now = time.monotonic() if now is None else now
+        pending = self.pending
+        lines = []
+        while pending:
+            try:
+                item = pending.popleft()
+            except IndexError:
+                break
+            lines.append(self.format(item))
+            if not isinstance(item, str):
+                self.printed += 1
+        elapsed = now - self._last_rate
+        if elapsed >= 1.0:
+            # Media movil de eventos por segundo
+            current = (self.received - self._counted) / elapsed
+            self.rate = current if not self._counted else self.rate * 0.5 + current * 0.5
+            self._counted = self.received
+            self._last_rate = now
+        out = []
+        if self.live:
+            status = self.status_line() if self.status else None
+            if lines or status != self._status_shown:
+                if self._status_shown:
+                    out.append(CLEAR_LINE)
+                if lines:
+                    out.append("\n".join(lines) + "\n")
+                if status:
+                    out.append(status)
+                self._status_shown = status
+        else:
+            if lines:
+                out.append("\n".join(lines) + "\n")
+            if self.status and now - self._last_status >= self.status_interval:
+                self._last_status = now
+                out.append(self.status_line() + "\n")
+        if out:
+            try:
+                self.stream.write("".join(out))
+                self.stream.flush()
+            except (OSError, ValueError) as e:
+                log.debug(f"Consola: no se pudo escribir: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.refresh):
+            try:
+                self.flush()
+            except Exception as e:
+                log.error(f"Consola: error escribiendo: {e}", exc_info=True)
+
+    def stats(self):
+        return {"pending": len(self.pending), "printed": self.printed, "omitted": self.omitted,
+                "rate": round(self.rate, 1)}
+
+    def close(self):
+        # Escribe lo que quede y deja el cursor en una linea nueva
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(2.0)
+        self.status = False
+        self.flush()
+        if self.live and self._status_shown:
+            try:
+                self.stream.write(CLEAR_LINE)
+                self.stream.flush()
+            except (OSError, ValueError):
+                pass
+        DIAG.unregister("console")
+
+
+class ConsoleSink(Sink):
+    """Sink de un monitor hacia la consola compartida: sin cola ni hilo propios."""
+
+    kind = "console"
+
+    def __init__(self, console, **kwargs):
+        super().__init__(**kwargs)
+        self.console = console
+
+    def start(self):
+        DIAG.register(f"sink:{self.name}", self.stats)
+        return self
+
+    def put(self, event):
+        self.console.put(event)
+        self.sent += 1
+        return True
+
+
+def console_from_config(config, stream=None):
+    # [CONSOLE] enabled, color (auto/true/false), refresh, status, status_interval, max_pending
+    get = (lambda key, default: config.get("CONSOLE", key, default)) if config is not None \
+        else (lambda key, default: default)
+    if get("enabled", "true").lower() != "true":
+        return None
+    color = get("color", "auto").lower()
+    if os.environ.get("NO_COLOR"):
+        color = "false"
+    return LiveConsole(
+        stream=stream,
+        refresh=get("refresh", "0.25"),
+        max_pending=get("max_pending", "10000"),
+        color=None if color == "auto" else color == "true",
+        status=get("status", "true").lower() == "true",
+        status_interval=get("status_interval", "30"),
+    ).start()
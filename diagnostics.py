@@ -0,0 +1,311 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import signal
+import socketserver
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+
+log = logging.getLogger("diagnostics")
+
+STAGES = ("read", "parse", "enrich", "render", "send", "write")
+
+
+# ==========================
+#  DIAGNOSTICO EN CALIENTE
+# ==========================
+
+class Diagnostics:
+    """Herramientas de diagnostico para TERMINAL/SERVICE sin reiniciar.
+
+    Desactivado no cuesta nada: los hilos solo comparan ``timing`` y
+    ``profiling`` (dos atributos) en cada vuelta del bucle.
+    """
+
+    def __init__(self, output_dir="logs/diagnostics", profile_seconds=30):
+        self.output_dir = output_dir
+        self.profile_seconds = profile_seconds
+        self.timing = False
+        self.profiling = False
+        self._stages = {}
+        self._profiles = {}
+        self._finished = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._sources = {}
+
+    # ---- Tiempos por etapa ---- #
+    def record(self, monitor, stage, t0, c0):
+        t1 = time.perf_counter()
+        c1 = time.thread_time()
+        key = (monitor, stage)
+        with self._lock:
+            acc = self._stages.get(key)
+            if acc is None:
+                acc = self._stages[key] = [0, 0.0, 0.0]
+            acc[0] += 1
+            acc[1] += t1 - t0
+            acc[2] += c1 - c0
+        return t1, c1
+
+    def set_timing(self, enabled):
+        self.timing = bool(enabled)
+        return f"Tiempos por etapa {'activados' if self.timing else 'desactivados'}"
+
+    def reset_timing(self):
+        with self._lock:
+            self._stages.clear()
+        return "Tiempos por etapa reiniciados"
+
+    def timing_report(self):
+        with self._lock:
+            items = sorted(self._stages.items(),
+                           key=lambda kv: (kv[0][0], STAGES.index(kv[0][1]) if kv[0][1] in STAGES else 99))
+        if not items:
+            return "Sin datos de etapas (usa 'stages on')"
+        lines = [f"{'monitor':<24} {'etapa':<8} {'n':>9} {'wall ms':>11} {'cpu ms':>11} {'us/evt':>9}"]
+        for (monitor, stage), (count, wall, cpu) in items:
+            per = (wall / count * 1e6) if count else 0.0
+            lines.append(f"{monitor:<24} {stage:<8} {count:>9} {wall * 1e3:>11.1f} {cpu * 1e3:>11.1f} {per:>9.1f}")
+        return "\n".join(lines)
+
+    # ---- Metricas de componentes ---- #
+    def register(self, name, fn):
+        # ``fn()`` devuelve un dict con el estado del componente (p.ej. Sink.stats)
+        with self._lock:
+            self._sources[name] = fn
+
+    def unregister(self, name):
+        with self._lock:
+            self._sources.pop(name, None)
+
+    def snapshot(self, prefix=""):
+        # {nombre: dict} de los componentes cuyo nombre empieza por ``prefix``
+        with self._lock:
+            sources = [(name, fn) for name, fn in self._sources.items() if name.startswith(prefix)]
+        result = {}
+        for name, fn in sources:
+            try:
+                result[name] = fn()
+            except Exception as e:
+                result[name] = {"error": str(e)}
+        return result
+
+    def stats_report(self):
+        with self._lock:
+            sources = sorted(self._sources.items())
+        if not sources:
+            return "Sin componentes registrados"
+        lines = []
+        for name, fn in sources:
+            try:
+                data = fn()
+            except Exception as e:
+                data = {"error": str(e)}
+            nested = {k: v for k, v in data.items() if isinstance(v, list)}
+            flat = " ".join(f"{k}={v}" for k, v in data.items() if k not in nested)
+            lines.append(f"{name}: {flat}")
+            for key, items in nested.items():
+                for item in items:
+                    lines.append(f"    {key}: " + " ".join(f"{k}={v}" for k, v in item.items()))
+        return "\n".join(lines)
+
+    # ---- cProfile ---- #
+    def start_profile(self, seconds=None):
+        seconds = float(seconds or self.profile_seconds)
+        with self._lock:
+            if self.profiling:
+                return "Ya hay un perfilado en curso"
+            self._finished = []
+            self.profiling = True
+        timer = threading.Timer(seconds, self._finish_profile)
+        timer.daemon = True
+        timer.start()
+        return f"Perfilando {seconds:g}s; resultado en {self.output_dir}"
+
+    def profile_tick(self):
+        # Cada hilo activa/desactiva su propio perfilador (cProfile es por hilo)
+        ident = threading.get_ident()
+        with self._lock:
+            prof = self._profiles.get(ident)
+            if self.profiling and prof is None:
+                prof = self._profiles[ident] = cProfile.Profile()
+                prof.enable()
+            elif not self.profiling and prof is not None:
+                prof.disable()
+                del self._profiles[ident]
+                self._finished.append(prof)
+        return self.profiling
+
+    def _finish_profile(self):
+        with self._lock:
+            self.profiling = False
+        # Dar tiempo a que los hilos pasen por profile_tick y cierren su perfil
+        deadline = time.monotonic() + 2.0
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._profiles:
+                    break
+            time.sleep(0.05)
+        with self._lock:
+            finished, self._finished = self._finished, []
+        if not finished:
+            log.warning("Perfilado terminado sin datos (ningun hilo activo)")
+            return None
+        path = self._path("profile", "pstats")
+        stats = pstats.Stats(*finished)
+        stats.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).sort_stats("cumulative").print_stats(40)
+        with open(path[:-len(".pstats")] + ".txt", "w", encoding="utf-8") as f:
+            f.write(out.getvalue())
+        log.info(f"Perfil guardado en {path}")
+        return path
+
+    # ---- tracemalloc ---- #
+    def tracemalloc_start(self, frames=10):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(int(frames))
+        return "tracemalloc activo"
+
+    def tracemalloc_stop(self):
+        tracemalloc.stop()
+        return "tracemalloc detenido"
+
+    def tracemalloc_snapshot(self, top=25):
+        if not tracemalloc.is_tracing():
+            return "tracemalloc no esta activo (usa 'tracemalloc start')"
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"tracemalloc: actual {current / 1024:.1f} KiB, pico {peak / 1024:.1f} KiB"]
+        for stat in snapshot.statistics("lineno")[:int(top)]:
+            lines.append(str(stat))
+        report = "\n".join(lines)
+        with open(self._path("tracemalloc", "txt"), "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+        return report
+
+    # ---- Pilas de hilos ---- #
+    def dump_stacks(self):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        parts = []
+        for ident, frame in sys._current_frames().items():
+            parts.append(f"--- Hilo {names.get(ident, '?')} ({ident}) ---")
+            parts.append("".join(traceback.format_stack(frame)).rstrip())
+        report = "\n".join(parts)
+        with open(self._path("stacks", "txt"), "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+        return report
+
+    def _path(self, prefix, ext):
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return os.path.join(self.output_dir, f"{prefix}-{stamp}-{os.getpid()}.{ext}")
+
+    # ---- Comandos ---- #
+    def handle_command(self, line):
+        parts = line.strip().split()
+        if not parts:
+            return ""
+        cmd, args = parts[0].lower(), parts[1:]
+        try:
+            if cmd == "stages":
+                sub = args[0].lower() if args else "show"
+                if sub in ("on", "off"):
+                    return self.set_timing(sub == "on")
+                if sub == "reset":
+                    return self.reset_timing()
+                return self.timing_report()
+            if cmd == "profile":
+                return self.start_profile(args[0] if args else None)
+            if cmd == "tracemalloc":
+                sub = args[0].lower() if args else "snapshot"
+                if sub == "start":
+                    return self.tracemalloc_start(*args[1:2])
+                if sub == "stop":
+                    return self.tracemalloc_stop()
+                return self.tracemalloc_snapshot(*args[1:2])
+            if cmd == "stacks":
+                return self.dump_stacks()
+            if cmd == "stats":
+                return self.stats_report()
+            if cmd == "dump":
+                return "\n\n".join((self.stats_report(), self.timing_report(), self.dump_stacks()))
+        except Exception as e:
+            log.error(f"Error en comando de diagnostico '{line.strip()}': {e}", exc_info=True)
+            return f"Error: {e}"
+        return ("Comandos: stages on|off|reset|show, profile [segundos], "
+                "tracemalloc start|snapshot [top]|stop, stacks, stats, dump")
+
+    # ---- Disparadores ---- #
+    def install_signal_handlers(self):
+        # POSIX: SIGUSR1 = volcado (etapas + pilas), SIGUSR2 = perfilar N segundos
+        # Windows: Ctrl+Break (SIGBREAK) = volcado
+        def run_async(fn):
+            return lambda signum, frame: threading.Thread(target=fn, daemon=True).start()
+
+        def dump():
+            log.info("Volcado de diagnostico por senal:\n" + self.handle_command("dump"))
+
+        installed = []
+        for name, fn in (("SIGUSR1", dump), ("SIGBREAK", dump), ("SIGUSR2", self.start_profile)):
+            signum = getattr(signal, name, None)
+            if signum is None:
+                continue
+            try:
+                signal.signal(signum, run_async(fn))
+                installed.append(name)
+            except (ValueError, OSError):
+                # signal() solo funciona en el hilo principal
+                pass
+        return installed
+
+    def start_control_server(self, port, host="127.0.0.1"):
+        diag = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for raw in self.rfile:
+                    reply = diag.handle_command(raw.decode("utf-8", "replace"))
+                    self.wfile.write((reply + "\n.\n").encode("utf-8"))
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self._server = Server((host, int(port)), Handler)
+        threading.Thread(target=self._server.serve_forever, name="diagnostics-control", daemon=True).start()
+        log.info(f"Control de diagnostico escuchando en {host}:{self._server.server_address[1]}")
+        return self._server.server_address
+
+    def stop_control_server(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+DIAG = Diagnostics()
+
+
+def setup_diagnostics(config):
+    # Lee la seccion [DIAGNOSTICS] de config.ini (todas las claves son opcionales)
+    DIAG.output_dir = config.get("DIAGNOSTICS", "output_dir", DIAG.output_dir)
+    DIAG.profile_seconds = float(config.get("DIAGNOSTICS", "profile_seconds", DIAG.profile_seconds))
+    DIAG.timing = str(config.get("DIAGNOSTICS", "stage_timing", "false")).lower() == "true"
+    started = []
+    if str(config.get("DIAGNOSTICS", "signals", "true")).lower() == "true":
+        started += DIAG.install_signal_handlers()
+    port = int(config.get("DIAGNOSTICS", "control_port", "0") or 0)
+    if port:
+        host, port = DIAG.start_control_server(port)
+        started.append(f"control {host}:{port}")
+    return started
@@ -0,0 +1,187 @@
+import logging
+import time
+
+from pipeline import Event, EventType
+
+log = logging.getLogger("digest")
+
+# Nombre en [DIGEST] events -> tipo de evento agrupable
+DIGEST_TYPES = {
+    "create": EventType.CREATE,
+    "join": EventType.JOIN,
+    "leave": EventType.LEAVE,
+}
+
+STALE_AFTER = 6 * 3600
+
+DEFAULT_FORMAT = "📋 {game}: {players} jugadores, +{joined} entraron, -{left} salieron"
+DEFAULT_CREATED = "📋 Nueva partida {game}: {players} jugadores ({roster})"
+
+
+# ==========================
+#  ESTADO POR PARTIDA
+# ==========================
+
+class GameRoster:
+    __slots__ = ("game", "players", "joined", "left", "created", "first_change", "last_change", "last_seen")
+
+    def __init__(self, game, now=0.0):
+        self.game = game
+        self.players = {}
+        self.joined = []
+        self.left = []
+        self.created = False
+        self.first_change = 0.0
+        self.last_change = 0.0
+        # Ultimo evento de cualquier tipo (tambien los no resumidos): decide si la partida esta abandonada
+        self.last_seen = now
+
+    def touch(self, now):
+        if not self.first_change:
+            self.first_change = now
+        self.last_change = now
+
+    def pending(self):
+        return self.first_change > 0.0
+
+    def reset_window(self):
+        self.joined = []
+        self.left = []
+        self.created = False
+        self.first_change = 0.0
+
+
+# ==========================
+#  RESUMENES
+# ==========================
+
+class Digest:
+    """Resumen periodico por partida en lugar de un mensaje por entrada/salida.
+
+    El monitor le pasa todos sus eventos: con ellos mantiene la lista de
+    jugadores de cada partida. Los tipos indicados en ``[DIGEST] events`` se
+    marcan como ``digested`` (el sink webhook no los publica uno a uno) y
+    cada partida con cambios genera un solo resumen al cerrar su ventana de
+    ``interval`` segundos, o antes si lleva ``settle`` segundos sin cambios.
+    La configuracion se relee de default_messages.ini cuando cambia.
+    """
+
+    def __init__(self, bot, source, config_watcher=None):
+        self.bot = bot
+        self.source = source
+        self.config_watcher = config_watcher
+        self.games = {}
+        self.types = frozenset()
+        self.interval = 60.0
+        self.settle = 0.0
+        self.template = DEFAULT_FORMAT
+        self.created_template = DEFAULT_CREATED
+        self.max_names = 15
+        self._config = self  # centinela: fuerza la primera lectura
+        self._next_check = 0.0
+        self._settings()
+
+    def _settings(self):
+        config = self.config_watcher.config if self.config_watcher else None
+        if config is self._config:
+            return
+        self._config = config
+        section = config["DIGEST"] if config is not None and config.has_section("DIGEST") else {}
+        names = [n.strip().lower() for n in section.get("events", "").split(",") if n.strip()]
+        unknown = [n for n in names if n not in DIGEST_TYPES]
+        if unknown:
+            log.warning(f"[DIGEST] events: tipos desconocidos {', '.join(unknown)}")
+        try:
+            self.interval = max(1.0, float(section.get("interval", "60")))
+            self.settle = max(0.0, float(section.get("settle", "0")))
+            self.max_names = max(0, int(section.get("max_names", "15")))
+        except ValueError as e:
+            log.error(f"[DIGEST] valor no valido: {e}")
+        self.template = section.get("messagedigest", DEFAULT_FORMAT)
+        self.created_template = section.get("messagedigestcreate", DEFAULT_CREATED)
+        types = frozenset(DIGEST_TYPES[n] for n in names if n in DIGEST_TYPES)
+        if types != self.types:
+            if not types:
+                self.games.clear()
+            self.types = types
+            log.info(f"Digest {self.bot}: {', '.join(sorted(t.name.lower() for t in types)) or 'desactivado'}")
+
+    @property
+    def enabled(self):
+        return bool(self.types)
+
+    def feed(self, ev, now=None):
+        # Devuelve True si el evento queda cubierto por un resumen
+        if not self.types or ev.type not in DIGEST_TYPES.values():
+            return False
+        now = time.monotonic() if now is None else now
+        game = ev.game or self.bot
+        roster = self.games.get(game)
+        if ev.type == EventType.CREATE:
+            roster = self.games[game] = GameRoster(game, now)
+            roster.created = EventType.CREATE in self.types
+        elif roster is None:
+            roster = self.games[game] = GameRoster(game, now)
+        roster.last_seen = now
+        if ev.type == EventType.JOIN and ev.user:
+            roster.players[ev.user] = ev.ip
+            roster.joined.append(ev.user)
+        elif ev.type == EventType.LEAVE and ev.user:
+            roster.players.pop(ev.user, None)
+            roster.left.append(ev.user)
+        if ev.type in self.types:
+            roster.touch(now)
+            return True
+        return False
+
+    def tick(self, now=None):
+        # Llamado en cada vuelta del monitor; casi siempre solo compara un numero
+        now = time.monotonic() if now is None else now
+        if now < self._next_check:
+            return []
+        self._next_check = now + 1.0
+        self._settings()
+        if not self.types:
+            return []
+        return self.collect(now)
+
+    def collect(self, now=None, force=False):
+        now = time.monotonic() if now is None else now
+        events = []
+        for game in list(self.games):
+            roster = self.games[game]
+            if not roster.pending():
+                if now - roster.last_seen > STALE_AFTER:
+                    # Partida sin actividad (termino sin registrar las salidas)
+                    del self.games[game]
+                continue
+            window = now - roster.first_change >= self.interval
+            settled = self.settle and now - roster.last_change >= self.settle
+            if force or window or settled:
+                events.append(self.summary(roster))
+                roster.reset_window()
+                if not roster.players:
+                    del self.games[game]
+        return events
+
+    def summary(self, roster):
+        names = list(roster.players)
+        shown = names[:self.max_names] if self.max_names else []
+        more = len(names) - len(shown)
+        values = {
+            "{bot}": self.bot or "",
+            "{game}": roster.game,
+            "{players}": str(len(names)),
+            "{joined}": str(len(roster.joined)),
+            "{left}": str(len(roster.left)),
+            "{joined_names}": ", ".join(roster.joined[:self.max_names]),
+            "{left_names}": ", ".join(roster.left[:self.max_names]),
+            "{roster}": ", ".join(shown) + (f" +{more}" if shown and more > 0 else ""),
+        }
+        text = self.created_template if roster.created else self.template
+        for placeholder, value in values.items():
+            if placeholder in text:
+                text = text.replace(placeholder, value)
+        ev = Event(EventType.DIGEST, self.bot, self.source, text, -1, time.time())
+        ev.game = roster.game
+        return ev
@@ -0,0 +1,304 @@
+import argparse
+import http.server
+import json
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+
+# Limites de la API de Discord que el emulador valida
+CONTENT_LIMIT = 2000
+EMBEDS_PER_MESSAGE = 10
+EMBED_TOTAL_CHARS = 6000
+
+WEBHOOK_PATH = re.compile(r"^/api(?:/v\d+)?/webhooks/(?P<id>[^/]+)/(?P<token>[^/?]+)/?$")
+
+
+# ==========================
+#  LIMITE DE TASA POR WEBHOOK
+# ==========================
+
+class Bucket:
+    # Ventana fija como la de Discord: ``limit`` peticiones cada ``window`` segundos
+    def __init__(self, name, limit, window):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.remaining = limit
+        self.reset_at = 0.0
+
+    def take(self, now):
+        # Devuelve (permitido, segundos hasta el reinicio)
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.window
+        if self.remaining <= 0:
+            return False, self.reset_at - now
+        self.remaining -= 1
+        return True, self.reset_at - now
+
+
+# ==========================
+#  EMULADOR
+# ==========================
+
+class DiscordEmulator:
+    """Servidor HTTP local que se comporta como los webhooks de Discord.
+
+    - 204 (o 200 con el mensaje si ``?wait=true``) y 400 si el payload
+      excede los limites de contenido o de embeds.
+    - Un bucket por webhook con cabeceras ``X-RateLimit-*`` y 429 con
+      ``retry_after`` y ``Retry-After`` al agotarlo.
+    - Latencia fija mas jitter aleatorio por peticion.
+    - Webhooks revocados (404 Unknown Webhook) o con token invalido (401).
+    - Registro de cada peticion (y opcionalmente a un JSONL); ``on_message``
+      recibe el cuerpo de cada mensaje aceptado.
+
+    Control en caliente: ``GET /_stats``, ``POST /_revoke/<id>[?status=401]``,
+    ``POST /_restore/<id>`` y ``POST /_reset``.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, limit=5, window=2.0, latency_ms=0.0, jitter_ms=0.0,
+                 revoked=(), unauthorized=(), record=None, keep=10000, on_message=None, seed=None):
+        self.limit = int(limit)
+        self.window = float(window)
+        self.latency = float(latency_ms) / 1000.0
+        self.jitter = float(jitter_ms) / 1000.0
+        self.revoked = {str(w): 404 for w in revoked}
+        self.revoked.update({str(w): 401 for w in unauthorized})
+        self.keep = int(keep)
+        self.on_message = on_message
+        self.records = []
+        self.counts = {}
+        self.lock = threading.Lock()
+        self._buckets = {}
+        self._next_id = 1
+        self._random = random.Random(seed)
+        self._record_file = open(record, "a", encoding="utf-8") if record else None
+        emulator = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                emulator._handle(self, "POST")
+
+            def do_GET(self):
+                emulator._handle(self, "GET")
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="discord-emulator", daemon=True)
+        self._thread.start()
+
+    # ---- API para pruebas ---- #
+    def url(self, webhook_id="1", token="token"):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api/webhooks/{webhook_id}/{token}"
+
+    def revoke(self, webhook_id, status=404):
+        with self.lock:
+            self.revoked[str(webhook_id)] = int(status)
+
+    def restore(self, webhook_id):
+        with self.lock:
+            self.revoked.pop(str(webhook_id), None)
+
+    def reset(self):
+        with self.lock:
+            self.records.clear()
+            self.counts.clear()
+            self._buckets.clear()
+
+    def stats(self):
+        with self.lock:
+            per_webhook = {}
+            for rec in self.records:
+                item = per_webhook.setdefault(rec["webhook"], {})
+                item[str(rec["status"])] = item.get(str(rec["status"]), 0) + 1
+            return {"requests": sum(self.counts.values()),
+                    "status": {str(k): v for k, v in sorted(self.counts.items())},
+                    "webhooks": per_webhook}
+
+    def delivered(self, webhook_id=None):
+        # Payloads aceptados (2xx), en orden de llegada
+        with self.lock:
+            return [rec["payload"] for rec in self.records
+                    if rec["status"] < 300 and (webhook_id is None or rec["webhook"] == str(webhook_id))]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._record_file:
+            self._record_file.close()
+
+    # ---- Peticiones ---- #
+    def _handle(self, req, method):
+        parsed = urllib.parse.urlsplit(req.path)
+        query = urllib.parse.parse_qs(parsed.query)
+        length = int(req.headers.get("Content-Length", 0) or 0)
+        body = req.rfile.read(length) if length else b""
+        if parsed.path.startswith("/_"):
+            return self._control(req, method, parsed.path, query)
+        m = WEBHOOK_PATH.match(parsed.path)
+        if not m or method != "POST":
+            return self._reply(req, 404, {"message": "404: Not Found", "code": 0})
+        delay = self.latency + (self._random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        webhook = m.group("id")
+        status, payload, headers = self._respond(webhook, m.group("token"), body, query)
+        self._reply(req, status, payload, headers)
+
+    def _respond(self, webhook, token, body, query):
+        now = time.monotonic()
+        with self.lock:
+            revoked = self.revoked.get(webhook)
+            bucket = self._buckets.get(webhook)
+            if bucket is None:
+                bucket = self._buckets[webhook] = Bucket(f"emu-{webhook}", self.limit, self.window)
+            if revoked is None:
+                allowed, reset_after = bucket.take(now)
+                headers = {
+                    "X-RateLimit-Limit": str(bucket.limit),
+                    "X-RateLimit-Remaining": str(max(0, bucket.remaining)),
+                    "X-RateLimit-Reset": f"{time.time() + reset_after:.3f}",
+                    "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+                    "X-RateLimit-Bucket": bucket.name,
+                }
+        try:
+            data = json.loads(body.decode("utf-8")) if body else None
+        except ValueError:
+            data = None
+        if revoked == 401:
+            return self._record(webhook, 401, data, {"message": "Invalid Webhook Token", "code": 50027})
+        if revoked is not None:
+            return self._record(webhook, revoked, data, {"message": "Unknown Webhook", "code": 10015})
+        if not allowed:
+            headers["Retry-After"] = str(max(1, int(reset_after + 0.999)))
+            headers["X-RateLimit-Scope"] = "shared"
+            return self._record(webhook, 429, data, {"message": "You are being rate limited.",
+                                                     "retry_after": round(reset_after, 3), "global": False},
+                                headers)
+        error = validate(data)
+        if error:
+            return self._record(webhook, 400, data, {"message": "Invalid Form Body", "code": 50035,
+                                                     "errors": error}, headers)
+        if self.on_message:
+            self.on_message(body.decode("utf-8", "replace"), time.time())
+        if query.get("wait", ["false"])[0].lower() == "true":
+            with self.lock:
+                message_id = str(self._next_id)
+                self._next_id += 1
+            message = {"id": message_id, "webhook_id": webhook, "content": data.get("content", ""),
+                       "embeds": data.get("embeds", [])}
+            return self._record(webhook, 200, data, message, headers)
+        return self._record(webhook, 204, data, None, headers)
+
+    def _record(self, webhook, status, payload, response, headers=None):
+        rec = {"ts": time.time(), "webhook": webhook, "status": status, "payload": payload}
+        with self.lock:
+            self.counts[status] = self.counts.get(status, 0) + 1
+            self.records.append(rec)
+            if len(self.records) > self.keep:
+                del self.records[:len(self.records) - self.keep]
+            if self._record_file:
+                self._record_file.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                self._record_file.flush()
+        return status, response, headers or {}
+
+    def _control(self, req, method, path, query):
+        parts = path.strip("/").split("/")
+        if parts[0] == "_stats":
+            return self._reply(req, 200, self.stats())
+        if method == "POST" and parts[0] == "_revoke" and len(parts) > 1:
+            self.revoke(parts[1], int(query.get("status", ["404"])[0]))
+            return self._reply(req, 204, None)
+        if method == "POST" and parts[0] == "_restore" and len(parts) > 1:
+            self.restore(parts[1])
+            return self._reply(req, 204, None)
+        if method == "POST" and parts[0] == "_reset":
+            self.reset()
+            return self._reply(req, 204, None)
+        return self._reply(req, 404, {"message": "404: Not Found", "code": 0})
+
+    @staticmethod
+    def _reply(req, status, payload, headers=None):
+        body = b"" if payload is None or status == 204 else json.dumps(payload).encode("utf-8")
+        req.send_response(status)
+        for name, value in (headers or {}).items():
+            req.send_header(name, value)
+        if body:
+            req.send_header("Content-Type", "application/json")
+        req.send_header("Content-Length", str(len(body)))
+        req.end_headers()
+        if body:
+            req.wfile.write(body)
+
+
+def validate(data):
+    # Errores de formulario como los de Discord (None si el payload es valido)
+    if not isinstance(data, dict):
+        return {"_errors": [{"code": "BASE_TYPE_REQUIRED", "message": "Cuerpo JSON no valido"}]}
+    content = data.get("content") or ""
+    embeds = data.get("embeds") or []
+    if not content and not embeds:
+        return {"_errors": [{"code": "MESSAGE_EMPTY", "message": "Mensaje vacio"}]}
+    if len(content) > CONTENT_LIMIT:
+        return {"content": {"_errors": [{"code": "BASE_TYPE_MAX_LENGTH",
+                                         "message": f"Maximo {CONTENT_LIMIT} caracteres"}]}}
+    if len(embeds) > EMBEDS_PER_MESSAGE:
+        return {"embeds": {"_errors": [{"code": "BASE_TYPE_MAX_LENGTH",
+                                        "message": f"Maximo {EMBEDS_PER_MESSAGE} embeds"}]}}
+    total = 0
+    for embed in embeds:
+        total += len(embed.get("title", "")) + len(embed.get("description", ""))
+        total += len(embed.get("footer", {}).get("text", "")) + len(embed.get("author", {}).get("name", ""))
+        for field in embed.get("fields", ()):
+            total += len(field.get("name", "")) + len(field.get("value", ""))
+    if total > EMBED_TOTAL_CHARS:
+        return {"embeds": {"_errors": [{"code": "MAX_EMBED_SIZE_EXCEEDED",
+                                        "message": f"Maximo {EMBED_TOTAL_CHARS} caracteres en embeds"}]}}
+    return None
+
+
+# ==========================
+#  CONSOLA
+# ==========================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Emulador local de webhooks de Discord")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--limit", type=int, default=5, help="peticiones por ventana y webhook")
+    parser.add_argument("--window", type=float, default=2.0, help="segundos por ventana de rate-limit")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--revoked", action="append", default=[], help="id de webhook que responde 404")
+    parser.add_argument("--unauthorized", action="append", default=[], help="id de webhook que responde 401")
+    parser.add_argument("--record", help="guardar cada peticion en este JSONL")
+    parser.add_argument("--stats-interval", type=float, default=10.0)
+    args = parser.parse_args(argv)
+    emulator = DiscordEmulator(args.host, args.port, args.limit, args.window, args.latency_ms, args.jitter_ms,
+                               args.revoked, args.unauthorized, args.record)
+    print(f"Emulador de Discord en {emulator.url('<id>', '<token>')}")
+    print("Control: GET /_stats, POST /_revoke/<id>[?status=401], /_restore/<id>, /_reset")
+    try:
+        while True:
+            time.sleep(args.stats_interval)
+            stats = emulator.stats()
+            print(f"{stats['requests']} peticiones: " + ", ".join(f"{k}={v}" for k, v in stats["status"].items()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emulator.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+import ctypes
+import ctypes.util
+import fnmatch
+import glob
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from diagnostics import DIAG
+from supervisor import StopSignal, time_left
+
+log = logging.getLogger("discovery")
+
+PATTERN_CHARS = "*?["
+
+# Plazo para que el monitor de un archivo retirado vacie sus sinks
+RETIRE_TIMEOUT = 10.0
+
+# Mascaras de inotify (linux/inotify.h)
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def is_pattern(path):
+    return any(ch in (path or "") for ch in PATTERN_CHARS)
+
+
+def expand_patterns(data):
+    # Sustituye cada entrada con patron por una entrada por archivo que coincide ahora
+    expanded = []
+    for entry in data:
+        path = entry.get("logfile")
+        if not is_pattern(path):
+            expanded.append(entry)
+            continue
+        for match in sorted(glob.glob(path)):
+            if os.path.isfile(match):
+                expanded.append(dict(entry, logfile=match))
+    return expanded
+
+
+# ==========================
+#  INOTIFY (LINUX)
+# ==========================
+
+class Inotify:
+    """Avisos del kernel cuando se crea, borra o mueve un archivo en un directorio.
+
+    Solo Linux (via ctypes, sin dependencias); en otros sistemas el
+    constructor lanza OSError y el escaner usa el sondeo periodico.
+    """
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify solo esta disponible en Linux")
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.watches = {}
+        self.dirs = {}
+
+    def watch(self, directory):
+        if directory in self.dirs:
+            return True
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            log.warning(f"inotify: no se puede vigilar {directory}: {os.strerror(err)}")
+            return False
+        self.watches[wd] = directory
+        self.dirs[directory] = wd
+        return True
+
+    def read(self, timeout):
+        # Directorios con cambios; None si el kernel perdio avisos (hay que reescanear todo)
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        pos = 0
+        while pos + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, pos)
+            pos += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            directory = self.watches.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                # El directorio se borro o se desmonto
+                del self.watches[wd]
+                self.dirs.pop(directory, None)
+            changed.add(directory)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+# ==========================
+#  ESCANER DE DESCUBRIMIENTO
+# ==========================
+
+class DiscoveryScanner(threading.Thread):
+    """Un solo hilo para todas las entradas con patron (``C:/logs/*bot.log``).
+
+    Al arrancar, los archivos que ya coinciden se siguen desde el final
+    (como una entrada normal); los que aparecen despues se leen desde el
+    principio y los que desaparecen se retiran. Con inotify solo se relee
+    un directorio cuando el kernel avisa de un cambio (y cada
+    ``rescan_interval`` por seguridad); sin inotify se lista cada
+    directorio cada ``scan_interval`` segundos. Nunca hay un ``stat`` por
+    archivo vigilado.
+
+    ``start_monitor(entradas, stop_event, offset)`` arranca el monitor de
+    un archivo y devuelve su hilo; ``exclude(ruta)`` descarta archivos que
+    ya tienen una entrada explicita.
+    """
+
+    def __init__(self, entries, start_monitor, stop_event, exclude=None, output_callback=None,
+                 scan_interval=None, rescan_interval=60.0):
+        super().__init__(name="discovery", daemon=True)
+        self.entries = list(entries)
+        self.start_monitor = start_monitor
+        self.stop_event = stop_event
+        self.exclude = exclude
+        self.output_callback = output_callback
+        if scan_interval is None:
+            scan_interval = min(float(e.get("scan_interval", 5)) for e in self.entries)
+        self.scan_interval = max(0.5, float(scan_interval))
+        self.rescan_interval = float(rescan_interval)
+        # Para monitor_label
+        self.log_path = ", ".join(e["logfile"] for e in self.entries)
+        self.subscribers = len(self.entries)
+        self.directories = {}
+        self.found = {}
+        self.monitors = {}
+        # Monitores retirados que aun vacian sus sinks: ruta -> (hilo, plazo)
+        self.retiring = {}
+        self.scans = 0
+        try:
+            self.inotify = Inotify()
+        except (OSError, AttributeError) as e:
+            log.info(f"Descubrimiento sin inotify ({e}); sondeo cada {self.scan_interval:g}s")
+            self.inotify = None
+
+    def _notify(self, msg):
+        log.info(msg)
+        if self.output_callback:
+            self.output_callback(msg)
+
+    def _resolve(self):
+        # directorio -> [(patron de nombre, entrada)]; el directorio puede tener comodines
+        directories = {}
+        for entry in self.entries:
+            folder, name = os.path.split(entry["logfile"])
+            folder = folder or "."
+            for directory in (glob.glob(folder) if is_pattern(folder) else [folder]):
+                directories.setdefault(os.path.normpath(directory), []).append((name, entry))
+        self.directories = directories
+        if self.inotify is not None:
+            for directory in directories:
+                self.inotify.watch(directory)
+
+    def scan_all(self, initial=False):
+        self._resolve()
+        for directory in list(self.found):
+            if directory not in self.directories:
+                self.scan_directory(directory)
+        for directory in self.directories:
+            self.scan_directory(directory, initial)
+
+    def scan_directory(self, directory, initial=False):
+        self.scans += 1
+        patterns = self.directories.get(directory, [])
+        current = {}
+        if patterns:
+            try:
+                with os.scandir(directory) as it:
+                    names = [e.name for e in it if e.is_file()]
+            except OSError:
+                names = []
+            for name in names:
+                matched = [entry for pattern, entry in patterns if fnmatch.fnmatch(name, pattern)]
+                if matched:
+                    current[os.path.join(directory, name)] = matched
+        previous = self.found.get(directory, set())
+        for path in previous - current.keys():
+            self._retire(path)
+        handled = set()
+        for path, entries in current.items():
+            # Si no arranca se reintenta en el siguiente escaneo
+            if path in previous or (self.exclude is not None and self.exclude(path)) \
+                    or self._start(path, entries, initial):
+                handled.add(path)
+        if handled:
+            self.found[directory] = handled
+        else:
+            self.found.pop(directory, None)
+
+    def _start(self, path, entries, initial):
+        retired = self.retiring.pop(path, None)
+        if retired is not None:
+            # El archivo reaparece: su monitor anterior termina antes de que arranque
+            # el nuevo (dos monitores a la vez compartirian sinks y spool)
+            thread, deadline = retired
+            thread.join(max(0.0, deadline - time.monotonic()))
+            if thread.is_alive():
+                log.warning(f"Descubrimiento: el monitor anterior de {path} no termino a tiempo")
+        stop = StopSignal()
+        try:
+            thread = self.start_monitor([dict(e, logfile=path) for e in entries], stop,
+                                        None if initial else 0)
+        except Exception as e:
+            log.error(f"Descubrimiento: no se pudo iniciar el monitor de {path}: {e}", exc_info=True)
+            return False
+        self.monitors[path] = (stop, thread)
+        self._notify(f"Log {'encontrado' if initial else 'nuevo'}: {path}")
+        return True
+
+    def _retire(self, path):
+        monitor = self.monitors.pop(path, None)
+        if monitor is not None:
+            # Con su evento de parada activado el supervisor tampoco lo reinicia
+            stop, thread = monitor
+            stop.stop(RETIRE_TIMEOUT)
+            self.retiring = {p: item for p, item in self.retiring.items() if item[0].is_alive()}
+            self.retiring[path] = (thread, time.monotonic() + RETIRE_TIMEOUT)
+            self._notify(f"Log retirado (ya no existe): {path}")
+
+    def run(self):
+        DIAG.register("discovery", self.stats)
+        try:
+            self.scan_all(initial=True)
+            interval = self.rescan_interval if self.inotify is not None else self.scan_interval
+            next_full = time.monotonic() + interval
+            while not self.stop_event.is_set():
+                wait = max(0.0, min(1.0, next_full - time.monotonic()))
+                if self.inotify is not None:
+                    changed = self.inotify.read(wait)
+                    if changed is None:
+                        log.warning("inotify: avisos perdidos, se reescanea todo")
+                        next_full = 0.0
+                    else:
+                        for directory in changed:
+                            self.scan_directory(directory)
+                else:
+                    self.stop_event.wait(wait)
+                if time.monotonic() >= next_full:
+                    self.scan_all()
+                    next_full = time.monotonic() + interval
+        except Exception as e:
+            log.error(f"Descubrimiento: error en el escaner: {e}", exc_info=True)
+        finally:
+            # Los monitores heredan el plazo de la parada general
+            timeout = time_left(self.stop_event)
+            for stop, _ in self.monitors.values():
+                stop.stop(timeout)
+            for _, thread in self.monitors.values():
+                thread.join(time_left(self.stop_event))
+            for thread, _ in self.retiring.values():
+                thread.join(time_left(self.stop_event))
+            if self.inotify is not None:
+                self.inotify.close()
+            DIAG.unregister("discovery")
+
+    def stats(self):
+        return {"patterns": len(self.entries), "directories": len(self.directories),
+                "files": len(self.monitors), "scans": self.scans, "inotify": self.inotify is not None}
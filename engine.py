@@ -0,0 +1,408 @@
+import collections
+import itertools
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+
+from console import ConsoleSink
+from diagnostics import DIAG
+
+log = logging.getLogger("engine")
+
+PROTOCOL = 1
+
+
+def event_message(item):
+    # Evento del pipeline o texto de estado -> mensaje del protocolo
+    if isinstance(item, str):
+        return {"t": "log", "text": item}
+    return {"t": "event", "bot": item.bot, "type": item.type.name.lower(), "text": item.message,
+            "alert": item.alert, "ts": item.ts}
+
+
+# ==========================
+#  MOTOR (SERVICE)
+# ==========================
+
+class _Viewer:
+    # Una GUI conectada: cola propia acotada y un hilo que le escribe
+    def __init__(self, sock, address, size):
+        self.sock = sock
+        self.address = address
+        self.pending = collections.deque(maxlen=size)
+        self.replies = collections.deque()
+        self.wakeup = threading.Event()
+        self.dropped = 0
+        self.reported = 0
+        self.closed = False
+
+    def push(self, item):
+        pending = self.pending
+        if len(pending) == pending.maxlen:
+            self.dropped += 1
+        pending.append(item)
+        self.wakeup.set()
+
+    def reply(self, message):
+        # Las respuestas no compiten con los eventos por la cola acotada
+        self.replies.append(message)
+        self.wakeup.set()
+
+
+class EngineServer:
+    """Canal local entre el motor (modo SERVICE) y las GUIs que se conectan a el.
+
+    Protocolo de lineas JSON por TCP en 127.0.0.1 (como el control de
+    diagnostico). El motor envia ``hello``, los eventos retransmitidos
+    (``event``), los mensajes de estado (``log``) y las respuestas
+    (``reply``); la GUI envia comandos ``{"id": n, "cmd": ..., "args": ...}``:
+    ``status``, ``stats``, ``diag``, ``start``, ``stop`` y ``reload`` (los
+    tres ultimos los atiende ``commands``). Con ``token`` el primer mensaje
+    debe ser ``{"cmd": "hello", "token": ...}``.
+
+    Los monitores solo anaden a una cola acotada por GUI (O(1), sin
+    bloquear); cada GUI tiene su propio hilo escritor, asi que una GUI
+    lenta, congelada o cerrada solo pierde sus propias lineas (se le avisa
+    de cuantas) y nunca frena la retransmision. Las ultimas ``history``
+    lineas se envian a cada GUI al conectarse.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8766, token="", history=500, client_queue=5000, commands=None):
+        self.host = host
+        self.port = int(port)
+        self.token = token or ""
+        self.history = collections.deque(maxlen=max(0, int(history)))
+        self.client_queue = max(100, int(client_queue))
+        self.commands = dict(commands or {})
+        self.viewers = ()
+        self.started = time.time()
+        self.published = 0
+        self.lock = threading.Lock()
+        self._server = None
+
+    # ---- Entrada (hilos de monitor) ---- #
+    def put(self, ev):
+        with self.lock:
+            self.published += 1
+            self.history.append(ev)
+            for viewer in self.viewers:
+                viewer.push(ev)
+
+    def __call__(self, text):
+        with self.lock:
+            self.history.append(text)
+            for viewer in self.viewers:
+                viewer.push(text)
+
+    def sink(self, name):
+        return ViewerSink(self, name=name)
+
+    # ---- Conexiones ---- #
+    def start(self):
+        engine = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                engine.serve(self.connection, self.client_address, self.rfile)
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self._server = Server((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="engine-server", daemon=True).start()
+        DIAG.register("engine", self.stats)
+        log.info(f"Motor escuchando GUIs en {self.host}:{self.port}")
+        return self._server.server_address
+
+    def serve(self, sock, address, rfile):
+        viewer = _Viewer(sock, address, self.client_queue)
+        writer = None
+        try:
+            if self.token:
+                hello = self._read(rfile)
+                if not hello or hello.get("cmd") != "hello" or hello.get("token") != self.token:
+                    self._send(sock, [{"t": "error", "text": "token no valido"}])
+                    log.warning(f"Motor: GUI rechazada desde {address[0]} (token no valido)")
+                    return
+            self._send(sock, [{"t": "hello", "protocol": PROTOCOL, "pid": os.getpid(), "started": self.started}])
+            with self.lock:
+                # Historial y alta a la vez: ninguna linea se pierde ni se repite
+                for item in self.history:
+                    viewer.pending.append(item)
+                self.viewers = self.viewers + (viewer,)
+            viewer.wakeup.set()
+            writer = threading.Thread(target=self._write, args=(viewer,), name="engine-viewer", daemon=True)
+            writer.start()
+            log.info(f"Motor: GUI conectada desde {address[0]}:{address[1]}")
+            while not viewer.closed:
+                request = self._read(rfile)
+                if request is None:
+                    break
+                if request:
+                    viewer.reply({"t": "reply", "id": request.get("id"), **self.handle(request)})
+        except OSError:
+            pass
+        finally:
+            viewer.closed = True
+            viewer.wakeup.set()
+            with self.lock:
+                self.viewers = tuple(v for v in self.viewers if v is not viewer)
+            if writer is not None:
+                writer.join(2.0)
+            log.info(f"Motor: GUI desconectada ({address[0]}:{address[1]})")
+
+    @staticmethod
+    def _read(rfile):
+        # Siguiente mensaje JSON; None al cerrarse la conexion, {} si la linea no es valida
+        raw = rfile.readline(64 * 1024)
+        if not raw:
+            return None
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    @staticmethod
+    def _send(sock, messages):
+        data = "".join(json.dumps(m, ensure_ascii=False, default=str) + "\n" for m in messages)
+        sock.sendall(data.encode("utf-8"))
+
+    def _write(self, viewer):
+        pending = viewer.pending
+        while not viewer.closed:
+            viewer.wakeup.wait(1.0)
+            viewer.wakeup.clear()
+            batch = []
+            while viewer.replies:
+                batch.append(viewer.replies.popleft())
+            while pending and len(batch) < 1000:
+                try:
+                    item = pending.popleft()
+                except IndexError:
+                    break
+                batch.append(event_message(item))
+            if viewer.dropped != viewer.reported:
+                batch.append({"t": "log", "text": f"⚠️ {viewer.dropped - viewer.reported} lineas omitidas "
+                                                  f"(la GUI no las recogia a tiempo)"})
+                viewer.reported = viewer.dropped
+            if not batch:
+                continue
+            if pending:
+                viewer.wakeup.set()
+            try:
+                self._send(viewer.sock, batch)
+            except OSError:
+                viewer.closed = True
+                try:
+                    viewer.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    # ---- Comandos ---- #
+    def handle(self, request):
+        cmd = str(request.get("cmd", "")).lower()
+        args = request.get("args") or ""
+        try:
+            if cmd == "status":
+                status = self.commands["status"]() if "status" in self.commands else {}
+                return {"ok": True, "data": dict(status, pid=os.getpid(), uptime=round(time.time() - self.started),
+                                                 viewers=len(self.viewers))}
+            if cmd == "stats":
+                return {"ok": True, "data": DIAG.snapshot()}
+            if cmd == "diag":
+                return {"ok": True, "data": DIAG.handle_command(str(args))}
+            if cmd in self.commands and cmd != "status":
+                return {"ok": True, "data": self.commands[cmd]()}
+        except Exception as e:
+            log.error(f"Motor: error en el comando '{cmd}': {e}", exc_info=True)
+            return {"ok": False, "error": str(e)}
+        return {"ok": False, "error": f"comando desconocido: {cmd}"}
+
+    def stats(self):
+        viewers = self.viewers
+        return {"listen": f"{self.host}:{self.port}", "viewers": len(viewers), "published": self.published,
+                "dropped": sum(v.dropped for v in viewers)}
+
+    def close(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for viewer in self.viewers:
+            viewer.closed = True
+            viewer.wakeup.set()
+            try:
+                viewer.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        DIAG.unregister("engine")
+
+
+class ViewerSink(ConsoleSink):
+    """Sink de un monitor hacia las GUIs conectadas al motor: sin cola ni hilo propios."""
+
+    kind = "engine"
+
+
+# ==========================
+#  CLIENTE (GUI)
+# ==========================
+
+class EngineClient:
+    """Conexion de la GUI con el motor; se reconecta sola.
+
+    Un hilo lee los mensajes del motor y los deja en ``inbox``, que la GUI
+    vacia desde su propio hilo (``poll``); ``request`` envia un comando y
+    su respuesta llega por ``inbox`` a ``callback``. Si la GUI no recoge,
+    ``inbox`` descarta en lugar de crecer.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8766, token="", inbox_size=20000):
+        self.host = host
+        self.port = int(port)
+        self.token = token or ""
+        self.inbox = queue.Queue(maxsize=inbox_size)
+        self.callbacks = {}
+        self.ids = itertools.count(1)
+        self.sock = None
+        self.connected = False
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="engine-client", daemon=True)
+
+    @property
+    def address(self):
+        return f"{self.host}:{self.port}"
+
+    def start(self):
+        if not self._thread.is_alive():
+            self._thread.start()
+        return self
+
+    def _deliver(self, message):
+        try:
+            self.inbox.put_nowait(message)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        delay = 1.0
+        while not self._stop.is_set():
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=5)
+            except OSError as e:
+                self._deliver({"t": "state", "connected": False, "text": f"Motor no disponible en {self.address} "
+                                                                          f"({e}); reintento en {delay:g}s"})
+                self._stop.wait(delay)
+                delay = min(delay * 2, 30.0)
+                continue
+            sock.settimeout(None)
+            with self.lock:
+                self.sock = sock
+            try:
+                if self.token:
+                    self._write({"cmd": "hello", "token": self.token})
+                with sock.makefile("rb") as rfile:
+                    for raw in rfile:
+                        try:
+                            message = json.loads(raw)
+                        except ValueError:
+                            continue
+                        if message.get("t") == "hello":
+                            self.connected = True
+                            delay = 1.0
+                            self._deliver({"t": "state", "connected": True,
+                                           "text": f"Conectado al motor {self.address} (pid {message.get('pid')})"})
+                        else:
+                            self._deliver(message)
+            except OSError:
+                pass
+            finally:
+                with self.lock:
+                    self.sock = None
+                was_connected, self.connected = self.connected, False
+                sock.close()
+                if was_connected and not self._stop.is_set():
+                    self._deliver({"t": "state", "connected": False, "text": "Conexion con el motor perdida"})
+            # Tambien tras un rechazo (token): sin esperar se reconectaria en bucle
+            self._stop.wait(delay)
+            delay = min(delay * 2, 30.0)
+
+    def _write(self, message):
+        with self.lock:
+            if self.sock is None:
+                raise OSError("sin conexion con el motor")
+            self.sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+
+    def request(self, cmd, args="", callback=None):
+        request_id = next(self.ids)
+        if callback is not None:
+            self.callbacks[request_id] = callback
+        try:
+            self._write({"id": request_id, "cmd": cmd, "args": args})
+            return True
+        except OSError as e:
+            self.callbacks.pop(request_id, None)
+            if callback is not None:
+                callback({"ok": False, "error": str(e)})
+            return False
+
+    def poll(self, limit=2000):
+        # Mensajes pendientes (hilo de la GUI); las respuestas van a su callback
+        messages = []
+        for _ in range(limit):
+            try:
+                message = self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            if message.get("t") == "reply":
+                callback = self.callbacks.pop(message.get("id"), None)
+                if callback is not None:
+                    callback(message)
+                continue
+            messages.append(message)
+        return messages
+
+    def close(self):
+        self._stop.set()
+        with self.lock:
+            if self.sock is not None:
+                try:
+                    self.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+def _engine_options(config):
+    return {"host": config.get("ENGINE", "host", "127.0.0.1") or "127.0.0.1",
+            "port": int(config.get("ENGINE", "port", "0") or 0),
+            "token": config.get("ENGINE", "token", "")}
+
+
+def engine_from_config(config, commands=None):
+    # [ENGINE] port (0 = desactivado), host, token, history: motor SERVICE al que se conectan GUIs
+    if config is None:
+        return None
+    options = _engine_options(config)
+    if not options["port"]:
+        return None
+    return EngineServer(history=config.get("ENGINE", "history", "500"), commands=commands, **options)
+
+
+def engine_client_from_config(config):
+    # [ENGINE] attach = true: la GUI se conecta al motor en vez de monitorear en su proceso
+    if config is None or config.get("ENGINE", "attach", "false").lower() != "true":
+        return None
+    options = _engine_options(config)
+    if not options["port"]:
+        log.error("[ENGINE] attach = true necesita port")
+        return None
+    return EngineClient(**options)
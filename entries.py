@@ -0,0 +1,174 @@
+import csv
+import json
+import logging
+import os
+import tempfile
+
+from ingest import ingest_keys
+from sinks import SINK_TYPES
+from webhooks import webhook_display, webhook_urls
+
+log = logging.getLogger("entries")
+
+# Columnas del CSV de importacion/exportacion (las claves avanzadas, como "sinks", solo en JSON)
+CSV_COLUMNS = ("logfile", "webhook", "ingest", "bot")
+
+
+def entry_label(entry):
+    # Texto de una entrada en la GUI: su archivo o, si llega por red, sus claves de ingestion
+    if entry.get("logfile") or not ingest_keys(entry):
+        return entry.get("logfile", "")
+    return "ingest: " + ", ".join(ingest_keys(entry))
+
+
+def entry_identity(entry):
+    # Dos entradas iguales vigilan lo mismo y envian a los mismos webhooks
+    return entry_label(entry), tuple(webhook_urls(entry.get("webhook")))
+
+
+def parse_webhook(value):
+    # Una URL se guarda como texto; varias (pool de webhooks) como lista
+    urls = webhook_urls(value)
+    return urls if len(urls) > 1 else (urls[0] if urls else "")
+
+
+def validate_entry(entry):
+    """Lista de problemas de una entrada de settings.json (vacia si es valida)."""
+    if not isinstance(entry, dict):
+        return ["no es un objeto"]
+    errors = []
+    if not entry.get("logfile") and not ingest_keys(entry):
+        errors.append("falta logfile (o ingest)")
+    elif entry.get("logfile") is not None and not isinstance(entry.get("logfile"), str):
+        errors.append("logfile debe ser texto")
+    for url in webhook_urls(entry.get("webhook")):
+        if not url.startswith(("http://", "https://")):
+            errors.append(f"webhook no valido: {url[:60]}")
+    sinks = entry.get("sinks")
+    if sinks is not None:
+        if not isinstance(sinks, list):
+            errors.append("sinks debe ser una lista")
+        else:
+            for spec in sinks:
+                kind = spec.get("type", "webhook") if isinstance(spec, dict) else None
+                if kind not in SINK_TYPES:
+                    errors.append(f"sink desconocido: {kind}")
+    if not webhook_urls(entry.get("webhook")) and not sinks:
+        errors.append("sin webhook ni sinks")
+    return errors
+
+
+# ==========================
+#  LECTURA Y ESCRITURA
+# ==========================
+
+def load_entries(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, list):
+        raise ValueError(f"{path}: se esperaba una lista de entradas")
+    return data
+
+
+def save_entries(path, data):
+    """Escribe settings.json de forma atomica.
+
+    Se escribe en un temporal de la misma carpeta y se renombra encima:
+    un corte a mitad de escritura deja el archivo anterior intacto, nunca
+    uno a medias.
+    """
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".settings-", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _csv_entry(row):
+    entry = {}
+    for column in CSV_COLUMNS:
+        value = (row.get(column) or "").strip()
+        if not value:
+            continue
+        if column == "webhook":
+            # Varias URLs separadas por comas, punto y coma o espacios
+            value = parse_webhook(value.replace(";", ",").replace(" ", ","))
+        elif column == "ingest":
+            value = [k.strip() for k in value.replace(";", ",").split(",") if k.strip()]
+        entry[column] = value
+    return entry
+
+
+def import_entries(path, existing=()):
+    """Lee entradas de un CSV (``logfile,webhook[,ingest,bot]``) o de un JSON.
+
+    Devuelve ``(nuevas, errores)``: las filas no validas se saltan con su
+    numero y motivo en ``errores``, y las que ya estan en ``existing`` (o
+    repetidas en el propio archivo) no se vuelven a anadir.
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            sample = f.read(4096)
+            f.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+            except csv.Error:
+                dialect = csv.excel
+            reader = csv.DictReader(f, dialect=dialect)
+            if not reader.fieldnames or "logfile" not in [c.strip().lower() for c in reader.fieldnames]:
+                return [], [f"{path}: falta la cabecera (columnas {', '.join(CSV_COLUMNS)})"]
+            reader.fieldnames = [c.strip().lower() for c in reader.fieldnames]
+            rows = [(reader.line_num, _csv_entry(row)) for row in reader]
+    else:
+        with open(path, "r", encoding="utf-8-sig") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get("monitors", [data])
+        if not isinstance(data, list):
+            return [], [f"{path}: se esperaba una lista de entradas"]
+        rows = list(enumerate(data, 1))
+    seen = {entry_identity(e) for e in existing}
+    entries, errors = [], []
+    duplicates = 0
+    for number, entry in rows:
+        problems = validate_entry(entry)
+        if problems:
+            errors.append(f"fila {number}: {'; '.join(problems)}")
+            continue
+        identity = entry_identity(entry)
+        if identity in seen:
+            duplicates += 1
+            continue
+        seen.add(identity)
+        entries.append(entry)
+    if duplicates:
+        errors.append(f"{duplicates} entradas repetidas omitidas")
+    return entries, errors
+
+
+def export_entries(path, data):
+    # CSV con las columnas basicas o JSON completo (igual que settings.json), segun la extension
+    if not path.lower().endswith(".csv"):
+        save_entries(path, list(data))
+        return len(data)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        for entry in data:
+            writer.writerow({
+                "logfile": entry.get("logfile", ""),
+                "webhook": webhook_display(entry.get("webhook")),
+                "ingest": ", ".join(ingest_keys(entry)),
+                "bot": entry.get("bot", ""),
+            })
+    return len(data)
@@ -0,0 +1,197 @@
+import collections
+import heapq
+import logging
+import threading
+import time
+
+from diagnostics import DIAG
+from pipeline import EventType
+from sinks import WebhookSink
+from webhooks import webhook_urls
+
+log = logging.getLogger("feed")
+
+# Nombre en [FEED] events -> tipo de evento
+FEED_TYPES = {
+    "create": EventType.CREATE,
+    "join": EventType.JOIN,
+    "leave": EventType.LEAVE,
+    "chat": EventType.CHAT,
+}
+
+DEFAULT_PREFIX = "[{bot}]"
+
+
+# ==========================
+#  FEED GLOBAL ORDENADO
+# ==========================
+
+class MergedFeed:
+    """Canal unico con los eventos de todos los bots en orden cronologico.
+
+    Cada monitor entrega aqui sus eventos con la fecha de su linea de log
+    (``line_ts``). Es una mezcla de k vias: en el heap hay como mucho un
+    evento por archivo (el mas antiguo pendiente de ese archivo) y el resto
+    espera en una cola corta por archivo. La cabeza del heap sale cuando
+    todos los archivos activos tienen un evento en el heap (no puede llegar
+    nada anterior) o cuando lleva ``window`` segundos esperando (absorbe el
+    desfase entre archivos sin retener eventos indefinidamente). La memoria
+    depende del numero de archivos y de ``per_source``, no del atraso.
+    """
+
+    def __init__(self, sink, types=(EventType.CREATE, EventType.JOIN), window=2.0, per_source=1000,
+                 prefix=DEFAULT_PREFIX):
+        self.sink = sink
+        self.types = frozenset(types)
+        self.window = max(0.0, float(window))
+        self.per_source = max(1, int(per_source))
+        self.prefix = prefix
+        self.heap = []
+        self.heads = set()
+        self.buffers = {}
+        self.active = set()
+        self.last_ts = {}
+        self.last_emitted = None
+        self.seq = 0
+        self.received = 0
+        self.emitted = 0
+        self.late = 0
+        self.forced = 0
+        self._closing = False
+        self.cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="feed", daemon=True)
+
+    def start(self):
+        if not self._thread.is_alive():
+            self.sink.start()
+            self._thread.start()
+            DIAG.register("feed", self.stats)
+        return self
+
+    # ---- Entrada (hilos de monitor) ---- #
+    def attach(self, source):
+        with self.cond:
+            self.active.add(source)
+
+    def detach(self, source):
+        # El archivo ya no produce eventos: deja de frenar la mezcla
+        with self.cond:
+            self.active.discard(source)
+            self.last_ts.pop(source, None)
+            self.cond.notify()
+
+    def put(self, ev):
+        if ev.type not in self.types:
+            return False
+        ts = ev.line_ts if ev.line_ts is not None else ev.ts
+        source = ev.source
+        with self.cond:
+            # Dentro de un archivo el orden es el de lectura aunque la fecha retroceda
+            last = self.last_ts.get(source)
+            if last is not None and ts < last:
+                ts = last
+            self.last_ts[source] = ts
+            self.active.add(source)
+            self.received += 1
+            self.seq += 1
+            item = (ts, self.seq, source, time.monotonic(), ev)
+            if source not in self.heads:
+                heapq.heappush(self.heap, item)
+                self.heads.add(source)
+            else:
+                buffer = self.buffers.get(source)
+                if buffer is None:
+                    buffer = self.buffers[source] = collections.deque()
+                buffer.append(item)
+                while len(buffer) > self.per_source:
+                    # Cola del archivo llena: adelantar la salida en vez de crecer
+                    self.forced += 1
+                    self._pop()
+            self.cond.notify()
+        return True
+
+    # ---- Mezcla ---- #
+    def _complete(self):
+        return all(source in self.heads for source in self.active)
+
+    def _pop(self):
+        ts, _, source, _, ev = heapq.heappop(self.heap)
+        buffer = self.buffers.get(source)
+        if buffer:
+            heapq.heappush(self.heap, buffer.popleft())
+        else:
+            self.heads.discard(source)
+            self.buffers.pop(source, None)
+        if self.last_emitted is not None and ts < self.last_emitted:
+            self.late += 1
+        else:
+            self.last_emitted = ts
+        self.emitted += 1
+        self.sink.put(self.render(ev))
+
+    def render(self, ev):
+        # Copia: el evento original sigue en las colas de los sinks del monitor
+        ev = ev.copy()
+        ev.digested = None
+        if self.prefix:
+            ev.message = f"{self.prefix.replace('{bot}', ev.bot or '')} {ev.message or ''}"
+        return ev
+
+    def _run(self):
+        with self.cond:
+            while True:
+                if not self.heap:
+                    if self._closing:
+                        return
+                    self.cond.wait()
+                    continue
+                wait = self.heap[0][3] + self.window - time.monotonic()
+                if wait > 0 and not self._closing and not self._complete():
+                    self.cond.wait(wait)
+                    continue
+                self._pop()
+
+    def stats(self):
+        with self.cond:
+            return {
+                "sources": len(self.active),
+                "pending": len(self.heap) + sum(len(b) for b in self.buffers.values()),
+                "received": self.received,
+                "emitted": self.emitted,
+                "late": self.late,
+                "forced": self.forced,
+                "sink": self.sink.stats(),
+            }
+
+    def close(self, timeout=5.0):
+        # Vacia lo pendiente en orden y cierra el destino
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            self._closing = True
+            self.cond.notify()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        self.sink.close(max(0.0, deadline - time.monotonic()))
+        DIAG.unregister("feed")
+
+
+def feed_from_config(config):
+    # [FEED] webhook (vacio = desactivado), events, window, prefix, mode, coalesce, per_source
+    if config is None:
+        return None
+    urls = webhook_urls(config.get("FEED", "webhook", ""))
+    if not urls:
+        return None
+    names = [n.strip().lower() for n in config.get("FEED", "events", "create, join").split(",") if n.strip()]
+    unknown = [n for n in names if n not in FEED_TYPES]
+    if unknown:
+        log.warning(f"[FEED] events: tipos desconocidos {', '.join(unknown)}")
+    sink = WebhookSink(urls, name="feed", ordered=True,
+                       mode=config.get("FEED", "mode", "content"),
+                       coalesce=config.get("FEED", "coalesce", "false").lower() == "true")
+    feed = MergedFeed(sink,
+                      types=[FEED_TYPES[n] for n in names if n in FEED_TYPES],
+                      window=config.get("FEED", "window", "2"),
+                      per_source=config.get("FEED", "per_source", "1000"),
+                      prefix=config.get("FEED", "prefix", DEFAULT_PREFIX))
+    return feed.start()
@@ -0,0 +1,207 @@
+import array
+import bisect
+import csv
+import functools
+import ipaddress
+import logging
+import os
+import threading
+import time
+
+try:
+    import maxminddb
+except ImportError:
+    maxminddb = None
+
+log = logging.getLogger("geoip")
+
+
+def ip_to_int(ip):
+    try:
+        return int(ipaddress.IPv4Address(ip.strip()))
+    except (ipaddress.AddressValueError, ValueError, AttributeError):
+        return None
+
+
+# ==========================
+#  BASE CSV DE RANGOS
+# ==========================
+
+class RangeDatabase:
+    """Rangos IPv4 en arrays ordenados; la busqueda es binaria (bisect).
+
+    Acepta CSV con cabecera y columnas ``start,end,country[,asn]`` (IPs en
+    texto o como entero) o ``network,country[,asn]`` (CIDR).
+    """
+
+    def __init__(self):
+        self.starts = array.array("I")
+        self.ends = array.array("I")
+        self.values = array.array("I")
+        self.table = []
+
+    @classmethod
+    def from_csv(cls, path):
+        rows = []
+        labels = {}
+        with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                row = {k.strip().lower(): (v or "").strip() for k, v in row.items() if k}
+                if row.get("network"):
+                    try:
+                        net = ipaddress.IPv4Network(row["network"], strict=False)
+                    except ValueError:
+                        continue
+                    start, end = int(net.network_address), int(net.broadcast_address)
+                else:
+                    start, end = _parse_ip_field(row.get("start")), _parse_ip_field(row.get("end"))
+                    if start is None or end is None:
+                        continue
+                label = (row.get("country") or row.get("country_code") or "", row.get("asn") or "")
+                index = labels.get(label)
+                if index is None:
+                    index = labels[label] = len(labels)
+                rows.append((start, end, index))
+        rows.sort()
+        db = cls()
+        db.table = [None] * len(labels)
+        for label, index in labels.items():
+            db.table[index] = label
+        for start, end, index in rows:
+            db.starts.append(start)
+            db.ends.append(end)
+            db.values.append(index)
+        return db
+
+    def lookup(self, ip):
+        n = ip_to_int(ip)
+        if n is None:
+            return None
+        i = bisect.bisect_right(self.starts, n) - 1
+        if i >= 0 and n <= self.ends[i]:
+            return self.table[self.values[i]]
+        return None
+
+    def __len__(self):
+        return len(self.starts)
+
+
+def _parse_ip_field(value):
+    if not value:
+        return None
+    if value.isdigit():
+        return int(value)
+    return ip_to_int(value)
+
+
+class MmdbDatabase:
+    # Base MaxMind (.mmdb) via el paquete opcional ``maxminddb``
+    def __init__(self, path):
+        self.reader = maxminddb.open_database(path)
+
+    def lookup(self, ip):
+        try:
+            record = self.reader.get(ip)
+        except ValueError:
+            return None
+        if not record:
+            return None
+        country = (record.get("country") or record.get("registered_country") or {}).get("iso_code", "")
+        asn = record.get("autonomous_system_number")
+        org = record.get("autonomous_system_organization")
+        if asn:
+            asn = f"AS{asn}" + (f" {org}" if org else "")
+        return country or "", asn or ""
+
+    def __len__(self):
+        return 0
+
+
+# ==========================
+#  ENRIQUECEDOR
+# ==========================
+
+class GeoIP:
+    """Etapa de enriquecimiento: anade ``country``/``asn`` a las entradas de jugador.
+
+    La base se carga (y se recarga si cambia) en un hilo aparte; mientras no
+    esta lista los eventos pasan sin datos, nunca se bloquea al monitor.
+    Un LRU delante de la busqueda hace que las IPs repetidas no cuesten nada.
+    """
+
+    def __init__(self, path, cache_size=4096, unknown="??"):
+        self.path = path
+        self.unknown = unknown
+        self.db = None
+        self._mtime = None
+        self._checked = time.monotonic()
+        self._loading = threading.Lock()
+        self.lookup = functools.lru_cache(maxsize=int(cache_size))(self._lookup)
+        self.reload_async()
+
+    def reload_async(self):
+        threading.Thread(target=self.reload, name="geoip-load", daemon=True).start()
+
+    def reload(self):
+        if not self._loading.acquire(blocking=False):
+            return
+        try:
+            mtime = os.path.getmtime(self.path)
+            if self.path.lower().endswith(".mmdb"):
+                if maxminddb is None:
+                    log.error("Para bases .mmdb instala el paquete 'maxminddb'")
+                    return
+                db = MmdbDatabase(self.path)
+            else:
+                db = RangeDatabase.from_csv(self.path)
+            self.db = db
+            self._mtime = mtime
+            self.lookup.cache_clear()
+            log.info(f"GeoIP cargado desde {self.path} ({len(db)} rangos)")
+        except Exception as e:
+            log.error(f"No se pudo cargar GeoIP {self.path}: {e}", exc_info=True)
+        finally:
+            self._loading.release()
+
+    def check_for_changes(self):
+        try:
+            if os.path.getmtime(self.path) != self._mtime:
+                self.reload_async()
+        except OSError:
+            pass
+
+    def _lookup(self, ip):
+        db = self.db
+        if db is None:
+            return None
+        return db.lookup(ip)
+
+    def __call__(self, ev):
+        if ev.ip:
+            now = time.monotonic()
+            if now - self._checked > 60:
+                self._checked = now
+                self.check_for_changes()
+            if self.db is None:
+                return ev
+            found = self.lookup(ev.ip)
+            if found:
+                ev.country = found[0] or self.unknown
+                ev.asn = found[1] or self.unknown
+            else:
+                ev.country = ev.asn = self.unknown
+        return ev
+
+
+def geoip_from_config(config):
+    # [GEOIP] database = data/geoip.csv (vacio = desactivado), cache_size = 4096
+    if config is None:
+        return None
+    path = config.get("GEOIP", "database", "")
+    if not path:
+        return None
+    if not os.path.exists(path):
+        log.error(f"Base GeoIP no encontrada: {path}")
+        return None
+    return GeoIP(path, cache_size=config.get("GEOIP", "cache_size", "4096"))
@@ -0,0 +1,521 @@
+import logging
+import os
+import re
+import selectors
+import socket
+import sys
+import threading
+import time
+
+from diagnostics import DIAG
+from digest import Digest
+from pipeline import Pipeline, Renderer
+from sinks import build_sinks
+from supervisor import time_left
+
+log = logging.getLogger("ingest")
+
+MAX_LINE_BYTES = 64 * 1024
+RECV_BUFFER = 4 * 1024 * 1024
+UDP_BATCH = 512
+
+# <PRI> al principio de un mensaje syslog
+SYSLOG_PRI = re.compile(r"<(\d{1,3})>")
+# RFC 5424: VERSION TIMESTAMP HOSTNAME APP-NAME PROCID MSGID STRUCTURED-DATA MSG
+RFC5424 = re.compile(r"1 (\S+) (\S+) (\S+) (\S+) (\S+) (-|(?:\[(?:[^\]\\]|\\.)*\])+)(?: (.*))?", re.S)
+# RFC 3164: [TIMESTAMP] [HOSTNAME] TAG[pid]: MSG
+RFC3164 = re.compile(r"(?:[A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d )?(?:([^\s:\[\]]+) )?([^\s:\[\]]+)(?:\[[^\]]*\])?: ?(.*)",
+                     re.S)
+
+
+def parse_syslog(text):
+    """Separa un mensaje syslog en (host, tag, mensaje).
+
+    Admite RFC 5424 y RFC 3164; sin ``<PRI>`` es una linea sin cabecera y
+    devuelve ``(None, None, texto)``. El "-" de RFC 5424 cuenta como vacio.
+    """
+    m = SYSLOG_PRI.match(text)
+    if m is None:
+        return None, None, text
+    rest = text[m.end():]
+    m = RFC5424.fullmatch(rest)
+    if m is not None:
+        host, tag, msg = m.group(2), m.group(3), m.group(7) or ""
+        if msg.startswith("\ufeff"):
+            msg = msg[1:]
+        return (None if host == "-" else host), (None if tag == "-" else tag), msg
+    if rest.startswith("1 "):
+        # RFC 5424 con datos estructurados mal formados: la cabecera sigue sirviendo
+        parts = rest.split(" ", 6)
+        if len(parts) == 7:
+            return parts[2], parts[3], parts[6]
+    m = RFC3164.match(rest)
+    if m is not None:
+        return m.group(1), m.group(2), m.group(3)
+    return None, None, rest
+
+
+def ingest_keys(entry):
+    # "ingest": "d2nbot" o ["d2nbot", "10.0.0.5"] -> claves en minusculas
+    keys = entry.get("ingest")
+    if isinstance(keys, str):
+        keys = keys.split(",")
+    return [k.strip().casefold() for k in keys or [] if k and k.strip()]
+
+
+def ingest_entries(data):
+    # Entradas de settings.json que reciben sus lineas por red en vez de leer un archivo
+    return [e for e in data if ingest_keys(e) and (e.get("webhook") or e.get("sinks"))]
+
+
+# ==========================
+#  CANAL POR BOT
+# ==========================
+
+class IngestChannel:
+    """Lo que hace ``MonitorThread`` con un archivo, para las lineas recibidas de un bot.
+
+    Mismo pipeline, sinks, digest y feed; el nombre del bot es ``"bot"`` de
+    la entrada o su primera clave ``ingest``.
+    """
+
+    def __init__(self, entries, config_watcher=None, enrichers=None, output_callback=None, feed=None):
+        self.entries = entries
+        self.keys = [k for e in entries for k in ingest_keys(e)]
+        self.bot = entries[0].get("bot") or ingest_keys(entries[0])[0]
+        self.source = f"ingest:{self.bot}"
+        self.sinks = []
+        taken = set()
+        for i, entry in enumerate(entries):
+            # Los sinks se nombran por el bot y el destino (spool data/spool/<bot>-webhook-<hash>.jsonl)
+            self.sinks.extend(build_sinks(dict(entry, logfile=entry.get("logfile") or self.bot),
+                                          output_callback if i == 0 else None, notify=output_callback,
+                                          taken=taken))
+        self.pipeline = Pipeline(self.bot, self.source, renderer=Renderer(config_watcher),
+                                 enrichers=enrichers, deliver=self.deliver)
+        self.digest = Digest(self.bot, self.source, config_watcher)
+        self.feed = feed
+        self.pipeline.stamp_lines = feed is not None
+        self.lines = 0
+        self.errors = 0
+
+    def start(self):
+        for sink in self.sinks:
+            sink.start()
+        if self.feed is not None:
+            self.feed.attach(self.source)
+
+    def deliver(self, event):
+        if self.digest.types and self.digest.feed(event):
+            event.digested = True
+        for sink in self.sinks:
+            sink.put(event)
+        if self.feed is not None:
+            self.feed.put(event)
+
+    def process(self, line):
+        self.lines += 1
+        try:
+            return self.pipeline.process(line)
+        except Exception as e:
+            self.errors += 1
+            log.error(f"Error procesando linea de {self.bot}: {line} - {e}", exc_info=True)
+
+    def tick(self):
+        for summary in self.digest.tick():
+            self.pipeline.emit(summary)
+
+    def stop(self, timeout):
+        for summary in self.digest.collect(force=True):
+            self.pipeline.emit(summary)
+        for sink in self.sinks:
+            sink.stop(timeout)
+
+    def close(self, timeout):
+        for sink in self.sinks:
+            sink.close(timeout)
+        if self.feed is not None:
+            self.feed.detach(self.source)
+
+
+# ==========================
+#  CONEXION TCP
+# ==========================
+
+SKIP_LINE = -1
+
+
+class _Client:
+    # Buffer de una conexion TCP; ``syslog`` admite tambien el entramado por longitud (RFC 6587)
+    __slots__ = ("sock", "ip", "syslog", "buffer", "skip")
+
+    def __init__(self, sock, ip, syslog):
+        self.sock = sock
+        self.ip = ip
+        self.syslog = syslog
+        self.buffer = b""
+        # Resto de un mensaje demasiado largo que aun hay que saltar: bytes que
+        # faltan de una trama con longitud, o SKIP_LINE (hasta el siguiente salto)
+        self.skip = 0
+
+    def frames(self, final=False):
+        buf = self.buffer
+        pos = 0
+        frames = []
+        size = len(buf)
+        if self.skip == SKIP_LINE:
+            end = buf.find(b"\n")
+            if end < 0:
+                self.buffer = b""
+                return frames
+            pos = end + 1
+            self.skip = 0
+        elif self.skip:
+            pos = min(self.skip, size)
+            self.skip -= pos
+        while pos < size:
+            if self.syslog and 48 <= buf[pos] <= 57:
+                # "LONGITUD MENSAJE"
+                space = buf.find(b" ", pos, pos + 8)
+                if space < 0 and size - pos < 8 and not final:
+                    break
+                if space > pos and buf[pos:space].isdigit():
+                    length = int(buf[pos:space])
+                    end = space + 1 + length
+                    if end > size:
+                        if length > MAX_LINE_BYTES:
+                            # Se descarta entera, tambien lo que aun no ha llegado
+                            frames.append(None)
+                            self.skip = end - size
+                            pos = size
+                        break
+                    frames.append(buf[space + 1:end])
+                    pos = end
+                    continue
+            end = buf.find(b"\n", pos)
+            if end < 0:
+                if final:
+                    frames.append(buf[pos:])
+                    pos = size
+                elif size - pos > MAX_LINE_BYTES:
+                    # Linea demasiado larga: se descarta hasta su salto de linea
+                    frames.append(None)
+                    self.skip = SKIP_LINE
+                    pos = size
+                break
+            frames.append(buf[pos:end])
+            pos = end + 1
+        self.buffer = buf[pos:]
+        return frames
+
+
+# ==========================
+#  LISTENER
+# ==========================
+
+class IngestListener(threading.Thread):
+    """Recibe lineas de log por red y las pasa al pipeline de su bot.
+
+    Un solo hilo con ``selectors`` atiende syslog por UDP (``udp_port``) y
+    por TCP (``tcp_port``, un mensaje por linea o con longitud delante) y
+    lineas sin cabecera por TCP (``raw_port``). Cada mensaje va al bot cuya
+    clave ``ingest`` coincide con el tag/APP-NAME, el host o la IP del
+    emisor (``"*"`` recoge el resto). Los sinks tienen su propia cola, asi
+    que el hilo solo parsea: en cada vuelta vacia el socket UDP de golpe
+    (hasta ``UDP_BATCH`` datagramas) y el buffer del kernel absorbe las
+    rafagas.
+
+    Tiene ``heartbeat``, ``offset``, ``sinks`` y ``error`` como
+    ``MonitorThread``: el supervisor lo reinicia igual que a un monitor.
+    """
+
+    def __init__(self, entries, stop_event, host="127.0.0.1", udp_port=0, tcp_port=0, raw_port=0,
+                 config_watcher=None, enrichers=None, output_callback=None, feed=None, max_clients=256):
+        super().__init__(name="ingest", daemon=True)
+        self.stop_event = stop_event
+        self.host = host
+        self.ports = {"udp": int(udp_port or 0), "tcp": int(tcp_port or 0), "raw": int(raw_port or 0)}
+        self.config_watcher = config_watcher
+        self.output_callback = output_callback
+        self.max_clients = int(max_clients)
+        groups = {}
+        for entry in entries:
+            groups.setdefault(entry.get("bot") or ingest_keys(entry)[0], []).append(entry)
+        self.channels = [IngestChannel(group, config_watcher, enrichers, output_callback, feed)
+                         for group in groups.values()]
+        self.routes = {}
+        for channel in self.channels:
+            for key in channel.keys:
+                if key in self.routes and self.routes[key] is not channel:
+                    log.warning(f"Ingestion: la clave '{key}' esta en {self.routes[key].bot} y {channel.bot}")
+                self.routes.setdefault(key, channel)
+        self.sinks = [sink for channel in self.channels for sink in channel.sinks]
+        self.log_path = f"ingest {host} " + " ".join(f"{k}:{p}" for k, p in self.ports.items() if p)
+        self.subscribers = len(entries)
+        self.selector = None
+        self.clients = {}
+        self.unknown = set()
+        self.datagrams = 0
+        self.connections = 0
+        self.unmatched = 0
+        self.dropped = 0
+        # Estado para el supervisor (supervisor.py)
+        self.heartbeat = time.monotonic()
+        self.offset = None
+        self.state = "iniciando"
+        self.error = None
+
+    def _notify(self, msg):
+        log.info(msg)
+        if self.output_callback:
+            self.output_callback(msg)
+
+    def _bind(self):
+        selector = selectors.DefaultSelector()
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        try:
+            for kind in ("udp", "tcp", "raw"):
+                if not self.ports[kind]:
+                    continue
+                sock = socket.socket(family, socket.SOCK_DGRAM if kind == "udp" else socket.SOCK_STREAM)
+                selector.register(sock, selectors.EVENT_READ, kind)
+                if kind == "udp":
+                    try:
+                        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER)
+                    except OSError:
+                        pass
+                    sock.bind((self.host, self.ports[kind]))
+                else:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                    sock.bind((self.host, self.ports[kind]))
+                    sock.listen(64)
+                sock.setblocking(False)
+        except OSError:
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+            selector.close()
+            raise
+        self.selector = selector
+        return selector
+
+    # ---- Entrada ---- #
+    def route(self, host, tag, ip):
+        routes = self.routes
+        for key in (tag, host, ip):
+            if key:
+                channel = routes.get(key.casefold())
+                if channel is not None:
+                    return channel
+        return routes.get("*")
+
+    def handle(self, data, ip, syslog=True):
+        if not data:
+            return
+        text = data.decode("utf-8", "replace")
+        host, tag, msg = parse_syslog(text) if syslog else (None, None, text)
+        channel = self.route(host, tag, ip)
+        if channel is None:
+            self.unmatched += 1
+            key = tag or host or ip
+            if key not in self.unknown and len(self.unknown) < 1000:
+                self.unknown.add(key)
+                log.warning(f"Ingestion: mensaje de '{key}' sin entrada en settings.json")
+            return
+        for line in msg.split("\n"):
+            line = line.strip("\r\x00 ")
+            if line:
+                channel.process(line)
+
+    def _read_udp(self, sock):
+        for _ in range(UDP_BATCH):
+            try:
+                data, addr = sock.recvfrom(MAX_LINE_BYTES)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                # Windows: ICMP "puerto inalcanzable" de un envio anterior
+                log.debug(f"Ingestion UDP: {e}")
+                return
+            self.datagrams += 1
+            self.handle(data, addr[0])
+
+    def _accept(self, sock, kind):
+        try:
+            conn, addr = sock.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        if len(self.clients) >= self.max_clients:
+            log.warning(f"Ingestion: demasiadas conexiones, se rechaza {addr[0]}")
+            conn.close()
+            return
+        conn.setblocking(False)
+        client = _Client(conn, addr[0], kind == "tcp")
+        self.clients[conn] = client
+        self.connections += 1
+        self.selector.register(conn, selectors.EVENT_READ, client)
+
+    def _read_client(self, client):
+        try:
+            data = client.sock.recv(256 * 1024)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if data:
+            client.buffer += data
+        for frame in client.frames(final=not data):
+            if frame is None:
+                self.dropped += 1
+                log.warning(f"Ingestion: mensaje de mas de {MAX_LINE_BYTES} bytes descartado ({client.ip})")
+            else:
+                self.handle(frame, client.ip, client.syslog)
+        if not data:
+            self._drop(client)
+
+    def _drop(self, client):
+        self.clients.pop(client.sock, None)
+        try:
+            self.selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        client.sock.close()
+
+    def run(self):
+        # Tras un reinicio el listener anterior puede tardar un momento en soltar el puerto
+        deadline = time.monotonic() + 3.0
+        while True:
+            try:
+                selector = self._bind()
+                break
+            except OSError as e:
+                if self.stop_event.is_set() or time.monotonic() >= deadline:
+                    self.error = str(e)
+                    self.state = "error"
+                    log.error(f"Ingestion: no se puede abrir {self.log_path}: {e}")
+                    if self.output_callback:
+                        self.output_callback(f"Ingestion: no se puede abrir {self.log_path}: {e}")
+                    return
+                self.stop_event.wait(0.2)
+        for channel in self.channels:
+            channel.start()
+            channel.pipeline.status(f"Ingestion iniciada para {channel.bot} ({self.log_path})")
+        DIAG.register("ingest", self.stats)
+        self._notify(f"Ingestion escuchando en {self.log_path}")
+        self.state = "escuchando"
+        next_check = 0.0
+        try:
+            while not self.stop_event.is_set():
+                now = time.monotonic()
+                self.heartbeat = now
+                if now >= next_check:
+                    # Una vez por segundo, no por linea: cambios de plantillas y resumenes
+                    next_check = now + 1.0
+                    if self.config_watcher is not None:
+                        self.config_watcher.check_for_changes()
+                    for channel in self.channels:
+                        channel.tick()
+                for key, _ in selector.select(0.5):
+                    kind = key.data
+                    if kind == "udp":
+                        self._read_udp(key.fileobj)
+                    elif kind in ("tcp", "raw"):
+                        self._accept(key.fileobj, kind)
+                    else:
+                        self._read_client(kind)
+        except Exception as e:
+            self.error = str(e)
+            log.error(f"Ingestion: error en {self.log_path}: {e}", exc_info=True)
+        finally:
+            for client in list(self.clients.values()):
+                self._drop(client)
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+            selector.close()
+            timeout = time_left(self.stop_event)
+            for channel in self.channels:
+                channel.stop(timeout)
+            for channel in self.channels:
+                channel.close(timeout)
+            DIAG.unregister("ingest")
+            self.state = "error" if self.error else "detenido"
+
+    def stats(self):
+        return {
+            "listen": self.log_path,
+            "datagrams": self.datagrams,
+            "connections": self.connections,
+            "clients": len(self.clients),
+            "unmatched": self.unmatched,
+            "dropped": self.dropped,
+            "bots": {c.bot: {"lines": c.lines, "errors": c.errors} for c in self.channels},
+        }
+
+
+def ingest_from_config(config):
+    # [INGEST] host, udp_port, tcp_port, raw_port, max_clients; sin puertos = desactivado
+    if config is None:
+        return None
+    options = {
+        "host": config.get("INGEST", "host", "127.0.0.1") or "127.0.0.1",
+        "udp_port": int(config.get("INGEST", "udp_port", "0") or 0),
+        "tcp_port": int(config.get("INGEST", "tcp_port", "0") or 0),
+        "raw_port": int(config.get("INGEST", "raw_port", "0") or 0),
+        "max_clients": int(config.get("INGEST", "max_clients", "256") or 256),
+    }
+    if not (options["udp_port"] or options["tcp_port"] or options["raw_port"]):
+        return None
+    return options
+
+
+# ==========================
+#  EMISOR DE PRUEBA
+# ==========================
+
+def send(path, host="127.0.0.1", port=5514, tag="bot", proto="udp", rate=0.0):
+    """Envia las lineas de ``path`` como syslog RFC 3164 (``proto`` udp, tcp o raw).
+
+    ``rate`` = lineas por segundo (0 = lo mas rapido posible). Devuelve
+    cuantas lineas se enviaron y los segundos empleados.
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_DGRAM if proto == "udp" else socket.SOCK_STREAM)
+    if proto != "udp":
+        sock.connect((host, port))
+    sent = 0
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        for raw in f:
+            line = raw.rstrip(b"\r\n")
+            if not line:
+                continue
+            if proto == "raw":
+                sock.sendall(line + b"\n")
+            else:
+                now = time.localtime()
+                stamp = time.strftime("%b ", now) + f"{now.tm_mday:2d}" + time.strftime(" %H:%M:%S", now)
+                msg = f"<134>{stamp} {socket.gethostname()} {tag}: ".encode() + line
+                if proto == "udp":
+                    sock.sendto(msg, (host, port))
+                else:
+                    sock.sendall(b"%d %s" % (len(msg), msg))
+            sent += 1
+            if rate:
+                delay = start + sent / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+    sock.close()
+    return sent, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    # python ingest.py archivo.log [host:puerto] [tag] [udp|tcp|raw] [lineas/s]
+    if len(sys.argv) < 2 or not os.path.isfile(sys.argv[1]):
+        print("Uso: python ingest.py archivo.log [127.0.0.1:5514] [tag] [udp|tcp|raw] [lineas/s]")
+        sys.exit(1)
+    target = sys.argv[2] if len(sys.argv) > 2 else "127.0.0.1:5514"
+    addr, _, port_text = target.rpartition(":")
+    count, seconds = send(sys.argv[1], addr or "127.0.0.1", int(port_text),
+                          tag=sys.argv[3] if len(sys.argv) > 3 else "bot",
+                          proto=sys.argv[4] if len(sys.argv) > 4 else "udp",
+                          rate=float(sys.argv[5]) if len(sys.argv) > 5 else 0.0)
+    print(f"{count} lineas enviadas en {seconds:.2f}s ({count / max(seconds, 1e-9):.0f}/s)")
@@ -4,11 +4,28 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
 import threading
 import time
-import re
+import queue
 import os
-import json
 import configparser
-import requests
+
+from abuse import abuse_from_config
+from applog import EVENT_LOG, logging_from_config
+from cluster import cluster_from_config, file_lease_key
+from diagnostics import DIAG, setup_diagnostics
+from console import console_from_config
+from digest import Digest
+from entries import entry_label, export_entries, import_entries, load_entries, parse_webhook, save_entries, \
+    validate_entry
+from discovery import DiscoveryScanner, expand_patterns, is_pattern
+from engine import engine_client_from_config, engine_from_config
+from feed import feed_from_config
+from geoip import geoip_from_config
+from ingest import IngestListener, ingest_entries, ingest_from_config, ingest_keys
+from pipeline import Pipeline, Renderer
+from sinks import CLOSE_TOTALS, build_sinks
+from supervisor import StopSignal, supervisor_from_config, time_left
+from watchlist import watchlist_from_config
+from webhooks import webhook_display
 
 try:
     import pystray
@@ -20,6 +37,16 @@ APP_NAME = "GhostMonitorLOG"
 CONFIG_INI_PATH = "config/default_messages.ini"
 CONFIG_JSON_PATH = "data/settings.json"
 MAIN_CONFIG_PATH = "config/config.ini"
+# Una linea mas larga se descarta entera sin acumularla en memoria
+MAX_LINE_BYTES = 64 * 1024
+# Plazo para vaciar los sinks de un monitor que se detiene sin parada ordenada
+SINK_CLOSE_TIMEOUT = 10.0
+# Plazo por defecto de la parada ordenada ([APP] shutdown_timeout); el ultimo
+# tramo se reserva para guardar en el spool lo que no se pudo enviar
+SHUTDOWN_TIMEOUT = 10.0
+SHUTDOWN_PERSIST = 1.0
+# Lineas que conserva la pestaña "Logs en vivo" (las mas antiguas se borran)
+MAX_OUTPUT_LINES = 5000
 
 
 # ==========================
@@ -29,7 +56,7 @@ MAIN_CONFIG_PATH = "config/config.ini"
 class AppConfig:
     def __init__(self, ini_path=MAIN_CONFIG_PATH):
         self.ini_path = ini_path
-        self.config = configparser.ConfigParser()
+        self.config = configparser.ConfigParser(inline_comment_prefixes=(";",))
         self.load()
 
     def load(self):
@@ -59,16 +86,11 @@ class AppConfig:
 #  LOGGING GLOBAL
 # ==========================
 
-def setup_logging(level="INFO"):
-    lvl = getattr(logging, level.upper(), logging.INFO)
-    os.makedirs("logs", exist_ok=True)
-    logging.basicConfig(
-        filename="logs/app.log",
-        filemode="a",
-        format="%(asctime)s %(levelname)s %(message)s",
-        level=lvl
-    )
-    logging.info(f"{APP_NAME} iniciado en nivel {level}")
+def setup_logging(config=None, level="INFO"):
+    # Cola + hilo escritor con rotacion ([LOGGING] en config.ini, ver applog.py):
+    # los monitores nunca escriben en disco al loguear
+    logging_from_config(config, level)
+    logging.info(f"{APP_NAME} iniciado en nivel {logging.getLevelName(logging.getLogger().level)}")
 
 
 # ==========================
@@ -119,115 +141,516 @@ class ConfigWatcher:
 # ==========================
 
 class MonitorThread(threading.Thread):
-    def __init__(self, log_path, webhook, config_watcher, stop_event, output_callback=None):
+    def __init__(self, log_path, webhook, config_watcher, stop_event, output_callback=None, sinks=None,
+                 enrichers=None, start_offset=None, checkpoint=None, feed=None):
         super().__init__(daemon=True)
         self.log_path = log_path
         self.webhook = webhook
         self.config_watcher = config_watcher
         self.stop_event = stop_event
         self.output_callback = output_callback
+        self.bot = os.path.splitext(os.path.basename(log_path))[0]
+        self.subscribers = 1
+        # Modo cluster: continuar desde el offset guardado e ir guardandolo
+        self.start_offset = start_offset
+        self.checkpoint = checkpoint
+        # Todos los eventos detectados pasan por los sinks (webhook, jsonl, udp, stdout...)
+        if sinks is None:
+            sinks = build_sinks({"logfile": log_path, "webhook": webhook}, output_callback)
+        self.sinks = sinks
+        # leer -> clasificar -> enriquecer -> renderizar -> entregar (ver pipeline.py)
+        self.pipeline = Pipeline(self.bot, log_path, renderer=Renderer(config_watcher),
+                                 enrichers=enrichers, deliver=self.deliver)
+        # Resumenes por partida ([DIGEST] en default_messages.ini)
+        self.digest = Digest(self.bot, log_path, config_watcher)
+        # Feed global compartido por todos los monitores ([FEED] en config.ini)
+        self.feed = feed
+        self.pipeline.stamp_lines = feed is not None
+        # Estado para el supervisor (supervisor.py): latido, ultimo offset procesado y error
+        self.heartbeat = time.monotonic()
+        self.offset = None
+        self.state = "iniciando"
+        self.error = None
+
+    def wait_for_file(self):
+        # Un archivo que aun no existe (bot sin arrancar) se espera en lugar de abandonar
+        if os.path.exists(self.log_path):
+            return True
+        msg = f"{APP_NAME}: archivo no encontrado, esperando a que aparezca: {self.log_path}"
+        logging.warning(msg)
+        if self.output_callback:
+            self.output_callback(msg)
+        self.state = "esperando archivo"
+        while not self.stop_event.is_set():
+            self.heartbeat = time.monotonic()
+            if os.path.exists(self.log_path):
+                # Todo lo que tenga el archivo nuevo es posterior al arranque
+                if self.start_offset is None:
+                    self.start_offset = 0
+                return True
+            self.stop_event.wait(1.0)
+        return False
 
     def run(self):
-        if not os.path.exists(self.log_path):
-            msg = f"{APP_NAME}: archivo no encontrado: {self.log_path}"
-            logging.error(msg)
-            if self.output_callback:
-                self.output_callback(msg)
+        if not self.wait_for_file():
+            self.state = "detenido"
             return
 
+        for sink in self.sinks:
+            sink.start()
+        if self.feed is not None:
+            self.feed.attach(self.log_path)
+
         # 🔔 Log a Discord cuando arranca este monitor
         startup_msg = f"{APP_NAME}: monitor iniciado para {self.log_path}"
-        self.send_webhook(startup_msg)
+        self.pipeline.status(startup_msg)
         logging.info(startup_msg)
-        if self.output_callback:
-            self.output_callback(startup_msg)
 
+        offset = None
         try:
-            with open(self.log_path, "r", encoding="utf-8") as f:
-                f.seek(0, 2)  # Ir al final del archivo
+            # Lectura binaria: el offset en bytes de cada linea es exacto y una
+            # linea a medio escribir se guarda hasta que llegue su salto de linea
+            with open(self.log_path, "rb") as f:
+                offset = f.seek(0, 2)  # Ir al final del archivo
+                if self.start_offset is not None and self.start_offset <= offset:
+                    offset = f.seek(self.start_offset)
+                self.offset = offset
+                self.state = "leyendo"
+                pending = b""
+                skipped = 0
+                profiling = False
                 while not self.stop_event.is_set():
-                    line = f.readline()
-                    if not line:
+                    self.heartbeat = time.monotonic()
+                    if DIAG.profiling is not profiling:
+                        profiling = DIAG.profile_tick()
+                    for summary in self.digest.tick():
+                        self.pipeline.emit(summary)
+                    if DIAG.timing:
+                        t0, c0 = time.perf_counter(), time.thread_time()
+                        raw = f.readline(MAX_LINE_BYTES)
+                        if raw:
+                            DIAG.record(self.bot, "read", t0, c0)
+                    else:
+                        raw = f.readline(MAX_LINE_BYTES)
+                    if not raw:
+                        if self.checkpoint is not None and self.checkpoint.due():
+                            self.checkpoint.update(self.delivered_offset(offset))
                         time.sleep(0.1)
                         continue
-                    self.process_line(line.strip())
+                    if not raw.endswith(b"\n"):
+                        pending += raw
+                        if len(pending) >= MAX_LINE_BYTES:
+                            skipped += len(pending)
+                            pending = b""
+                        continue
+                    if skipped:
+                        skipped += len(pending) + len(raw)
+                        logging.warning(f"{APP_NAME}: linea de {skipped} bytes descartada en {self.log_path}")
+                        offset += skipped
+                        self.offset = offset
+                        skipped = 0
+                        pending = b""
+                        continue
+                    if pending:
+                        raw = pending + raw
+                        pending = b""
+                    self.process_line(raw.decode("utf-8", "replace").strip(), offset)
+                    offset += len(raw)
+                    self.offset = offset
+                    if self.checkpoint is not None and self.checkpoint.due():
+                        self.checkpoint.update(self.delivered_offset(offset))
         except Exception as e:
+            self.error = str(e)
             logging.error(f"{APP_NAME}: Error monitorizando {self.log_path}: {e}", exc_info=True)
             if self.output_callback:
                 self.output_callback(f"Error monitorizando {self.log_path}: {e}")
+        finally:
+            # Los resumenes pendientes salen antes de cerrar los sinks
+            for summary in self.digest.collect(force=True):
+                self.pipeline.emit(summary)
+            # Todos los sinks vacian a la vez hasta el plazo de la parada (ver shutdown)
+            timeout = time_left(self.stop_event, SINK_CLOSE_TIMEOUT)
+            for sink in self.sinks:
+                sink.stop(timeout)
+            for sink in self.sinks:
+                sink.close(timeout)
+            if self.feed is not None:
+                self.feed.detach(self.log_path)
+            if self.checkpoint is not None and offset is not None:
+                # Si algun sink no entrego todo, el checkpoint vuelve a su primera linea pendiente
+                lost = [sink.lost_offset for sink in self.sinks if sink.lost_offset is not None]
+                self.checkpoint.update(min([offset] + lost), force=True)
+            self.state = "error" if self.error else "detenido"
+
+    def delivered_offset(self, offset):
+        # El checkpoint avanza hasta la primera linea que algun sink aun no entrego
+        pending = [o for o in (sink.pending_offset() for sink in self.sinks) if o is not None]
+        return min([offset] + pending)
+
+    def deliver(self, event):
+        if self.digest.types and self.digest.feed(event):
+            event.digested = True
+        for sink in self.sinks:
+            sink.put(event)
+        if self.feed is not None:
+            self.feed.put(event)
 
-    def send_webhook(self, msg):
+    # ===== Detección de eventos ===== #
+    def process_line(self, line, offset=-1):
+        self.config_watcher.check_for_changes()
         try:
-            res = requests.post(self.webhook, json={"content": msg})
-            if res.status_code not in (200, 204):
-                logging.error(f"{APP_NAME}: Webhook error {res.status_code}: {res.text}")
+            return self.pipeline.process(line, offset)
         except Exception as e:
-            logging.error(f"{APP_NAME}: Webhook send error: {e}", exc_info=True)
+            logging.error(f"Error procesando linea: {line} - {e}", exc_info=True)
 
-    # ===== Detección de eventos ===== #
-    def process_line(self, line):
-        if self.config_watcher.check_for_changes():
-            pass
 
-        cfg = self.config_watcher.config
+def file_key(path):
+    # Identidad física del archivo: (dispositivo, inodo) si existe, si no la ruta canónica
+    canonical = os.path.normcase(os.path.realpath(path))
+    try:
+        st = os.stat(canonical)
+        if st.st_ino:
+            return ("inode", st.st_dev, st.st_ino)
+    except OSError:
+        pass
+    return ("path", canonical)
+
+
+def group_entries(data):
+    # Agrupa las entradas de settings.json que apuntan al mismo archivo físico:
+    # un solo lector y un solo parseo por línea para todos sus destinos
+    groups = {}
+    for entry in data:
+        log_path = entry.get("logfile")
+        if log_path and not is_pattern(log_path) and not ingest_keys(entry) \
+                and (entry.get("webhook") or entry.get("sinks")):
+            groups.setdefault(file_key(log_path), []).append(entry)
+    return list(groups.values())
+
+
+def start_monitor(entries, watcher, stop_event, enrichers=None, output_callback=None, start_offset=None,
+                  checkpoint=None, feed=None):
+    # Un hilo por archivo físico con los sinks de todas sus entradas
+    sinks = []
+    # Nombres (y spools) únicos en todo el grupo: dos entradas con el mismo destino se rechazan
+    taken = set()
+    for i, entry in enumerate(entries):
+        # El callback (GUI) solo una vez por archivo, no una por destino
+        sinks.extend(build_sinks(entry, output_callback if i == 0 else None, notify=output_callback, taken=taken))
+    t = MonitorThread(entries[0]["logfile"], entries[0].get("webhook"), watcher, stop_event,
+                      output_callback, sinks=sinks, enrichers=enrichers, start_offset=start_offset,
+                      checkpoint=checkpoint, feed=feed)
+    t.subscribers = len(entries)
+    t.start()
+    return t
+
+
+def monitor_launcher(watcher, enrichers=None, output_callback=None, feed=None, supervisor=None, checkpoint=None):
+    # launch(entradas, stop_event, offset) -> hilo; con supervisor, el monitor se reinicia si falla
+    def launch(entries, stop_event, start_offset=None):
+        return start_monitor(entries, watcher, stop_event, enrichers, output_callback, start_offset=start_offset,
+                             checkpoint=checkpoint, feed=feed)
+    return supervisor.wrap(launch) if supervisor is not None else launch
+
+
+def start_ingest(data, options, watcher, stop_event, enrichers=None, output_callback=None, feed=None,
+                 supervisor=None):
+    # Entradas con "ingest": un solo listener de red para todas ([INGEST] en config.ini)
+    entries = ingest_entries(data)
+    if not entries or not options:
+        return None
+
+    def launch(entries, stop_event, start_offset=None):
+        listener = IngestListener(entries, stop_event, config_watcher=watcher, enrichers=enrichers,
+                                  output_callback=output_callback, feed=feed, **options)
+        listener.start()
+        return listener
+    launch = supervisor.wrap(launch) if supervisor is not None else launch
+    return launch(entries, stop_event)
+
+
+def start_monitors(data, watcher, stop_event, enrichers=None, output_callback=None, feed=None, supervisor=None,
+                   ingest=None):
+    launch = monitor_launcher(watcher, enrichers, output_callback, feed, supervisor)
+    threads = [launch(entries, stop_event) for entries in group_entries(data)]
+    listener = start_ingest(data, ingest, watcher, stop_event, enrichers, output_callback, feed, supervisor)
+    if listener is not None:
+        threads.append(listener)
+    patterns = [e for e in data if is_pattern(e.get("logfile")) and not ingest_keys(e)
+                and (e.get("webhook") or e.get("sinks"))]
+    if patterns:
+        # Entradas con comodines: un solo escaner arranca y retira sus monitores
+        known = {file_key(t.log_path) for t in threads}
+        scanner = DiscoveryScanner(patterns, launch, stop_event, exclude=lambda path: file_key(path) in known,
+                                   output_callback=output_callback)
+        scanner.start()
+        threads.append(scanner)
+    return threads
+
+
+def monitor_label(thread):
+    if thread.subscribers > 1:
+        return f"{thread.log_path} ({thread.subscribers} destinos)"
+    return thread.log_path
+
+
+def shutdown(stop_event, threads, timeout=SHUTDOWN_TIMEOUT, feed=None, node=None, report=print, enrichers=None):
+    """Parada ordenada con plazo.
+
+    Los monitores dejan de leer, vacian los lotes y las colas de envio hasta
+    ``timeout`` segundos; lo que no sale a tiempo queda en el spool del
+    webhook (o en el checkpoint, en modo cluster) y se informa de la
+    duracion y de los eventos perdidos. Con ``enrichers`` (parada final)
+    se cierran tambien sus webhooks de alertas.
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    before = dict(CLOSE_TOTALS)
+    drain = max(0.0, timeout - min(SHUTDOWN_PERSIST, timeout / 2))
+    stop_event.stop(drain)
+    if node is not None:
+        node.close(drain)
+    for t in threads:
+        t.join(max(0.0, deadline - time.monotonic()))
+    if feed is not None:
+        # El feed recibe lo ultimo de los monitores: se vacia despues
+        feed.close(max(1.0, deadline - time.monotonic()))
+    close_enrichers(enrichers, max(1.0, deadline - time.monotonic()))
+    unfinished = sum(1 for t in threads if t.is_alive())
+    result = {
+        "seconds": round(time.monotonic() - start, 2),
+        "spooled": CLOSE_TOTALS["spooled"] - before.get("spooled", 0),
+        "lost": CLOSE_TOTALS["lost"] - before.get("lost", 0),
+        "unfinished": unfinished,
+    }
+    msg = (f"Parada en {result['seconds']:.1f}s: {result['spooled']} mensajes guardados en spool, "
+           f"{result['lost']} eventos perdidos" + (f", {unfinished} monitores sin terminar" if unfinished else ""))
+    logging.info(msg)
+    if report:
+        report(msg)
+    return result
+
+
+def build_enrichers(config):
+    # Etapas de enriquecimiento compartidas por todos los monitores
+    enrichers = []
+    geo = geoip_from_config(config)
+    if geo:
+        enrichers.append(geo)
+    watch = watchlist_from_config(config)
+    if watch:
+        enrichers.append(watch)
+    abuse = abuse_from_config(config)
+    if abuse:
+        enrichers.append(abuse)
+    return enrichers
+
+
+def close_enrichers(enrichers, timeout=SHUTDOWN_TIMEOUT):
+    # Despues de los monitores: las ultimas alertas ya estan en cola
+    for enricher in enrichers or ():
+        close = getattr(enricher, "close", None)
+        if close is not None:
+            close(timeout)
 
-        try:
-            # Crear partida
-            match_game = re.search(r"creating game \[(.*)\]", line)
-            if match_game:
-                game_name = match_game.group(1)
-                template = cfg["MESSAGES"].get("messagecreate", "Game created: {game_name}")
-                msg = template.replace("{game_name}", game_name)
-                self.send_webhook(msg)
-                if self.output_callback:
-                    self.output_callback(f"[{self.log_path}] {msg}")
-                return
-
-            # Entrada jugador
-            match_player = re.search(r"player \[(.*)\|(.+?)\] joined the game", line)
-            if match_player:
-                user = match_player.group(1)
-                ip = match_player.group(2)
-                template = cfg["MESSAGES"].get("messageplayer", "{user} connected from {ip}")
-                msg = template.replace("{user}", user).replace("{ip}", ip)
-                self.send_webhook(msg)
-                if self.output_callback:
-                    self.output_callback(f"[{self.log_path}] {msg}")
-                return
-
-            # Salida jugador
-            match_leave = re.search(r"deleting player \[(.*)\]:", line)
-            if match_leave:
-                user = match_leave.group(1)
-                template = cfg["MESSAGES"].get("messagetoleave", "{user} left the game")
-                msg = template.replace("{user}", user)
-                self.send_webhook(msg)
-                if self.output_callback:
-                    self.output_callback(f"[{self.log_path}] {msg}")
-                return
-
-            # 🔥 Mensajes de chat
-            # Soporta:
-            # [GAME: DotA v6.85n #1] [Lobby] [User]: msg
-            # [GAME: Pulpin War Arena #4] (22:31) [All] [User]: msg
-            match_chat = re.search(
-                r"\[GAME:\s*(.*?)\](?:.*?\((\d{1,2}:\d{2})\))?.*?\[(Lobby|All|Team|Observer)\]\s*\[(.*?)\]:\s*(.+)",
-                line
-            )
-            if match_chat:
-                game = match_chat.group(1).strip()
-                user = match_chat.group(4).strip()
-                message = match_chat.group(5).strip()
-
-                msg = f"[{game}] {user}: {message}"
-
-                self.send_webhook(msg)
-                if self.output_callback:
-                    self.output_callback(f"[{self.log_path}] {msg}")
-                return
 
-        except Exception as e:
-            logging.error(f"Error procesando linea: {line} - {e}", exc_info=True)
+# ==========================
+#  CONTROL DEL SERVICIO
+# ==========================
+
+class ServiceMonitors:
+    """Monitores del modo SERVICE, que una GUI conectada al motor puede
+    detener, arrancar o recargar (settings.json) sin reiniciar el proceso."""
+
+    def __init__(self, watcher, enrichers=None, output_callback=None, feed=None, supervisor=None, ingest=None,
+                 timeout=SHUTDOWN_TIMEOUT, report=print):
+        self.watcher = watcher
+        self.enrichers = enrichers
+        self.output_callback = output_callback
+        self.feed = feed
+        self.supervisor = supervisor
+        self.ingest = ingest
+        self.timeout = timeout
+        self.report = report
+        self.stop_event = None
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def start(self, data=None):
+        with self.lock:
+            return self._start(data)
+
+    def stop(self):
+        with self.lock:
+            return self._stop()
+
+    def reload(self):
+        # settings.json se lee antes de parar: si no es valido, los monitores siguen como estaban
+        data = load_entries(CONFIG_JSON_PATH)
+        with self.lock:
+            self._stop()
+            return self._start(data)
+
+    def _start(self, data):
+        if self.stop_event is not None:
+            return f"ya hay {len(self.threads)} monitores en marcha"
+        if data is None:
+            data = load_entries(CONFIG_JSON_PATH)
+        self.stop_event = StopSignal()
+        self.threads = start_monitors(data, self.watcher, self.stop_event, self.enrichers, self.output_callback,
+                                      feed=self.feed, supervisor=self.supervisor, ingest=self.ingest)
+        for t in self.threads:
+            self.report(f"🟢 Monitor (SERVICE) iniciado: {monitor_label(t)}")
+        return f"{len(self.threads)} monitores iniciados"
+
+    def _stop(self, feed=None, node=None, enrichers=None):
+        if self.stop_event is None:
+            return "no habia monitores en marcha"
+        count = len(self.threads)
+        shutdown(self.stop_event, self.threads, self.timeout, feed=feed, node=node,
+                 report=lambda msg: self.report(f"✅ {msg}"), enrichers=enrichers)
+        self.stop_event, self.threads = None, []
+        return f"{count} monitores detenidos"
+
+    def close(self, node=None):
+        # Parada final del proceso: tambien se vacian el feed y las alertas
+        with self.lock:
+            if self.stop_event is None:
+                self.stop_event = StopSignal()
+            return self._stop(self.feed, node, self.enrichers)
+
+    def status(self):
+        threads = list(self.threads)
+        status = {"running": self.stop_event is not None, "monitors": [monitor_label(t) for t in threads]}
+        if self.supervisor is not None:
+            status["supervisor"] = self.supervisor.stats()
+        return status
+
+
+# ==========================
+#  LISTA VIRTUAL
+# ==========================
+
+class VirtualList(ttk.Frame):
+    """Treeview que solo pinta las filas visibles de una lista de cualquier tamano.
+
+    ``set_items([(clave, valores), ...])`` cambia el contenido (filtro,
+    altas, bajas) sin tocar cada fila del widget: al desplazarse se vuelven
+    a pintar las ``height`` filas visibles. La seleccion se guarda por
+    clave en ``selected`` y se mantiene al desplazarse o filtrar; un clic
+    sin Ctrl/Mayus la sustituye, con Ctrl/Mayus la amplia.
+    """
+
+    def __init__(self, parent, columns, headings, widths, height=15, on_activate=None, on_change=None):
+        super().__init__(parent)
+        self.items = []
+        self.selected = set()
+        self.top = 0
+        self.rows = height
+        self.on_activate = on_activate
+        self.on_change = on_change
+        self._painted = set()
+        self._extend = False
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", height=height, selectmode="extended")
+        for column, heading, width in zip(columns, headings, widths):
+            self.tree.heading(column, text=heading)
+            self.tree.column(column, width=width)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._scrollbar)
+        self.tree.grid(row=0, column=0, sticky="ew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.columnconfigure(0, weight=1)
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree.bind("<ButtonPress-1>", self._on_press, add=True)
+        self.tree.bind("<KeyPress>", self._on_press, add=True)
+        self.tree.bind("<Double-1>", lambda e: self.on_activate and self.on_activate())
+        self.tree.bind("<MouseWheel>", self._on_wheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3) or "break")
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3) or "break")
+        self.tree.bind("<Up>", lambda e: self._key(-1))
+        self.tree.bind("<Down>", lambda e: self._key(1))
+        self.tree.bind("<Prior>", lambda e: self.scroll(-self.rows) or "break")
+        self.tree.bind("<Next>", lambda e: self.scroll(self.rows) or "break")
+
+    def set_items(self, items):
+        self.items = items
+        self.selected &= {key for key, _ in items}
+        self.top = max(0, min(self.top, len(items) - self.rows))
+        self.paint()
+
+    def select_all(self):
+        self.selected = {key for key, _ in self.items}
+        self.paint()
+
+    def scroll(self, delta):
+        top = max(0, min(self.top + delta, len(self.items) - self.rows))
+        if top != self.top:
+            self.top = top
+            self.paint()
+
+    def visible(self):
+        return self.items[self.top:self.top + self.rows]
+
+    def paint(self):
+        tree = self.tree
+        tree.delete(*tree.get_children())
+        visible = self.visible()
+        for key, values in visible:
+            tree.insert("", "end", iid=str(key), values=values)
+        # El aviso <<TreeviewSelect>> de esta seleccion llega despues: se reconoce por _painted
+        self._painted = {key for key, _ in visible if key in self.selected}
+        tree.selection_set([str(key) for key in self._painted])
+        total = len(self.items)
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + self.rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        if self.on_change:
+            self.on_change()
+
+    def _scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll(int(float(amount) * len(self.items)) - self.top)
+        elif action == "scroll":
+            self.scroll(int(amount) * (self.rows if unit == "pages" else 1))
+
+    def _on_wheel(self, event):
+        # Windows: multiplos de 120; macOS: valores pequenos
+        steps = event.delta // 120 if abs(event.delta) >= 120 else (1 if event.delta > 0 else -1)
+        self.scroll(-3 * steps)
+        return "break"
+
+    def _on_press(self, event):
+        # Ctrl (0x4) o Mayus (0x1) amplian la seleccion; si no, la sustituyen
+        self._extend = bool(event.state & 0x0005)
+
+    def _on_select(self, _event):
+        chosen = {int(iid) for iid in self.tree.selection()}
+        if chosen == self._painted:
+            return
+        self._painted = chosen
+        if self._extend:
+            visible = {key for key, _ in self.visible()}
+            self.selected = (self.selected - visible) | chosen
+        else:
+            self.selected = chosen
+        if self.on_change:
+            self.on_change()
+
+    def _key(self, step):
+        # Flechas en el borde de lo visible: desplazar en vez de quedarse parado
+        children = self.tree.get_children()
+        if not children or self.tree.focus() != (children[0] if step < 0 else children[-1]):
+            return None
+        before = self.top
+        self.scroll(step)
+        if self.top == before:
+            return "break"
+        children = self.tree.get_children()
+        target = children[0] if step < 0 else children[-1]
+        self.selected = {int(target)}
+        self.tree.focus(target)
+        self.paint()
+        return "break"
 
 
 # ==========================
@@ -241,13 +664,36 @@ class GhostMonitorApp:
 
         self.app_config = app_config
         self.config_watcher = ConfigWatcher(CONFIG_INI_PATH)
+        # [ENGINE] attach = true: los monitores corren en el proceso SERVICE y
+        # esta ventana solo muestra sus eventos y le envia ordenes
+        self.engine = engine_client_from_config(app_config)
+        if self.engine is None:
+            self.enrichers = build_enrichers(app_config)
+            self.feed = feed_from_config(app_config)
+            self.supervisor = supervisor_from_config(app_config, notify=self.log_output)
+            self.ingest = ingest_from_config(app_config)
+        else:
+            self.enrichers, self.feed, self.supervisor, self.ingest = [], None, None, None
         self.monitors = []
         self.monitor_stop_events = []
         self.data = []
+        self.shutdown_timeout = float(app_config.get("APP", "shutdown_timeout", SHUTDOWN_TIMEOUT)
+                                      if app_config else SHUTDOWN_TIMEOUT)
 
+        # log_output llega desde los hilos de sinks, supervisor y parada: se encola
+        # y el hilo de Tk lo muestra en poll_output
+        self.output_queue = queue.SimpleQueue()
         self.setup_ui()
+        self.poll_output()
+        self.root.protocol("WM_DELETE_WINDOW", self.exit_app)
         self.load_settings()
 
+        if self.engine is not None:
+            self.log_output(f"Conectando con el motor en {self.engine.address}...")
+            self.engine.start()
+            self.poll_engine()
+            return
+
         # 🔁 AutoStart monitoreo si está activado en config.ini
         auto_start_str = "false"
         if self.app_config:
@@ -271,86 +717,281 @@ class GhostMonitorApp:
 
     def setup_logs_tab(self):
         frame = self.tab_logs
-        columns = ("logfile", "webhook")
-        self.tree = ttk.Treeview(frame, columns=columns, show="headings", height=12)
-        self.tree.heading("logfile", text="Archivo LOG")
-        self.tree.heading("webhook", text="Webhook URL")
-        self.tree.column("logfile", width=350)
-        self.tree.column("webhook", width=350)
-        self.tree.grid(row=0, column=0, columnspan=4, padx=10, pady=10)
-
-        ttk.Button(frame, text="Añadir", command=self.add_log).grid(row=1, column=0, padx=5, pady=5)
-        ttk.Button(frame, text="Guardar", command=self.save_data).grid(row=1, column=1, padx=5, pady=5)
-        ttk.Button(frame, text="Iniciar", command=self.start_monitoring).grid(row=1, column=2, padx=5, pady=5)
-        ttk.Button(frame, text="Detener", command=self.stop_monitoring).grid(row=1, column=3, padx=5, pady=5)
+        frame.columnconfigure(1, weight=1)
+
+        ttk.Label(frame, text="Filtrar:").grid(row=0, column=0, padx=(10, 5), pady=(10, 0), sticky="w")
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", lambda *_: self.schedule_filter())
+        ttk.Entry(frame, textvariable=self.filter_var).grid(row=0, column=1, columnspan=3, padx=(0, 10),
+                                                            pady=(10, 0), sticky="ew")
+        self.filter_job = None
+
+        self.tree = VirtualList(frame, columns=("logfile", "webhook"), headings=("Archivo LOG", "Webhook URL"),
+                                widths=(350, 350), height=15, on_activate=self.edit_webhooks,
+                                on_change=self.update_count)
+        self.tree.grid(row=1, column=0, columnspan=4, padx=10, pady=10, sticky="ew")
+        self.count_var = tk.StringVar()
+        ttk.Label(frame, textvariable=self.count_var).grid(row=2, column=0, columnspan=4, padx=10, sticky="w")
+
+        buttons = [
+            ("Añadir", self.add_log), ("Añadir carpeta", self.add_pattern),
+            ("Editar webhook", self.edit_webhooks), ("Eliminar", self.delete_selected),
+            ("Seleccionar todo", self.tree.select_all), ("Importar", self.import_data),
+            ("Exportar", self.export_data), ("Guardar", self.save_data),
+            ("Iniciar", self.start_monitoring), ("Detener", self.stop_monitoring),
+        ]
+        for i, (text, command) in enumerate(buttons):
+            ttk.Button(frame, text=text, command=command).grid(row=3 + i // 4, column=i % 4, padx=5, pady=5,
+                                                              sticky="ew")
 
     def setup_output_tab(self):
         frame = self.tab_output
         self.txt_output = tk.Text(frame, state="disabled", bg="#1e1e1e", fg="white")
         self.txt_output.pack(fill="both", expand=True)
 
+    # ---- Lista de monitores ---- #
+    def refresh_list(self):
+        # Vuelve a filtrar self.data; la lista solo pinta las filas visibles
+        needle = self.filter_var.get().strip().casefold()
+        rows = []
+        for entry in self.data:
+            values = (entry_label(entry), webhook_display(entry.get("webhook")))
+            if needle and needle not in f"{values[0]} {values[1]} {entry.get('bot', '')}".casefold():
+                continue
+            rows.append((id(entry), values))
+        self.tree.set_items(rows)
+
+    def schedule_filter(self):
+        # Filtrar al dejar de escribir, no en cada tecla
+        if self.filter_job is not None:
+            self.root.after_cancel(self.filter_job)
+        self.filter_job = self.root.after(150, self._apply_filter)
+
+    def _apply_filter(self):
+        self.filter_job = None
+        self.refresh_list()
+
+    def update_count(self):
+        shown, selected = len(self.tree.items), len(self.tree.selected)
+        text = f"{shown} de {len(self.data)} monitores" if shown != len(self.data) else f"{shown} monitores"
+        self.count_var.set(text + (f", {selected} seleccionados" if selected else ""))
+
+    def selected_entries(self):
+        keys = self.tree.selected
+        return [entry for entry in self.data if id(entry) in keys]
+
+    def add_entries(self, entries):
+        self.data.extend(entries)
+        self.refresh_list()
+
     def add_log(self):
-        log_path = filedialog.askopenfilename(title="Seleccionar archivo LOG")
-        if log_path:
-            webhook = simpledialog.askstring("Webhook", "Ingrese URL Webhook Discord:")
-            if webhook:
-                self.tree.insert("", "end", values=(log_path, webhook))
-                self.data.append({"logfile": log_path, "webhook": webhook})
+        # Varios archivos de una vez con el mismo webhook
+        paths = filedialog.askopenfilenames(title="Seleccionar archivos LOG")
+        if not paths:
+            return
+        webhook = simpledialog.askstring("Webhook", f"URL Webhook Discord para {len(paths)} archivo(s) "
+                                                    "(varias separadas por comas):")
+        if webhook:
+            self.add_entries([{"logfile": path, "webhook": parse_webhook(webhook)} for path in paths])
+
+    def add_pattern(self):
+        # Carpeta + patron: los logs nuevos que coincidan se vigilan solos
+        folder = filedialog.askdirectory(title="Seleccionar carpeta de logs")
+        if not folder:
+            return
+        pattern = simpledialog.askstring("Patrón", "Patrón de archivos (p.ej. *bot.log):", initialvalue="*.log")
+        if not pattern:
+            return
+        webhook = simpledialog.askstring("Webhook", "Ingrese URL Webhook Discord (varias separadas por comas):")
+        if webhook:
+            log_path = os.path.join(folder, pattern).replace("\\", "/")
+            self.add_entries([{"logfile": log_path, "webhook": parse_webhook(webhook)}])
+
+    def edit_webhooks(self):
+        # Mismo webhook (o pool) para todas las entradas seleccionadas
+        entries = self.selected_entries()
+        if not entries:
+            messagebox.showinfo(APP_NAME, "Selecciona uno o más monitores")
+            return
+        current = {webhook_display(e.get("webhook")) for e in entries}
+        webhook = simpledialog.askstring(
+            "Webhook", f"URL Webhook Discord para {len(entries)} monitor(es) (varias separadas por comas):",
+            initialvalue=current.pop() if len(current) == 1 else "")
+        if webhook is None:
+            return
+        value = parse_webhook(webhook)
+        if not value and any(not e.get("sinks") for e in entries):
+            messagebox.showwarning(APP_NAME, "Las entradas sin sinks necesitan un webhook")
+            return
+        for entry in entries:
+            entry["webhook"] = value
+        self.refresh_list()
+        self.log_output(f"Webhook actualizado en {len(entries)} monitores")
+
+    def delete_selected(self):
+        keys = self.tree.selected
+        if not keys or not messagebox.askyesno(APP_NAME, f"¿Eliminar {len(keys)} monitor(es)?"):
+            return
+        # Una sola pasada con un conjunto, no una reconstruccion por fila
+        before = len(self.data)
+        self.data = [entry for entry in self.data if id(entry) not in keys]
+        self.tree.selected.clear()
+        self.refresh_list()
+        self.log_output(f"{before - len(self.data)} monitores eliminados")
+
+    def import_data(self):
+        path = filedialog.askopenfilename(title="Importar monitores",
+                                          filetypes=[("CSV o JSON", "*.csv *.json"), ("Todos", "*.*")])
+        if not path:
+            return
+        try:
+            entries, errors = import_entries(path, existing=self.data)
+        except Exception as e:
+            logging.error(f"Error importando {path}: {e}", exc_info=True)
+            messagebox.showerror(APP_NAME, f"No se pudo importar {path}:\n{e}")
+            return
+        self.add_entries(entries)
+        msg = f"{len(entries)} monitores importados desde {path}"
+        self.log_output(msg)
+        for error in errors:
+            self.log_output(f"Importar: {error}")
+        if errors:
+            shown = "\n".join(errors[:15]) + (f"\n... y {len(errors) - 15} más" if len(errors) > 15 else "")
+            messagebox.showwarning(APP_NAME, f"{msg}\n\nFilas omitidas:\n{shown}")
+
+    def export_data(self):
+        # Con filtro o seleccion se exporta solo eso
+        entries = self.selected_entries()
+        if not entries:
+            shown = {key for key, _ in self.tree.items}
+            entries = [e for e in self.data if id(e) in shown]
+        path = filedialog.asksaveasfilename(title="Exportar monitores", defaultextension=".json",
+                                            filetypes=[("JSON", "*.json"), ("CSV", "*.csv")])
+        if not path:
+            return
+        try:
+            count = export_entries(path, entries)
+            self.log_output(f"{count} monitores exportados a {path}")
+        except Exception as e:
+            logging.error(f"Error exportando {path}: {e}", exc_info=True)
+            messagebox.showerror(APP_NAME, f"No se pudo exportar {path}:\n{e}")
 
     def save_data(self):
-        self.data = []
-        for child in self.tree.get_children():
-            vals = self.tree.item(child)["values"]
-            self.data.append({"logfile": vals[0], "webhook": vals[1]})
-
-        os.makedirs(os.path.dirname(CONFIG_JSON_PATH), exist_ok=True)
-        with open(CONFIG_JSON_PATH, "w", encoding="utf-8") as f:
-            json.dump(self.data, f, indent=4)
-
-        self.log_output("Configuración guardada en settings.json")
+        # self.data es la lista completa (con claves extra como "sinks"); escritura atomica
+        try:
+            save_entries(CONFIG_JSON_PATH, self.data)
+            self.log_output("Configuración guardada en settings.json")
+        except Exception as e:
+            self.log_output(f"Error guardando configuración: {e}")
+            logging.error(f"Error guardando configuración: {e}", exc_info=True)
 
     def start_monitoring(self):
         self.save_data()
+        if self.engine is not None:
+            # El motor relee settings.json y reinicia sus monitores
+            self.engine.request("reload", callback=self.engine_reply)
+            return
         self.stop_monitoring()
 
-        for entry in self.data:
-            stop_event = threading.Event()
-            thread = MonitorThread(
-                entry["logfile"],
-                entry["webhook"],
-                self.config_watcher,
-                stop_event,
-                self.log_output
-            )
-            thread.start()
-            self.monitors.append(thread)
-            self.monitor_stop_events.append(stop_event)
-
-            self.log_output(f"Monitor iniciado para {entry['logfile']}")
-
-    def stop_monitoring(self):
+        stop_event = StopSignal()
+        self.monitors = start_monitors(self.data, self.config_watcher, stop_event,
+                                       self.enrichers, self.log_output, self.feed, self.supervisor, self.ingest)
+        self.monitor_stop_events.append(stop_event)
+        for thread in self.monitors:
+            self.log_output(f"Monitor iniciado para {monitor_label(thread)}")
+
+    def stop_monitoring(self, wait=False):
+        if self.engine is not None:
+            # Al cerrar la ventana el motor sigue; solo el boton Detener lo para
+            if not wait:
+                self.engine.request("stop", callback=self.engine_reply)
+            return
+        # Los monitores dejan de leer al instante; el vaciado de sus colas sigue
+        # en segundo plano (salvo al salir) para no congelar la ventana
         for event in self.monitor_stop_events:
-            event.set()
+            args = (event, list(self.monitors), self.shutdown_timeout)
+            if wait:
+                shutdown(*args, report=self.log_output)
+            else:
+                threading.Thread(target=shutdown, args=args, kwargs={"report": self.log_output},
+                                 name="shutdown", daemon=True).start()
         self.monitors.clear()
         self.monitor_stop_events.clear()
         self.log_output("Monitoreo detenido")
 
+    def exit_app(self):
+        self.stop_monitoring(wait=True)
+        if self.enrichers:
+            # Al salir tambien se vacian las alertas de watchlist y abuso
+            shutdown(StopSignal(), [], self.shutdown_timeout, report=self.log_output, enrichers=self.enrichers)
+        if self.feed is not None:
+            self.feed.close()
+        if self.engine is not None:
+            self.engine.close()
+        logging.info("Aplicacion cerrada por el usuario")
+        self.root.destroy()
+
     def log_output(self, msg):
+        # Seguro desde cualquier hilo: Tk solo se toca en poll_output
+        self.output_queue.put(msg)
+        for line in msg.split("\n"):
+            EVENT_LOG.info(line)
+
+    def poll_output(self):
+        lines = []
+        try:
+            while True:
+                lines.append(self.output_queue.get_nowait())
+        except queue.Empty:
+            pass
+        if lines:
+            self.show_lines(lines[-MAX_OUTPUT_LINES:])
+        self.root.after(200, self.poll_output)
+
+    def show_lines(self, lines):
+        # Un solo insert por lote y recorte a MAX_OUTPUT_LINES
         self.txt_output.configure(state="normal")
-        self.txt_output.insert("end", msg + "\n")
+        self.txt_output.insert("end", "\n".join(lines) + "\n")
+        excess = int(self.txt_output.index("end-1c").split(".")[0]) - 1 - MAX_OUTPUT_LINES
+        if excess > 0:
+            self.txt_output.delete("1.0", f"{excess + 1}.0")
         self.txt_output.see("end")
         self.txt_output.configure(state="disabled")
-        logging.info(msg)
+
+    # ---- Motor remoto ([ENGINE] attach) ---- #
+    def poll_engine(self):
+        # Los mensajes del motor se recogen desde el hilo de Tk cada 200 ms
+        lines = []
+        for message in self.engine.poll():
+            kind = message.get("t")
+            if kind == "event":
+                text = f"[{message.get('bot')}] {message.get('text')}"
+                lines.append(text + (f"  ⚠ {message['alert']}" if message.get("alert") else ""))
+            elif kind in ("log", "state", "error"):
+                lines.append(str(message.get("text", "")))
+            if kind == "state":
+                state = "conectado" if message.get("connected") else "sin conexion"
+                self.root.title(f"{APP_NAME} (motor {self.engine.address}: {state})")
+        if lines:
+            self.show_lines(lines)
+        self.root.after(200, self.poll_engine)
+
+    def engine_reply(self, reply):
+        if reply.get("ok"):
+            self.log_output(f"Motor: {reply.get('data')}")
+        else:
+            self.log_output(f"Motor: error: {reply.get('error')}")
 
     def load_settings(self):
         if os.path.exists(CONFIG_JSON_PATH):
             try:
-                with open(CONFIG_JSON_PATH, "r", encoding="utf-8") as f:
-                    self.data = json.load(f)
-                self.tree.delete(*self.tree.get_children())
-                for entry in self.data:
-                    self.tree.insert("", "end", values=(entry["logfile"], entry["webhook"]))
-                self.log_output("Configuración cargada desde settings.json")
+                self.data = load_entries(CONFIG_JSON_PATH)
+                self.refresh_list()
+                self.log_output(f"Configuración cargada desde settings.json ({len(self.data)} monitores)")
+                for n, entry in enumerate(self.data, 1):
+                    problems = validate_entry(entry)
+                    if problems:
+                        self.log_output(f"Entrada {n} ({entry_label(entry)}): {'; '.join(problems)}")
             except Exception as e:
                 self.log_output(f"Error cargando configuración: {e}")
                 logging.error(f"Error cargando configuración: {e}", exc_info=True)
@@ -368,69 +1009,130 @@ def run_gui(config):
 
 def run_terminal(config):
     print(f"🧠 Iniciando {APP_NAME} en modo TERMINAL")
+    for item in setup_diagnostics(config):
+        print(f"🩺 Diagnóstico disponible: {item}")
     watcher = ConfigWatcher(CONFIG_INI_PATH)
-    stop_event = threading.Event()
+    enrichers = build_enrichers(config)
+    stop_event = StopSignal()
+    timeout = float(config.get("APP", "shutdown_timeout", SHUTDOWN_TIMEOUT))
 
     if not os.path.exists(CONFIG_JSON_PATH):
         print("❌ No se encontró settings.json")
         return
 
-    with open(CONFIG_JSON_PATH, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    threads = []
-    for entry in data:
-        log_path = entry.get("logfile")
-        webhook = entry.get("webhook")
-        if log_path and webhook:
-            t = MonitorThread(log_path, webhook, watcher, stop_event)
-            t.start()
-            threads.append(t)
-            print(f"🟢 Monitor iniciado: {log_path}")
+    data = load_entries(CONFIG_JSON_PATH)
+    for n, entry in enumerate(data, 1):
+        problems = validate_entry(entry)
+        if problems:
+            print(f"⚠️ Entrada {n} ({entry_label(entry)}): {'; '.join(problems)}")
+
+    # Eventos retransmitidos y linea de estado por un solo escritor ([CONSOLE] en config.ini)
+    console = console_from_config(config)
+    out = console or print
+    feed = feed_from_config(config)
+    if feed is not None:
+        out("🌐 Feed global activo")
+    supervisor = supervisor_from_config(config, notify=out)
+    threads = start_monitors(data, watcher, stop_event, enrichers, console, feed=feed, supervisor=supervisor,
+                             ingest=ingest_from_config(config))
+    for t in threads:
+        out(f"🟢 Monitor iniciado: {monitor_label(t)}")
 
     try:
         while not stop_event.is_set():
             time.sleep(1)
     except KeyboardInterrupt:
-        print("\n🟥 Deteniendo monitores...")
-        stop_event.set()
-        for t in threads:
-            t.join()
-        print("✅ Monitoreo detenido correctamente.")
+        out(f"🟥 Deteniendo monitores (plazo {timeout:g}s)...")
+        shutdown(stop_event, threads, timeout, feed=feed, report=lambda msg: out(f"✅ {msg}"),
+                 enrichers=enrichers)
+    finally:
+        if console is not None:
+            console.close()
 
 
 def run_service(config):
     watcher = ConfigWatcher(CONFIG_INI_PATH)
-    stop_event = threading.Event()
+    enrichers = build_enrichers(config)
+    timeout = float(config.get("APP", "shutdown_timeout", SHUTDOWN_TIMEOUT))
     print(f"🧩 {APP_NAME} ejecutándose en modo SERVICE...")
+    for item in setup_diagnostics(config):
+        print(f"🩺 Diagnóstico disponible: {item}")
 
     # Servicio simple: levanta monitores según settings.json y los mantiene vivos
     if not os.path.exists(CONFIG_JSON_PATH):
         print("❌ No se encontró settings.json, nada que monitorear.")
         return
 
-    with open(CONFIG_JSON_PATH, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    threads = []
-    for entry in data:
-        log_path = entry.get("logfile")
-        webhook = entry.get("webhook")
-        if log_path and webhook:
-            t = MonitorThread(log_path, webhook, watcher, stop_event)
-            t.start()
-            threads.append(t)
-            print(f"🟢 Monitor (SERVICE) iniciado: {log_path}")
+    data = load_entries(CONFIG_JSON_PATH)
+
+    # Motor separado de la GUI ([ENGINE] en config.ini): las GUIs conectadas reciben
+    # los eventos y los mensajes de estado, y pueden detener o recargar los monitores
+    engine = engine_from_config(config)
+
+    def out(msg):
+        print(msg)
+        if engine is not None:
+            engine(msg)
+
+    feed = feed_from_config(config)
+    if feed is not None:
+        out("🌐 Feed global activo")
+    supervisor = supervisor_from_config(config, notify=out)
+    node = cluster_from_config(config)
+    if node is not None:
+        # Varias instancias con el mismo directorio compartido se reparten los archivos
+        # Los patrones se resuelven al arrancar: los archivos nuevos requieren reiniciar
+        stop_event = StopSignal()
+        groups = {file_lease_key(entries[0]): entries for entries in group_entries(expand_patterns(data))}
+        node.start(groups, lambda entries, stop, offset, checkpoint: monitor_launcher(
+            watcher, enrichers, engine, feed=feed, supervisor=supervisor, checkpoint=checkpoint)(entries, stop, offset))
+        out(f"🕸️ Nodo de cluster {node.node_id} en {node.directory} ({len(groups)} archivos)")
+        # La ingestion por red no se reparte: cada nodo atiende lo que le envian a el
+        listener = start_ingest(data, ingest_from_config(config), watcher, stop_event, enrichers, engine,
+                                feed=feed, supervisor=supervisor)
+        threads = [listener] if listener is not None else []
+        for t in threads:
+            out(f"🟢 Ingestion (SERVICE) iniciada: {monitor_label(t)}")
+        # En cluster el reparto lo decide el nodo: desde la GUI solo se consulta el estado
+        commands = {"status": lambda: {"running": True, "cluster": node.node_id,
+                                      "monitors": [monitor_label(t) for t in threads]}}
+    else:
+        monitors = ServiceMonitors(watcher, enrichers, engine, feed=feed, supervisor=supervisor,
+                                   ingest=ingest_from_config(config), timeout=timeout, report=out)
+        monitors.start(data)
+        commands = {"start": monitors.start, "stop": monitors.stop, "reload": monitors.reload,
+                    "status": monitors.status}
+    if engine is not None:
+        engine.commands.update(commands)
+        try:
+            host, port = engine.start()
+            out(f"🖥️ GUI remota: motor escuchando en {host}:{port}")
+        except OSError as e:
+            out(f"⚠️ No se pudo abrir el puerto del motor ({e}); sigue sin GUI remota")
+            engine = None
 
+    restarts = 0
     try:
-        while not stop_event.is_set():
+        while True:
             time.sleep(5)
+            if supervisor is not None and supervisor.stats()["restarts"] != restarts:
+                # Resumen del estado de los monitores cada vez que hay reinicios
+                stats = supervisor.stats()
+                restarts = stats["restarts"]
+                for item in stats["files"]:
+                    out(f"🩹 {item['file']}: {item['status']}, {item['restarts']} reinicios, "
+                        f"offset {item['offset']}" + (f", ultimo error: {item['last_error']}"
+                                                     if item["last_error"] else ""))
     except KeyboardInterrupt:
-        print("\n🟥 Deteniendo servicio...")
-        stop_event.set()
-        for t in threads:
-            t.join()
-        print("✅ Servicio detenido correctamente.")
+        out(f"\n🟥 Deteniendo servicio (plazo {timeout:g}s)...")
+        if node is not None:
+            shutdown(stop_event, threads, timeout, feed=feed, node=node, report=lambda msg: out(f"✅ {msg}"),
+                     enrichers=enrichers)
+        else:
+            monitors.close()
+    finally:
+        if engine is not None:
+            engine.close()
 
 
 # ==========================
@@ -439,7 +1141,7 @@ def run_service(config):
 
 if __name__ == "__main__":
     cfg = AppConfig()
-    setup_logging(cfg.get("APP", "log_level", "INFO"))
+    setup_logging(cfg)
 
     mode = cfg.get("APP", "mode", "GUI").upper()
     print(f"🚀 Iniciando {APP_NAME} en modo {mode}")
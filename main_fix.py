@@ -11,6 +11,9 @@ import json
 import configparser
 import requests
 
+from applog import EVENT_LOG, configure_logging
+from entries import save_entries
+
 try:
     import pystray
     from PIL import Image, ImageDraw
@@ -21,12 +24,8 @@ APP_NAME = "GhostMonitorLOG"
 CONFIG_INI_PATH = "config/default_messages.ini"
 CONFIG_JSON_PATH = "data/settings.json"
 
-logging.basicConfig(
-    filename="app.log",
-    filemode="a",
-    format="%(asctime)s %(levelname)s %(message)s",
-    level=logging.DEBUG
-)
+# Escritura en un hilo aparte con rotacion por tamano y diaria (ver applog.py)
+configure_logging(level="INFO", path="logs/app.log")
 
 def log_exception(exc_type, exc_value, exc_traceback):
     if issubclass(exc_type, KeyboardInterrupt):
@@ -373,11 +372,11 @@ class GhostMonitorApp:
                 self.data.append({"logfile": log_path, "webhook": webhook})
 
     def delete_selected_log(self):
+        # Una sola pasada por self.data para toda la seleccion
         selected = self.tree.selection()
-        for sel in selected:
-            vals = self.tree.item(sel)["values"]
-            self.data = [d for d in self.data if d["logfile"] != vals[0]]
-            self.tree.delete(sel)
+        removed = {self.tree.item(sel)["values"][0] for sel in selected}
+        self.data = [d for d in self.data if d["logfile"] not in removed]
+        self.tree.delete(*selected)
 
     def save_data(self):
         self.data = []
@@ -385,9 +384,7 @@ class GhostMonitorApp:
             vals = self.tree.item(child)["values"]
             self.data.append({"logfile": vals[0], "webhook": vals[1]})
         try:
-            os.makedirs(os.path.dirname(CONFIG_JSON_PATH), exist_ok=True)
-            with open(CONFIG_JSON_PATH, "w", encoding="utf-8") as f:
-                json.dump(self.data, f, indent=4, ensure_ascii=False)
+            save_entries(CONFIG_JSON_PATH, self.data)
             self.log_output(f"Configuracion guardada en {CONFIG_JSON_PATH}")
             logging.info("Configuracion guardada correctamente")
         except Exception as e:
@@ -475,10 +472,15 @@ class GhostMonitorApp:
         self.txt_output.insert("end", msg + "\n")
         self.txt_output.see("end")
         self.txt_output.configure(state='disabled')
-        logging.debug(msg)
+        EVENT_LOG.info(msg)
 
     def exit_app(self):
+        monitors = list(self.monitors)
         self.stop_monitoring()
+        # Dejar terminar (con plazo) el envio en curso de cada monitor
+        deadline = time.monotonic() + 10
+        for thread in monitors:
+            thread.join(max(0.0, deadline - time.monotonic()))
         logging.info("Aplicacion cerrada por el usuario")
         self.root.destroy()
 
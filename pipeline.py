@@ -0,0 +1,551 @@
+import datetime
+import enum
+import logging
+import random
+import re
+import sys
+import time
+
+from diagnostics import DIAG
+
+log = logging.getLogger("pipeline")
+
+# Las lineas mas largas se recortan antes de clasificar (el chat de WC3 no
+# pasa de 255 caracteres): el coste por linea queda acotado
+MAX_LINE_LENGTH = 2048
+
+
+# ==========================
+#  EVENTOS
+# ==========================
+
+class EventType(enum.IntEnum):
+    STATUS = 0
+    CREATE = 1
+    JOIN = 2
+    LEAVE = 3
+    CHAT = 4
+    DIGEST = 5
+
+
+class Event:
+    """Registro compacto que circula entre etapas (sin __dict__ por evento).
+
+    ``text`` es el texto de origen (chat o estado), ``message`` el texto ya
+    renderizado, ``offset`` la posicion en bytes de la linea en el log,
+    ``ts`` el momento en que se leyo y ``line_ts`` la fecha escrita en la
+    linea (solo si el pipeline la extrae, ver ``Pipeline.stamp_lines``).
+    ``digested`` indica que el evento ya va incluido en un resumen periodico
+    (ver digest.py).
+    """
+
+    __slots__ = ("type", "bot", "source", "game", "user", "ip", "channel",
+                 "text", "message", "offset", "ts", "line_ts", "country", "asn", "alert", "digested")
+
+    def __init__(self, type, bot=None, source=None, text=None, offset=-1, ts=0.0):
+        self.type = type
+        self.bot = bot
+        self.source = source
+        self.game = None
+        self.user = None
+        self.ip = None
+        self.channel = None
+        self.text = text
+        self.message = None
+        self.offset = offset
+        self.ts = ts
+        self.line_ts = None
+        self.country = None
+        self.asn = None
+        self.alert = None
+        self.digested = None
+
+    def to_dict(self):
+        data = {"type": self.type.name.lower()}
+        for name in Event.__slots__[1:]:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        return data
+
+    def copy(self):
+        ev = Event.__new__(Event)
+        for name in Event.__slots__:
+            setattr(ev, name, getattr(self, name))
+        return ev
+
+    def __repr__(self):
+        return f"Event({self.type.name}, bot={self.bot!r}, game={self.game!r}, user={self.user!r})"
+
+
+# ==========================
+#  ETAPA: CLASIFICAR
+# ==========================
+
+class Rule:
+    # ``needle`` es una subcadena obligatoria: las lineas que no la contienen
+    # se descartan sin ejecutar el patron (la gran mayoria del log).
+    # ``pattern`` es una regex o una funcion ``linea -> tupla de grupos | None``.
+    __slots__ = ("type", "needle", "match", "fill")
+
+    def __init__(self, type, needle, pattern, fill):
+        self.type = type
+        self.needle = needle
+        if callable(pattern):
+            self.match = pattern
+        else:
+            search = re.compile(pattern).search
+
+            def match(line):
+                m = search(line)
+                return m.groups() if m else None
+
+            self.match = match
+        self.fill = fill
+
+
+def _game_prefix(line):
+    # GHost antepone "[GAME: nombre]" a los eventos de una partida
+    start = line.find("[GAME: ")
+    if start < 0:
+        return None
+    end = line.find("]", start + 7)
+    return line[start + 7:end].strip() if end > 0 else None
+
+
+# Formatos de fecha que GHost/GHost++ ponen al principio de cada linea
+LINE_TIME_FORMATS = (
+    "%a %b %d %H:%M:%S %Y",    # [Tue Nov 18 22:31:05 2025]
+    "%m/%d/%Y %H:%M:%S",       # [11/18/2025 22:31:05]
+    "%Y-%m-%d %H:%M:%S",       # [2025-11-18 22:31:05]
+    "%d/%m/%Y %H:%M:%S",
+)
+
+
+def line_timestamp(line):
+    # Epoch de la fecha inicial "[...]" de una linea de GHost, o None
+    if not line.startswith("["):
+        return None
+    end = line.find("]", 1, 40)
+    if end < 0:
+        return None
+    stamp = line[1:end].strip()
+    for fmt in LINE_TIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(stamp, fmt).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+# ==========================
+#  ANALIZADORES DE LINEA
+# ==========================
+# Sustituyen a las regex con comodines perezosos anidados, que con lineas
+# largas o manipuladas podian retroceder durante segundos. Cada uno hace
+# un numero fijo de busquedas de subcadena (find/rfind): tiempo lineal.
+
+def _match_create(line):
+    # creating game [nombre]
+    start = line.find("creating game [")
+    if start < 0:
+        return None
+    start += 15
+    end = line.rfind("]")
+    return (line[start:end],) if end >= start else None
+
+
+def _match_join(line):
+    # player [nombre|ip] joined the game
+    start = line.find("player [")
+    if start < 0:
+        return None
+    start += 8
+    end = line.find("] joined the game", start)
+    if end < 0:
+        return None
+    bar = line.rfind("|", start, end)
+    if bar < 0 or bar + 1 >= end:
+        return None
+    return line[start:bar], line[bar + 1:end]
+
+
+def _match_leave(line):
+    # deleting player [nombre]: motivo
+    start = line.find("deleting player [")
+    if start < 0:
+        return None
+    start += 17
+    end = line.rfind("]:", start)
+    return (line[start:end],) if end >= 0 else None
+
+
+CHAT_CHANNELS = ("Lobby", "All", "Allies", "Team", "Observer")
+
+
+def _match_chat(line):
+    # [GAME: nombre] (mm:ss)? ... [Canal] [Usuario]: texto
+    start = line.find("[GAME:")
+    if start < 0:
+        return None
+    game_end = line.find("]", start + 6)
+    if game_end < 0:
+        return None
+    n = len(line)
+    colon = -1
+    pos = line.find("[", game_end + 1)
+    while pos >= 0:
+        for channel in CHAT_CHANNELS:
+            close = pos + 1 + len(channel)
+            if close < n and line[close] == "]" and line.startswith(channel, pos + 1):
+                break
+        else:
+            pos = line.find("[", pos + 1)
+            continue
+        user = close + 1
+        while user < n and line[user].isspace():
+            user += 1
+        if user < n and line[user] == "[":
+            # Primer "]:" tras el usuario; las posiciones solo avanzan, se reutiliza
+            if colon < user + 1:
+                colon = line.find("]:", user + 1)
+                if colon < 0:
+                    return None
+            text = line[colon + 2:].strip()
+            if text:
+                return line[start + 6:game_end], channel, line[user + 1:colon], text
+        pos = line.find("[", pos + 1)
+    return None
+
+
+def _fill_create(ev, m, line):
+    ev.game = m[0]
+
+
+def _fill_join(ev, m, line):
+    ev.user = m[0]
+    ev.ip = m[1]
+    ev.game = _game_prefix(line)
+
+
+def _fill_leave(ev, m, line):
+    ev.user = m[0]
+    ev.game = _game_prefix(line)
+
+
+def _fill_chat(ev, m, line):
+    ev.game = m[0].strip()
+    ev.channel = m[1]
+    ev.user = m[2].strip()
+    ev.text = m[3]
+
+
+# El orden importa: gana la primera regla que coincide
+DEFAULT_RULES = [
+    # Crear partida
+    Rule(EventType.CREATE, "creating game [", _match_create, _fill_create),
+    # Entrada jugador
+    Rule(EventType.JOIN, "joined the game", _match_join, _fill_join),
+    # Salida jugador
+    Rule(EventType.LEAVE, "deleting player [", _match_leave, _fill_leave),
+    # 🔥 Mensajes de chat
+    # Soporta:
+    # [GAME: DotA v6.85n #1] [Lobby] [User]: msg
+    # [GAME: Pulpin War Arena #4] (22:31) [All] [User]: msg
+    # [GAME: Pulpin War Arena #4] (22:31) [Allies] [User]: msg
+    Rule(EventType.CHAT, "[GAME:", _match_chat, _fill_chat),
+]
+
+
+class Classifier:
+    def __init__(self, rules=None):
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+
+    def add_rule(self, rule, first=False):
+        if first:
+            self.rules.insert(0, rule)
+        else:
+            self.rules.append(rule)
+
+    def __call__(self, line, bot=None, source=None, offset=-1):
+        if len(line) > MAX_LINE_LENGTH:
+            line = line[:MAX_LINE_LENGTH]
+        for rule in self.rules:
+            if rule.needle in line:
+                m = rule.match(line)
+                if m:
+                    ev = Event(rule.type, bot, source, None, offset, time.time())
+                    rule.fill(ev, m, line)
+                    return ev
+        return None
+
+
+# ==========================
+#  ETAPA: RENDERIZAR
+# ==========================
+
+# Tipo de evento -> (clave en default_messages.ini, plantilla por defecto)
+MESSAGE_TEMPLATES = {
+    EventType.CREATE: ("messagecreate", "Game created: {game_name}"),
+    EventType.JOIN: ("messageplayer", "{user} connected from {ip}"),
+    EventType.LEAVE: ("messagetoleave", "{user} left the game"),
+}
+
+# Marcador de plantilla -> atributo del evento
+PLACEHOLDERS = {
+    "{game_name}": "game",
+    "{game}": "game",
+    "{user}": "user",
+    "{ip}": "ip",
+    "{text}": "text",
+    "{chat}": "text",
+    "{country}": "country",
+    "{asn}": "asn",
+}
+
+
+def _render_chat(ev):
+    return f"[{ev.game}] {ev.user}: {ev.text}"
+
+
+def _render_status(ev):
+    return ev.text
+
+
+class Renderer:
+    """Convierte un evento en texto usando las plantillas de default_messages.ini.
+
+    Las plantillas se leen del ConfigWatcher solo cuando cambia el archivo y
+    cada una se pre-analiza una vez (que marcadores contiene).
+    """
+
+    def __init__(self, config_watcher=None):
+        self.config_watcher = config_watcher
+        self.special = {EventType.CHAT: _render_chat, EventType.STATUS: _render_status,
+                        EventType.DIGEST: _render_status}
+        self._config = self  # centinela: fuerza la primera compilacion
+        self._compiled = {}
+
+    def register(self, event_type, fn):
+        self.special[event_type] = fn
+
+    def _templates(self):
+        config = self.config_watcher.config if self.config_watcher else None
+        if config is not self._config:
+            self._config = config
+            compiled = {}
+            for event_type, (key, default) in MESSAGE_TEMPLATES.items():
+                template = config["MESSAGES"].get(key, default) if config is not None else default
+                used = tuple((ph, attr) for ph, attr in PLACEHOLDERS.items() if ph in template)
+                compiled[event_type] = (template, used)
+            self._compiled = compiled
+        return self._compiled
+
+    def __call__(self, ev):
+        fn = self.special.get(ev.type)
+        if fn is not None:
+            ev.message = fn(ev)
+            return ev
+        template, used = self._templates()[ev.type]
+        msg = template
+        for placeholder, attr in used:
+            msg = msg.replace(placeholder, getattr(ev, attr) or "")
+        ev.message = msg
+        return ev
+
+
+# ==========================
+#  PIPELINE
+# ==========================
+
+class Pipeline:
+    """leer -> clasificar -> enriquecer -> renderizar -> entregar.
+
+    Cada etapa es un invocable independiente; ``enrichers`` recibe y modifica
+    el evento (o devuelve None para descartarlo); ``deliver`` recibe el evento
+    ya renderizado (normalmente ``MonitorThread.deliver``, que lo pasa a los sinks).
+    Con ``stamp_lines`` cada evento lleva ademas la fecha de su linea
+    (``line_ts``); lo activa el monitor cuando hay feed global (ver feed.py).
+    """
+
+    def __init__(self, bot, source, classifier=None, renderer=None, enrichers=None, deliver=None):
+        self.bot = bot
+        self.source = source
+        self.classifier = classifier or Classifier()
+        self.renderer = renderer or Renderer()
+        self.enrichers = list(enrichers or [])
+        self.deliver = deliver
+        self.stamp_lines = False
+
+    def status(self, text):
+        ev = Event(EventType.STATUS, self.bot, self.source, text, -1, time.time())
+        return self.emit(ev)
+
+    def process(self, line, offset=-1):
+        timing = DIAG.timing
+        if timing:
+            t0, c0 = time.perf_counter(), time.thread_time()
+        ev = self.classifier(line, self.bot, self.source, offset)
+        if timing:
+            t0, c0 = DIAG.record(self.bot, "parse", t0, c0)
+        if ev is None:
+            return None
+        if self.stamp_lines:
+            ev.line_ts = line_timestamp(line)
+        for enrich in self.enrichers:
+            ev = enrich(ev)
+            if ev is None:
+                return None
+        if timing:
+            t0, c0 = DIAG.record(self.bot, "enrich", t0, c0)
+        self.renderer(ev)
+        if timing:
+            t0, c0 = DIAG.record(self.bot, "render", t0, c0)
+        if self.deliver is not None:
+            self.deliver(ev)
+        if timing:
+            DIAG.record(self.bot, "send", t0, c0)
+        return ev
+
+    def emit(self, ev):
+        # Entrada para eventos que no vienen de una linea (estado, ingestion...)
+        for enrich in self.enrichers:
+            ev = enrich(ev)
+            if ev is None:
+                return None
+        self.renderer(ev)
+        if self.deliver is not None:
+            self.deliver(ev)
+        return ev
+
+
+# ==========================
+#  BENCHMARK
+# ==========================
+
+def benchmark(path, repeat=1):
+    # Uso: python pipeline.py archivo.log [repeticiones]
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        lines = [line.rstrip("\r\n") for line in f]
+    classifier = Classifier()
+    renderer = Renderer()
+    results = {}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        t = time.perf_counter()
+        events = [ev for ev in (classifier(line) for line in lines) if ev is not None]
+        results["classify"] = results.get("classify", 0.0) + time.perf_counter() - t
+        t = time.perf_counter()
+        for ev in events:
+            renderer(ev)
+        results["render"] = results.get("render", 0.0) + time.perf_counter() - t
+    total = time.perf_counter() - start
+    count = len(lines) * repeat
+    print(f"{count} lineas, {len(events) * repeat} eventos, {total:.3f}s ({count / total:,.0f} lineas/s)")
+    for stage, secs in results.items():
+        print(f"  {stage:<9} {secs:.3f}s  {secs / count * 1e6:.2f} us/linea")
+
+
+# Familias de lineas hostiles: muchos corchetes, etiquetas de canal falsas,
+# separadores repetidos... lo que hacia retroceder a las regex antiguas
+FUZZ_FAMILIES = {
+    "canales": lambda n: "[GAME: x] " + "[All] " * (n // 6),
+    "aliados": lambda n: "[GAME: x] " + "[Allie] [Allies]" * (n // 16),
+    "corchetes": lambda n: "[GAME: " + "[" * n + "joined the game",
+    "usuario": lambda n: "[GAME: x] [All] [" + "a]" * (n // 2),
+    "hora": lambda n: "[GAME: x] " + "(1:2" * (n // 4) + " [Team] [u]",
+    "join": lambda n: "[GAME: x] player [" + "|" * n + "] joined the gam",
+    "leave": lambda n: "deleting player [" + "]" * n,
+    "juegos": lambda n: "[GAME:" * (n // 6),
+}
+FUZZ_TOKENS = ("[", "]", "]:", " ", "|", "(", ")", ":", "a", "7", "[GAME: ", "[All]", "[Allies]", "[Team]",
+               "[Lobby]", "[Observer]", "player [", "] joined the game", "deleting player [", "creating game [")
+
+
+# Lineas reales con el resultado esperado (tipo, partida, canal, usuario, texto)
+FUZZ_SAMPLES = [
+    ("[GAME: DotA v6.85n #1] [Lobby] [bob]: hola", ("CHAT", "DotA v6.85n #1", "Lobby", "bob", "hola")),
+    ("[GAME: Pulpin War Arena #4] (22:31) [All] [bob]: gg", ("CHAT", "Pulpin War Arena #4", "All", "bob", "gg")),
+    ("[GAME: X] (22:31) [Allies] [bob]: hi", ("CHAT", "X", "Allies", "bob", "hi")),
+    ("[GAME: X] (0:05) [Team] [a b]: push mid", ("CHAT", "X", "Team", "a b", "push mid")),
+    ("[GAME: X] [Observer] [obs]: ...", ("CHAT", "X", "Observer", "obs", "...")),
+    ("[GAME: X] [Alliance] [bob]: no es un canal", None),
+    ("[GHOST] creating game [DotA #2]", ("CREATE", "DotA #2", None, None, None)),
+    ("[GAME: X] player [bob|1.2.3.4] joined the game", ("JOIN", "X", None, "bob", None)),
+    ("[GAME: X] deleting player [bob]: has left voluntarily", ("LEAVE", "X", None, "bob", None)),
+]
+
+
+def check_samples(classifier):
+    # Lineas de FUZZ_SAMPLES cuyo resultado no es el esperado
+    failures = []
+    for line, expected in FUZZ_SAMPLES:
+        ev = classifier(line)
+        got = None if ev is None else (ev.type.name, ev.game, ev.channel, ev.user, ev.text)
+        if got != expected:
+            failures.append((line, expected, got))
+    return failures
+
+
+def check_embed_colors(classifier):
+    # Cada canal de chat reconocido debe tener su color de embed (modo embeds)
+    from webhooks import CHAT_COLORS, build_embed
+    failures = []
+    for channel in CHAT_CHANNELS:
+        line = f"[GAME: X] (22:31) [{channel}] [bob]: hi"
+        ev = classifier(line, bot="bot")
+        color = build_embed(ev)["color"] if ev is not None else None
+        if channel not in CHAT_COLORS or color != CHAT_COLORS[channel]:
+            failures.append((line, CHAT_COLORS.get(channel), color))
+    return failures
+
+
+def fuzz(count=20000, seed=None, limit_ms=5.0):
+    # Uso: python pipeline.py --fuzz [lineas aleatorias]
+    # Comprueba FUZZ_SAMPLES y los colores de embed de cada canal, y mide el peor tiempo por linea; codigo de
+    # salida 1 si alguna linea real no se reconoce o se supera limit_ms
+    classifier = Classifier()
+    failures = check_samples(classifier) + check_embed_colors(classifier)
+    for line, expected, got in failures:
+        print(f"FALLO: {line!r}: esperado {expected}, obtenido {got}")
+    worst = (0.0, "")
+
+    def timed(line):
+        nonlocal worst
+        t = time.perf_counter()
+        classifier(line)
+        elapsed = time.perf_counter() - t
+        if elapsed > worst[0]:
+            worst = (elapsed, line)
+        return elapsed
+
+    print(f"{'familia':<10}" + "".join(f"{n:>10}" for n in (256, 512, 1024, 2048, 65536)) + "   (us/linea)")
+    for name, build in FUZZ_FAMILIES.items():
+        cells = []
+        for n in (256, 512, 1024, 2048, 65536):
+            line = build(n)
+            best = min(timed(line) for _ in range(5))
+            cells.append(f"{best * 1e6:>10.1f}")
+        print(f"{name:<10}" + "".join(cells))
+
+    rng = random.Random(seed)
+    times = []
+    for _ in range(count):
+        line = "".join(rng.choice(FUZZ_TOKENS) for _ in range(rng.randint(1, 400)))
+        times.append(timed(line))
+    times.sort()
+    print(f"{count} lineas aleatorias: p50 {times[len(times) // 2] * 1e6:.1f} us, "
+          f"p99 {times[int(len(times) * 0.99)] * 1e6:.1f} us, max {times[-1] * 1e6:.1f} us")
+    print(f"Peor linea: {worst[0] * 1e3:.3f} ms ({len(worst[1])} caracteres, recortada a {MAX_LINE_LENGTH})")
+    if worst[0] * 1e3 > limit_ms:
+        print(f"FALLO: la peor linea supera {limit_ms:g} ms")
+    return 1 if failures or worst[0] * 1e3 > limit_ms else 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "--fuzz":
+        sys.exit(fuzz(int(sys.argv[2]) if len(sys.argv) > 2 else 20000))
+    if len(sys.argv) < 2:
+        print("Uso: python pipeline.py archivo.log [repeticiones] | --fuzz [lineas]")
+        sys.exit(1)
+    benchmark(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 1)
@@ -0,0 +1,285 @@
+import array
+import hashlib
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+
+log = logging.getLogger("rollups")
+
+# Resolucion -> (segundos por bucket, numero de buckets en el anillo)
+LEVELS = {
+    "minute": (60, 2 * 24 * 60),      # 2 dias
+    "hour": (3600, 8 * 7 * 24),       # 8 semanas
+    "day": (86400, 2 * 366),          # 2 anos
+}
+
+COUNTERS = (
+    "games_created", "joins", "leaves",
+    "chat_all", "chat_allies", "chat_team", "chat_lobby", "chat_observer",
+    "players_peak",
+)
+
+HLL_P = 8                 # 256 registros por bucket (~6.5% de error)
+HLL_M = 1 << HLL_P
+
+
+# ==========================
+#  HYPERLOGLOG
+# ==========================
+
+def _hll_hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def hll_position(value):
+    # (registro, rango) para un valor; se calcula una vez y se aplica a cada nivel
+    h = _hll_hash(value)
+    index = h >> (64 - HLL_P)
+    rest = h & ((1 << (64 - HLL_P)) - 1)
+    rank = (64 - HLL_P) - rest.bit_length() + 1
+    return index, rank
+
+
+def hll_estimate(registers):
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    total = 0.0
+    zeros = 0
+    for r in registers:
+        total += 2.0 ** -r
+        if r == 0:
+            zeros += 1
+    estimate = alpha * m * m / total
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * math.log(m / zeros)  # conteo lineal para cardinalidades bajas
+    return int(round(estimate))
+
+
+# ==========================
+#  ANILLO DE BUCKETS
+# ==========================
+
+class RingLevel:
+    """Buckets de ancho fijo en arrays compactos.
+
+    ``stamps[i]`` guarda el numero de bucket (tiempo // ancho) que ocupa la
+    posicion ``i``; si no coincide con el pedido, el bucket esta vacio o ya
+    fue reciclado. Toda consulta o actualizacion es O(1).
+    """
+
+    def __init__(self, width, size):
+        self.width = width
+        self.size = size
+        self.stamps = array.array("q", [-1]) * size
+        self.counters = {name: array.array("I", [0]) * size for name in COUNTERS}
+        self.hll = bytearray(size * HLL_M)
+
+    def _slot(self, ts):
+        bucket = int(ts // self.width)
+        i = bucket % self.size
+        if self.stamps[i] != bucket:
+            # Reciclar la posicion para el bucket nuevo
+            self.stamps[i] = bucket
+            for arr in self.counters.values():
+                arr[i] = 0
+            base = i * HLL_M
+            self.hll[base:base + HLL_M] = bytes(HLL_M)
+        return i
+
+    def add(self, ts, name, amount=1):
+        i = self._slot(ts)
+        self.counters[name][i] += amount
+
+    def peak(self, ts, name, value):
+        i = self._slot(ts)
+        if value > self.counters[name][i]:
+            self.counters[name][i] = value
+
+    def add_unique(self, ts, position):
+        i = self._slot(ts)
+        index, rank = position
+        j = i * HLL_M + index
+        if rank > self.hll[j]:
+            self.hll[j] = rank
+
+    def get(self, ts, name):
+        bucket = int(ts // self.width)
+        i = bucket % self.size
+        if self.stamps[i] != bucket:
+            return 0
+        if name == "unique_ips":
+            base = i * HLL_M
+            return hll_estimate(self.hll[base:base + HLL_M])
+        return self.counters[name][i]
+
+    def series(self, name, start, end):
+        first = int(start // self.width)
+        last = int(end // self.width)
+        first = max(first, last - self.size + 1)
+        return [(b * self.width, self.get(b * self.width, name)) for b in range(first, last + 1)]
+
+
+# ==========================
+#  ROLLUP POR BOT
+# ==========================
+
+class Rollup:
+    def __init__(self, bot):
+        self.bot = bot
+        self.levels = {name: RingLevel(width, size) for name, (width, size) in LEVELS.items()}
+        self.players = 0
+        self.lock = threading.Lock()
+
+    def add_event(self, ev):
+        kind = ev.type.name.lower()
+        ts = ev.ts or time.time()
+        with self.lock:
+            if kind == "create":
+                self._add(ts, "games_created")
+            elif kind == "join":
+                self._add(ts, "joins")
+                self.players += 1
+                for level in self.levels.values():
+                    level.peak(ts, "players_peak", self.players)
+                if ev.ip:
+                    position = hll_position(ev.ip)
+                    for level in self.levels.values():
+                        level.add_unique(ts, position)
+            elif kind == "leave":
+                self._add(ts, "leaves")
+                self.players = max(0, self.players - 1)
+            elif kind == "chat":
+                name = f"chat_{(ev.channel or '').lower()}"
+                if name in COUNTERS:
+                    self._add(ts, name)
+
+    def _add(self, ts, name):
+        for level in self.levels.values():
+            level.add(ts, name)
+
+    def get(self, level, metric, ts):
+        with self.lock:
+            return self.levels[level].get(ts, metric)
+
+    def series(self, level, metric, start, end):
+        with self.lock:
+            return self.levels[level].series(metric, start, end)
+
+    # ---- Persistencia ---- #
+    def save(self, path):
+        # Cabecera JSON en una linea + arrays en binario; escritura atomica
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp = path + ".tmp"
+        with self.lock:
+            header = {
+                "bot": self.bot,
+                "players": self.players,
+                "hll_p": HLL_P,
+                "counters": list(COUNTERS),
+                "levels": {name: [lv.width, lv.size] for name, lv in self.levels.items()},
+                "byteorder": sys.byteorder,
+            }
+            with open(tmp, "wb") as f:
+                f.write(json.dumps(header).encode("utf-8") + b"\n")
+                for name in LEVELS:
+                    level = self.levels[name]
+                    level.stamps.tofile(f)
+                    for counter in COUNTERS:
+                        level.counters[counter].tofile(f)
+                    f.write(level.hll)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, bot=None):
+        rollup = cls(bot)
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            if (header.get("counters") != list(COUNTERS) or header.get("hll_p") != HLL_P
+                    or header.get("levels") != {n: list(v) for n, v in LEVELS.items()}):
+                log.warning(f"Rollup {path} con formato distinto; se empieza de cero")
+                return rollup
+            swap = header.get("byteorder") != sys.byteorder
+            rollup.bot = bot or header.get("bot")
+            rollup.players = header.get("players", 0)
+            for name in LEVELS:
+                level = rollup.levels[name]
+                for arr in [level.stamps] + [level.counters[c] for c in COUNTERS]:
+                    loaded = array.array(arr.typecode)
+                    loaded.fromfile(f, level.size)
+                    if swap:
+                        loaded.byteswap()
+                    arr[:] = loaded
+                level.hll[:] = f.read(level.size * HLL_M)
+        return rollup
+
+
+def rollup_path(directory, bot, logfile=None):
+    # Dos logs con el mismo nombre en carpetas distintas no comparten archivo:
+    # se anade un hash corto de la ruta completa
+    if not logfile:
+        return os.path.join(directory, f"{bot}.rollup")
+    tag = hashlib.sha1(os.path.normcase(os.path.realpath(logfile)).encode("utf-8")).hexdigest()[:8]
+    return os.path.join(directory, f"{bot}-{tag}.rollup")
+
+
+def open_rollup(directory, bot, logfile=None):
+    path = rollup_path(directory, bot, logfile)
+    legacy = rollup_path(directory, bot)
+    if logfile and not os.path.exists(path) and os.path.exists(legacy):
+        # Archivo de versiones anteriores (solo el nombre del bot): lo hereda un solo
+        # log (el primero que lo aparta con rename), que lo guarda con su nombre nuevo;
+        # el antiguo queda como .migrated para no sumarlo dos veces
+        claimed = f"{legacy}.{os.getpid()}.migrating"
+        try:
+            os.rename(legacy, claimed)
+        except OSError:
+            claimed = None
+        if claimed:
+            try:
+                rollup = Rollup.load(claimed, bot)
+                rollup.save(path)
+                os.replace(claimed, f"{legacy}.migrated")
+                log.info(f"Rollup de {logfile}: migrado desde {legacy}")
+                return rollup
+            except Exception as e:
+                log.error(f"No se pudo migrar {legacy}: {e}", exc_info=True)
+                try:
+                    os.rename(claimed, legacy)
+                except OSError:
+                    pass
+    if os.path.exists(path):
+        try:
+            return Rollup.load(path, bot)
+        except Exception as e:
+            log.error(f"No se pudo cargar {path}: {e}", exc_info=True)
+    return Rollup(bot)
+
+
+# ==========================
+#  CONSULTA POR CONSOLA
+# ==========================
+
+def main(argv):
+    # Uso: python rollups.py data/rollups/ssjuegos-1a2b3c4d.rollup hour games_created [buckets]
+    if len(argv) < 4:
+        print("Uso: python rollups.py archivo.rollup minute|hour|day metrica [buckets]")
+        print("Metricas: " + ", ".join(COUNTERS + ("unique_ips",)))
+        return 1
+    path, level, metric = argv[1:4]
+    count = int(argv[4]) if len(argv) > 4 else 24
+    rollup = Rollup.load(path)
+    width = LEVELS[level][0]
+    now = time.time()
+    for ts, value in rollup.series(level, metric, now - (count - 1) * width, now):
+        print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(ts))}  {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,572 @@
+import collections
+import hashlib
+import json
+import logging
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+
+from diagnostics import DIAG
+from rollups import open_rollup, rollup_path
+from webhooks import WebhookPool, build_embed, pack_embeds, webhook_urls
+
+log = logging.getLogger("sinks")
+
+DISCORD_CONTENT_LIMIT = 2000
+
+# Totales de los cierres de sinks (informe de la parada ordenada)
+CLOSE_TOTALS = collections.Counter()
+
+
+# ==========================
+#  SINK BASE
+# ==========================
+
+class Sink:
+    """Destino de eventos con cola propia y un hilo escritor por sink.
+
+    El hilo del monitor solo hace ``put`` (nunca bloquea); cada sink agrupa
+    los eventos en lotes de ``batch_size`` o cada ``flush_interval`` segundos.
+    Si la cola se llena se descartan eventos y se cuentan en ``dropped``.
+    ``close(timeout)`` entrega lo pendiente hasta el plazo; lo que no llega
+    a salir se guarda (spool del webhook) o se cuenta en ``lost``.
+    """
+
+    kind = "base"
+
+    def __init__(self, name=None, queue_size=1000, batch_size=50, flush_interval=1.0):
+        self.name = name or self.kind
+        self.queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = float(flush_interval)
+        self.sent = 0
+        self.dropped = 0
+        self.errors = 0
+        self.lost = 0
+        self.lost_offset = None
+        self.heartbeat = time.monotonic()
+        self._inflight = None
+        self._deadline = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"sink-{self.name}", daemon=True)
+
+    def start(self):
+        if not self._thread.is_alive():
+            self._thread.start()
+            DIAG.register(f"sink:{self.name}", self.stats)
+        return self
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            # Avisar solo cada 100 descartes para no inundar el log
+            if self.dropped % 100 == 1:
+                log.warning(f"Sink {self.name}: cola llena, eventos descartados: {self.dropped}")
+            return False
+
+    def stop(self, timeout=5.0):
+        # Pide el cierre sin esperar (varios sinks vacian sus colas a la vez)
+        if self._deadline is None:
+            self._deadline = time.monotonic() + timeout
+        self._stop.set()
+
+    def remaining(self, default=5.0):
+        if self._deadline is None:
+            return default
+        return max(0.0, self._deadline - time.monotonic())
+
+    def close(self, timeout=5.0):
+        self.stop(timeout)
+        if self._thread.is_alive():
+            self._thread.join(self.remaining())
+            if self._thread.is_alive():
+                # Plazo agotado: que lo pendiente vaya a disco si el sink sabe hacerlo
+                self.on_timeout()
+                self._thread.join(0.5)
+        left = self.queue.qsize()
+        if left:
+            self.lost_offset = self.pending_offset()
+            self.lost += left
+            log.warning(f"Sink {self.name}: {left} eventos sin entregar al cerrar")
+        CLOSE_TOTALS["closed"] += 1
+        CLOSE_TOTALS["lost"] += left
+        DIAG.unregister(f"sink:{self.name}")
+
+    def stalled(self, limit, now=None):
+        # El escritor lleva mas de ``limit`` segundos dentro de un lote
+        now = time.monotonic() if now is None else now
+        return self._thread.is_alive() and now - self.heartbeat > limit
+
+    def pending_offset(self):
+        # Offset de la primera linea aun no escrita (lote en curso o cola), o None
+        offsets = [self._inflight] if self._inflight is not None else []
+        with self.queue.mutex:
+            offsets.extend(ev.offset for ev in self.queue.queue if ev.offset >= 0)
+        return min(offsets) if offsets else None
+
+    def abandon(self):
+        # El supervisor lo sustituye por otro: deja de escribir sin esperar. El
+        # monitor sigue donde iba la lectura (no se releen lineas), asi que lo que
+        # quede en la cola se pierde y se cuenta. Se vacia con el lock de la cola:
+        # solo cuenta lo que el escritor ya no puede entregar
+        self._stop.set()
+        DIAG.unregister(f"sink:{self.name}")
+        with self.queue.mutex:
+            removed = list(self.queue.queue)
+            self.queue.queue.clear()
+            self.queue.not_full.notify_all()
+        if removed:
+            self.lost += len(removed)
+            offsets = [ev.offset for ev in removed if ev.offset >= 0]
+            self.lost_offset = min(offsets) if offsets else None
+            log.warning(f"Sink {self.name}: abandonado con {len(removed)} eventos sin escribir")
+
+    def stats(self):
+        return {
+            "sink": self.name,
+            "kind": self.kind,
+            "queued": self.queue.qsize(),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        profiling = False
+        while True:
+            self.heartbeat = time.monotonic()
+            if DIAG.profiling is not profiling:
+                profiling = DIAG.profile_tick()
+            if self._stop.is_set() and self.queue.empty():
+                break
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                batch.append(self.queue.get(timeout=min(timeout, 0.5)))
+            except queue.Empty:
+                pass
+            now = time.monotonic()
+            # Al parar no se espera a completar el lote: se vacia ya
+            if len(batch) >= self.batch_size or (batch and (now >= deadline or self._stop.is_set())):
+                self._flush(batch)
+                batch = []
+            if now >= deadline:
+                deadline = now + self.flush_interval
+        if batch:
+            self._flush(batch)
+        self.on_close()
+
+    def _flush(self, batch):
+        self._inflight = min((ev.offset for ev in batch if ev.offset >= 0), default=None)
+        try:
+            if DIAG.timing:
+                t0, c0 = time.perf_counter(), time.thread_time()
+                self.write_batch(batch)
+                DIAG.record(self.name, "write", t0, c0)
+            else:
+                self.write_batch(batch)
+            self.sent += len(batch)
+        except Exception as e:
+            self.errors += 1
+            log.error(f"Sink {self.name}: error escribiendo lote de {len(batch)} eventos: {e}", exc_info=True)
+        finally:
+            self._inflight = None
+
+    def write_batch(self, events):
+        raise NotImplementedError
+
+    def on_timeout(self):
+        pass
+
+    def on_close(self):
+        pass
+
+
+# ==========================
+#  SINKS INCLUIDOS
+# ==========================
+
+class JsonlSink(Sink):
+    """Un evento JSON por linea, con rotacion por tamano (archivo.1, archivo.2...)."""
+
+    kind = "jsonl"
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=5, **kwargs):
+        kwargs.setdefault("batch_size", 200)
+        super().__init__(**kwargs)
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self.backups = int(backups)
+        self._fh = None
+
+    def _open(self):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    def _rotate(self):
+        self._fh.close()
+        self._fh = None
+        if self.backups > 0:
+            for i in range(self.backups - 1, 0, -1):
+                src = f"{self.path}.{i}"
+                if os.path.exists(src):
+                    os.replace(src, f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def write_batch(self, events):
+        if self._fh is None:
+            self._open()
+        data = "".join(json.dumps(ev.to_dict(), ensure_ascii=False) + "\n" for ev in events)
+        self._fh.write(data)
+        self._fh.flush()
+        if self.max_bytes and self._fh.tell() >= self.max_bytes:
+            self._rotate()
+
+    def on_close(self):
+        if self._fh:
+            self._fh.close()
+            self._fh = None
+
+
+class StdoutSink(Sink):
+    """Salida por consola (modo TERMINAL): una linea por evento, flush por lote."""
+
+    kind = "stdout"
+
+    def __init__(self, stream=None, **kwargs):
+        kwargs.setdefault("flush_interval", 0.2)
+        super().__init__(**kwargs)
+        self.stream = stream or sys.stdout
+
+    def write_batch(self, events):
+        self.stream.write("".join(f"[{ev.bot}] {ev.message}\n" for ev in events))
+        self.stream.flush()
+
+
+class UdpSink(Sink):
+    """Datagramas UDP con lineas JSON; varios eventos por datagrama hasta ``max_datagram``."""
+
+    kind = "udp"
+
+    def __init__(self, host="127.0.0.1", port=5140, max_datagram=1400, **kwargs):
+        kwargs.setdefault("flush_interval", 0.2)
+        super().__init__(**kwargs)
+        self.addr = (host, int(port))
+        self.max_datagram = int(max_datagram)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+
+    def write_batch(self, events):
+        packet = b""
+        for ev in events:
+            line = json.dumps(ev.to_dict(), ensure_ascii=False).encode("utf-8") + b"\n"
+            if packet and len(packet) + len(line) > self.max_datagram:
+                self._send(packet)
+                packet = b""
+            packet += line
+        if packet:
+            self._send(packet)
+
+    def _send(self, packet):
+        try:
+            self._sock.sendto(packet, self.addr)
+        except (BlockingIOError, OSError) as e:
+            # UDP es "best effort": se cuenta el error y se sigue
+            self.errors += 1
+            log.debug(f"Sink {self.name}: datagrama descartado: {e}")
+
+    def on_close(self):
+        self._sock.close()
+
+
+class WebhookSink(Sink):
+    """Envio a webhook de Discord.
+
+    ``url`` puede ser una lista: los mensajes se reparten entre las URLs
+    (ver ``WebhookPool``) respetando el orden dentro de cada partida.
+    Con ``coalesce`` activo, los eventos de una misma partida se unen en
+    mensajes de hasta 2000 caracteres en lugar de un POST por evento.
+    Con ``mode="embeds"`` cada evento es un embed (titulo, color y campos) y
+    se envian hasta 10 por POST.
+    Si un webhook responde 401/403/404 varias veces seguidas se deja de usar
+    (ver ``CircuitBreaker``) y sus mensajes van a las otras URLs, a
+    ``fallback`` o al ``spool`` (``""`` lo desactiva); ``notify`` recibe la
+    alerta de caida y de recuperacion. Con ``ordered`` todos los mensajes
+    siguen un unico orden (una sola clave) en lugar de uno por partida.
+    """
+
+    kind = "webhook"
+
+    def __init__(self, url, timeout=10, coalesce=False, mode="content", fallback=None, spool=None,
+                 notify=None, breaker=None, ordered=False, **kwargs):
+        kwargs.setdefault("flush_interval", 0.5)
+        kwargs.setdefault("batch_size", 10)
+        super().__init__(**kwargs)
+        self.url = url
+        self.timeout = float(timeout)
+        self.coalesce = bool(coalesce)
+        self.mode = mode
+        self.ordered = bool(ordered)
+        self.waiting = False
+        # Offset del primer lote entregado al pool que puede seguir sin enviar
+        self._unconfirmed = None
+        if spool is None:
+            spool = os.path.join("data", "spool", f"{self.name}.jsonl")
+        self.pool = WebhookPool(url, name=self.name, timeout=self.timeout, fallback=fallback,
+                                spool=spool or None, notify=notify or print, breaker=breaker)
+
+    def write_batch(self, events):
+        # Con el pool vacio todo lo anterior ya salio; si no, el lote mas antiguo sigue contando
+        if not self.pool.pending():
+            self._unconfirmed = None
+        if self._unconfirmed is None:
+            self._unconfirmed = min((ev.offset for ev in events if ev.offset >= 0), default=None)
+        # Las entradas/salidas cubiertas por un resumen (digest) no se publican sueltas
+        events = [ev for ev in events if not ev.digested]
+        if self.mode == "embeds":
+            for key, group in self.group_by_key(events).items():
+                for embeds in pack_embeds(build_embed(ev) for ev in group):
+                    self.submit(key, {"embeds": embeds, "allowed_mentions": {"parse": []}})
+            return
+        if not self.coalesce:
+            for ev in events:
+                self.post(ev.message or "", self.order_key(ev))
+            return
+        for key, group in self.group_by_key(events).items():
+            texts = [ev.message or "" for ev in group]
+            chunk = ""
+            for text in texts:
+                if chunk and len(chunk) + 1 + len(text) > DISCORD_CONTENT_LIMIT:
+                    self.post(chunk, key)
+                    chunk = ""
+                chunk = f"{chunk}\n{text}" if chunk else text
+            if chunk:
+                self.post(chunk, key)
+
+    def order_key(self, ev):
+        if self.ordered:
+            return self.name
+        return ev.game or ev.bot
+
+    def group_by_key(self, events):
+        # Agrupar por partida conservando el orden relativo de cada una
+        groups = {}
+        for ev in events:
+            groups.setdefault(self.order_key(ev), []).append(ev)
+        return groups
+
+    def post(self, content, key=None):
+        payload = {
+            "content": content[:DISCORD_CONTENT_LIMIT],
+            "allowed_mentions": {"parse": []}  # evita @everyone/@here y menciones
+        }
+        self.submit(key, payload)
+
+    def submit(self, key, payload):
+        # Con el pool ya cerrado (parada con plazo agotado) el mensaje va al spool.
+        # Esperar a que el pool tenga sitio es ir lento, no estar colgado (ver stalled)
+        self.waiting = True
+        try:
+            sent = self.pool.submit(key, payload)
+        finally:
+            self.waiting = False
+        if not sent:
+            self.pool.overflow(key, payload)
+
+    def pending_offset(self):
+        # Ademas de la cola del sink, lo que espera en las URLs del pool
+        offsets = [super().pending_offset()]
+        if self.pool.pending():
+            offsets.append(self._unconfirmed)
+        offsets = [o for o in offsets if o is not None]
+        return min(offsets) if offsets else None
+
+    def stats(self):
+        data = super().stats()
+        data.update(self.pool.health())
+        data["webhooks"] = self.pool.stats()
+        return data
+
+    def stalled(self, limit, now=None):
+        # Colgado = un POST que no vuelve; un pool lleno por limite de tasa o con
+        # las URLs caidas (cortacircuitos abierto) solo va lento
+        if self.pool.hung(limit, now):
+            return True
+        return not self.waiting and super().stalled(limit, now)
+
+    def abandon(self):
+        # Nada se pierde: con el pool cerrado, lo que queda en las URLs va al spool
+        # y el escritor sigue vaciando la cola del sink, cuyo destino acaba siendo
+        # tambien el spool (lo reenvia el sink que lo sustituye)
+        self.pool.abandon()
+        self._stop.set()
+        DIAG.unregister(f"sink:{self.name}")
+
+    def close(self, timeout=5.0):
+        before = self.pool.health()
+        super().close(timeout)
+        count_pool_close(self.pool, before)
+
+    def on_timeout(self):
+        self.pool.abandon()
+
+    def on_close(self):
+        self.pool.close(self.remaining())
+
+
+class RollupSink(Sink):
+    """Agregados por minuto/hora/dia del bot (ver rollups.py), guardados a disco."""
+
+    kind = "rollup"
+
+    def __init__(self, bot, directory="data/rollups", save_interval=60, logfile=None, **kwargs):
+        kwargs.setdefault("batch_size", 500)
+        super().__init__(**kwargs)
+        self.path = rollup_path(directory, bot, logfile)
+        self.save_interval = float(save_interval)
+        self.rollup = open_rollup(directory, bot, logfile)
+        self._last_save = time.monotonic()
+
+    def write_batch(self, events):
+        for ev in events:
+            self.rollup.add_event(ev)
+        if time.monotonic() - self._last_save >= self.save_interval:
+            self.rollup.save(self.path)
+            self._last_save = time.monotonic()
+
+    def on_close(self):
+        self.rollup.save(self.path)
+
+
+class CallbackSink(Sink):
+    """Reenvia el texto a una funcion (p.ej. la pestana "Logs en vivo" de la GUI).
+
+    Una llamada por lote, con una linea por evento: la funcion se llama desde
+    el hilo del sink y no debe tocar la interfaz directamente.
+    """
+
+    kind = "callback"
+
+    def __init__(self, callback, **kwargs):
+        kwargs.setdefault("flush_interval", 0.2)
+        super().__init__(**kwargs)
+        self.callback = callback
+
+    def write_batch(self, events):
+        self.callback("\n".join(f"[{ev.source}] {ev.message}" for ev in events))
+
+
+def count_pool_close(pool, before):
+    # Suma al informe de la parada lo que el pool guardo en spool o perdio al cerrarse
+    after = pool.health()
+    CLOSE_TOTALS["spooled"] += after["spooled"] - before["spooled"]
+    CLOSE_TOTALS["lost"] += after["lost"] - before["lost"]
+
+
+def close_pool(pool, timeout=5.0):
+    # Pools que no pertenecen a un sink (alertas de watchlist y abuso)
+    before = pool.health()
+    pool.close(timeout)
+    count_pool_close(pool, before)
+
+
+# ==========================
+#  CONSTRUCCION DESDE SETTINGS
+# ==========================
+
+def sink_name(bot, kind, *destination):
+    # <bot>-<tipo>-<hash>: el hash sale del log de origen y del destino (URLs, ruta...),
+    # asi dos logs con el mismo nombre o dos webhooks nunca comparten nombre ni spool
+    tag = hashlib.sha1("\n".join(str(part) for part in destination).encode("utf-8")).hexdigest()[:8]
+    return f"{bot}-{kind}-{tag}"
+
+
+SINK_TYPES = {
+    "jsonl": JsonlSink,
+    "stdout": StdoutSink,
+    "udp": UdpSink,
+    "webhook": WebhookSink,
+    "rollup": RollupSink,
+}
+
+
+def build_sinks(entry, output_callback=None, notify=None, taken=None):
+    """Crea los sinks de una entrada de settings.json.
+
+    Formato (opcional; sin "sinks" se usa solo el webhook de la entrada)::
+
+        {"logfile": "...", "webhook": "...",
+         "sinks": [{"type": "webhook"},
+                   {"type": "jsonl", "path": "logs/events/bot.jsonl", "max_bytes": 10485760},
+                   {"type": "udp", "host": "127.0.0.1", "port": 5140},
+                   {"type": "rollup", "directory": "data/rollups"},
+                   {"type": "stdout"}]}
+
+    El sink webhook acepta ``fallback`` (URL de respaldo), ``spool`` (ruta,
+    por defecto data/spool/<nombre>.jsonl) y ``breaker`` ({"threshold": 3,
+    "probe_min": 30, "probe_max": 1800}). Cada sink acepta ademas
+    ``queue_size``, ``batch_size`` y ``flush_interval``. Las alertas de
+    webhooks caidos van a ``notify`` (o a ``output_callback``).
+
+    Cada sink se llama ``<bot>-<tipo>-<hash>`` (ver ``sink_name``), o ``name``
+    si se indica. Un nombre repetido, dentro de la entrada o en ``taken``
+    (los ya usados por otras entradas del mismo archivo), es el mismo destino
+    dos veces: se rechaza con un error en lugar de compartir spool.
+    """
+    logfile = entry.get("logfile", "")
+    bot = os.path.splitext(os.path.basename(logfile))[0]
+    origin = os.path.normcase(os.path.realpath(logfile)) if logfile else ""
+    specs = entry.get("sinks") or [{"type": "webhook"}]
+    taken = set() if taken is None else taken
+    sinks = []
+    for spec in specs:
+        opts = dict(spec)
+        kind = opts.pop("type", "webhook")
+        cls = SINK_TYPES.get(kind)
+        if cls is None:
+            log.error(f"Tipo de sink desconocido '{kind}' en {entry.get('logfile')}")
+            continue
+        if kind == "webhook":
+            opts.setdefault("url", entry.get("webhook"))
+            if not webhook_urls(opts["url"]):
+                continue
+            opts.setdefault("notify", notify or output_callback)
+        elif kind == "rollup":
+            opts.setdefault("bot", bot)
+            opts.setdefault("logfile", entry.get("logfile"))
+        if "name" not in opts:
+            if kind == "webhook":
+                destination = "\n".join(webhook_urls(opts["url"]))
+            else:
+                destination = json.dumps({k: v for k, v in opts.items() if k != "notify"}, sort_keys=True,
+                                         default=str)
+            opts["name"] = sink_name(bot, kind, origin, destination)
+        if opts["name"] in taken:
+            log.error(f"Sink '{kind}' repetido en {logfile} ({opts['name']}): mismo destino que otro sink "
+                      f"de este archivo, se omite")
+            continue
+        taken.add(opts["name"])
+        try:
+            sinks.append(cls(**opts))
+        except Exception as e:
+            log.error(f"No se pudo crear sink '{kind}' para {entry.get('logfile')}: {e}", exc_info=True)
+    if output_callback:
+        # La consola de TERMINAL y el motor para GUIs reciben el evento completo (tipo, bot), no el texto
+        name = sink_name(bot, "callback", origin)
+        make_sink = getattr(output_callback, "sink", None)
+        if make_sink is not None:
+            sinks.append(make_sink(name))
+        else:
+            sinks.append(CallbackSink(output_callback, name=name))
+    return sinks
@@ -0,0 +1,451 @@
+import argparse
+import http.server
+import itertools
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from discord_emulator import DiscordEmulator
+from pipeline import Classifier, line_timestamp
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MARKER = re.compile(r"~s(\d+)~")
+
+
+# ==========================
+#  RECEPTOR DE WEBHOOKS LOCAL
+# ==========================
+
+class Receiver:
+    """Webhook local que registra cuando llega cada evento marcado (~sN~).
+
+    Con ``emulate`` (opciones de ``DiscordEmulator``) responde como Discord:
+    rate-limit con 429, latencia y jitter; solo cuenta lo aceptado.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, emulate=None):
+        self.received = {}
+        self.requests = 0
+        self.started = threading.Event()
+        self.lock = threading.Lock()
+        self.emulator = None
+        if emulate is not None:
+            self.emulator = DiscordEmulator(host, port, on_message=self.record, **emulate)
+            self.server = self.emulator.server
+            return
+        receiver = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                now = time.time()
+                receiver.record(body.decode("utf-8", "replace"), now)
+                self.send_response(204)
+                self.end_headers()
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="soak-receiver", daemon=True).start()
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api/webhooks/0/soak"
+
+    def record(self, text, now):
+        with self.lock:
+            self.requests += 1
+            if "monitor iniciado" in text:
+                self.started.set()
+            for m in MARKER.finditer(text):
+                self.received.setdefault(int(m.group(1)), []).append(now)
+
+    def close(self):
+        if self.emulator is not None:
+            self.emulator.close()
+            return
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# ==========================
+#  GENERACION DE LINEAS
+# ==========================
+
+SYNTHETIC = (
+    "[GHOST] creating game [Soak {n}]",
+    "[GAME: Soak {n}] player [user{n}|10.0.{a}.{b}] joined the game",
+    "[GHOST] [Bnet] refreshing game list",
+    "[GAME: Soak {n}] (22:31) [All] [user{n}]: hola a todos",
+    "[GAME: Soak {n}] (22:32) [Team] [user{n}]: push mid",
+    "[GAME: Soak {n}] [Lobby] [user{n}]: ready",
+    "[GAME: Soak {n}] deleting player [user{n}]: has left the game voluntarily",
+)
+
+
+def synthetic_lines():
+    for n in itertools.count():
+        for template in SYNTHETIC:
+            yield None, template.format(n=n, a=(n >> 8) & 255, b=n & 255)
+
+
+def replay_lines(path, loop=False):
+    # (timestamp de la linea o None, linea) de un log grabado
+    while True:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.rstrip("\r\n")
+                yield line_timestamp(line), line
+        if not loop:
+            return
+
+
+def tag_line(line, seq):
+    # Inserta la marca ~sN~ donde sobreviva al renderizado del mensaje
+    tag = f"~s{seq}~"
+    for prefix in ("creating game [", "deleting player [", "player ["):
+        i = line.find(prefix)
+        if i >= 0:
+            i += len(prefix)
+            return line[:i] + tag + line[i:]
+    if "[GAME:" in line and "]:" in line:
+        return f"{line} {tag}"
+    return None
+
+
+# ==========================
+#  MEMORIA DEL PROCESO
+# ==========================
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / (1024.0 * 1024.0)
+    except Exception:
+        return None
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    k = min(len(values) - 1, max(0, int(round(pct / 100.0 * (len(values) - 1)))))
+    return values[k]
+
+
+# ==========================
+#  SERVICIO BAJO PRUEBA
+# ==========================
+
+def start_service(workdir, log_path, webhook_url, extra_entry=None, cluster=None):
+    # Lanza main.py en modo SERVICE con una configuracion temporal propia
+    os.makedirs(os.path.join(workdir, "config"), exist_ok=True)
+    os.makedirs(os.path.join(workdir, "data"), exist_ok=True)
+    with open(os.path.join(workdir, "config", "config.ini"), "w", encoding="utf-8") as f:
+        f.write("[APP]\nmode = SERVICE\nlog_level = WARNING\nauto_start = false\n")
+        if cluster:
+            f.write("[CLUSTER]\n" + "".join(f"{k} = {v}\n" for k, v in cluster.items()))
+    messages = os.path.join(HERE, "config", "default_messages.ini")
+    if os.path.exists(messages):
+        shutil.copy(messages, os.path.join(workdir, "config", "default_messages.ini"))
+    entry = {"logfile": log_path, "webhook": webhook_url}
+    entry.update(extra_entry or {})
+    with open(os.path.join(workdir, "data", "settings.json"), "w", encoding="utf-8") as f:
+        json.dump([entry], f, indent=4)
+    return subprocess.Popen(
+        [sys.executable, "-u", os.path.join(HERE, "main.py")],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT,
+    )
+
+
+# ==========================
+#  SOAK
+# ==========================
+
+class Soak:
+    def __init__(self, args):
+        self.args = args
+        self.classifier = Classifier()
+        self.written = {}
+        self.rss = []
+        self.windows = []
+        self.stop = threading.Event()
+
+    def write(self, log_path, source, speed, rate, duration, max_lines):
+        # Escribe al ritmo pedido: ``rate`` lineas/s (sintetico) o ``speed``x (reproduccion)
+        seq = 0
+        start = time.monotonic()
+        first_ts = None
+        count = 0
+        with open(log_path, "a", encoding="utf-8") as f:
+            for ts, line in source:
+                if self.stop.is_set():
+                    break
+                elapsed = time.monotonic() - start
+                if duration and elapsed >= duration:
+                    break
+                if max_lines and count >= max_lines:
+                    break
+                if ts is not None and speed:
+                    if first_ts is None:
+                        first_ts = ts
+                    delay = (ts - first_ts) / speed - elapsed
+                    if delay > 0:
+                        time.sleep(delay)
+                elif rate:
+                    delay = count / rate - elapsed
+                    if delay > 0:
+                        time.sleep(delay)
+                tagged = tag_line(line, seq)
+                if tagged is not None and self.classifier(tagged) is not None:
+                    line = tagged
+                    f.write(line + "\n")
+                    f.flush()
+                    self.written[seq] = time.time()
+                    seq += 1
+                else:
+                    f.write(line + "\n")
+                    f.flush()
+                count += 1
+        return count
+
+    def sample(self, receiver, pid):
+        # Una ventana por intervalo: latencias de lo recibido, eventos/s y RSS
+        seen = 0
+        last = time.monotonic()
+        while not self.stop.wait(self.args.interval):
+            now = time.monotonic()
+            with receiver.lock:
+                items = list(receiver.received.items())
+            fresh = [times[0] - self.written[seq] for seq, times in items[seen:] if seq in self.written]
+            seen = len(items)
+            fresh.sort()
+            rss = rss_mb(pid) if pid else None
+            window = {
+                "t": round(now - self.t0, 1),
+                "events": len(fresh),
+                "eps": round(len(fresh) / (now - last), 1),
+                "p50_ms": round(percentile(fresh, 50) * 1e3, 1),
+                "p99_ms": round(percentile(fresh, 99) * 1e3, 1),
+                "rss_mb": None if rss is None else round(rss, 1),
+            }
+            last = now
+            self.windows.append(window)
+            if rss is not None:
+                self.rss.append((now - self.t0, rss))
+            if not self.args.quiet:
+                print(f"[{window['t']:>8.1f}s] {window['events']:>6} ev  {window['eps']:>8.1f} ev/s  "
+                      f"p50 {window['p50_ms']:>8.1f} ms  p99 {window['p99_ms']:>8.1f} ms  RSS {window['rss_mb']} MB")
+
+    def report(self, receiver, elapsed):
+        latencies = []
+        duplicated = 0
+        for seq, times in receiver.received.items():
+            if seq in self.written:
+                latencies.append(times[0] - self.written[seq])
+            if len(times) > 1:
+                duplicated += len(times) - 1
+        latencies.sort()
+        dropped = sum(1 for seq in self.written if seq not in receiver.received)
+        rss = [v for _, v in self.rss]
+        return {
+            "written": len(self.written),
+            "received": len(latencies),
+            "dropped": dropped,
+            "duplicated": duplicated,
+            "requests": receiver.requests,
+            "throughput_eps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 50) * 1e3, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1e3, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1e3, 1),
+            "max_ms": round(latencies[-1] * 1e3, 1) if latencies else None,
+            "rss_start_mb": round(rss[0], 1) if rss else None,
+            "rss_end_mb": round(rss[-1], 1) if rss else None,
+            "rss_max_mb": round(max(rss), 1) if rss else None,
+            "windows": self.windows,
+        }
+
+    def start_nodes(self, workdir, log_path, url, extra):
+        # Varias instancias con un directorio de cluster comun: solo una vigila el log
+        shared = os.path.join(workdir, "cluster")
+        procs = {}
+        for i in range(self.args.nodes):
+            node_id = f"node{i}"
+            cluster = {"directory": shared, "node_id": node_id, "lease_seconds": self.args.lease_seconds,
+                       "heartbeat": max(0.5, self.args.lease_seconds / 3)}
+            procs[node_id] = start_service(os.path.join(workdir, node_id), log_path, url, extra, cluster)
+        return shared, procs
+
+    def kill_owner(self, shared, procs, delay):
+        # Simula la caida del nodo que tiene el lease (SIGKILL, sin soltar nada)
+        if self.stop.wait(delay):
+            return
+        for name in os.listdir(os.path.join(shared, "leases")):
+            if name.endswith(".lease"):
+                with open(os.path.join(shared, "leases", name), "r", encoding="utf-8") as f:
+                    owner = json.load(f).get("node")
+                proc = procs.get(owner)
+                if proc and proc.poll() is None:
+                    proc.kill()
+                    self.killed = (owner, round(time.monotonic() - self.t0, 1))
+                    print(f"💥 Nodo {owner} (PID {proc.pid}) eliminado a los {self.killed[1]}s")
+                return
+
+    def run(self):
+        args = self.args
+        emulate = None
+        if args.emulate:
+            emulate = {"limit": args.emu_limit, "window": args.emu_window,
+                       "latency_ms": args.emu_latency_ms, "jitter_ms": args.emu_jitter_ms}
+        receiver = Receiver(port=args.port, emulate=emulate)
+        workdir = None
+        proc = None
+        procs = {}
+        self.killed = None
+        try:
+            if args.log:
+                log_path = os.path.abspath(args.log)
+                print(f"Receptor en {receiver.url}; escribiendo en {log_path} (servicio externo)")
+            else:
+                workdir = tempfile.mkdtemp(prefix="soak-")
+                log_path = os.path.join(workdir, "soak.log")
+                open(log_path, "w").close()
+                extra = json.loads(args.entry) if args.entry else None
+                if args.nodes > 1:
+                    shared, procs = self.start_nodes(workdir, log_path, receiver.url, extra)
+                    proc = procs["node0"]
+                    print(f"{args.nodes} nodos en {workdir} (PIDs {', '.join(str(p.pid) for p in procs.values())})")
+                else:
+                    proc = start_service(workdir, log_path, receiver.url, extra)
+                    print(f"Servicio PID {proc.pid} en {workdir}")
+            if not receiver.started.wait(args.startup_timeout):
+                print("⚠️ El servicio no envio el mensaje de arranque; se empieza igualmente")
+
+            if args.replay:
+                speed = 0.0 if args.speed == "max" else float(args.speed)
+                source = replay_lines(args.replay, loop=bool(args.duration))
+                rate = 0.0
+            else:
+                speed = 0.0
+                source = synthetic_lines()
+                rate = args.rate
+
+            self.t0 = time.monotonic()
+            sampler = threading.Thread(target=self.sample, args=(receiver, proc.pid if proc else None), daemon=True)
+            sampler.start()
+            if procs and args.kill_owner_after:
+                threading.Thread(target=self.kill_owner, args=(shared, procs, args.kill_owner_after),
+                                 daemon=True).start()
+            lines = self.write(log_path, source, speed, rate, args.duration, args.lines)
+            write_time = time.monotonic() - self.t0
+
+            # Esperar a que llegue lo pendiente
+            deadline = time.monotonic() + args.drain
+            while time.monotonic() < deadline:
+                if all(seq in receiver.received for seq in self.written):
+                    break
+                time.sleep(0.2)
+            self.stop.set()
+            sampler.join()
+
+            result = self.report(receiver, write_time)
+            result["lines"] = lines
+            result["killed"] = self.killed
+            print(f"\nLineas escritas: {lines}, eventos: {result['written']}, recibidos: {result['received']}")
+            print(f"Perdidos: {result['dropped']}, duplicados: {result['duplicated']}, peticiones HTTP: {result['requests']}")
+            if receiver.emulator is not None:
+                result["emulator"] = receiver.emulator.stats()["status"]
+                print("Respuestas del emulador: " + ", ".join(f"{k}={v}" for k, v in result["emulator"].items()))
+            print(f"Throughput: {result['throughput_eps']} ev/s")
+            print(f"Latencia p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, p99 {result['p99_ms']} ms, max {result['max_ms']} ms")
+            if result["rss_start_mb"] is not None:
+                print(f"RSS inicio {result['rss_start_mb']} MB, fin {result['rss_end_mb']} MB, max {result['rss_max_mb']} MB")
+            if args.report:
+                with open(args.report, "w", encoding="utf-8") as f:
+                    json.dump(result, f, indent=2)
+            return self.check(result)
+        finally:
+            self.stop.set()
+            for p in list(procs.values()) or [proc]:
+                if p is None or p.poll() is not None:
+                    continue
+                p.terminate()
+                try:
+                    p.wait(10)
+                except subprocess.TimeoutExpired:
+                    p.kill()
+            receiver.close()
+            if workdir and not args.keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    def check(self, result):
+        # Umbrales opcionales para detectar regresiones (codigo de salida 1)
+        args = self.args
+        failures = []
+        if args.max_p99_ms and result["p99_ms"] > args.max_p99_ms:
+            failures.append(f"p99 {result['p99_ms']} ms > {args.max_p99_ms} ms")
+        if args.max_dropped is not None and result["dropped"] > args.max_dropped:
+            failures.append(f"perdidos {result['dropped']} > {args.max_dropped}")
+        if result["duplicated"] and not args.allow_duplicates:
+            failures.append(f"duplicados {result['duplicated']}")
+        if args.max_rss_growth_mb and result["rss_start_mb"] is not None:
+            growth = result["rss_end_mb"] - result["rss_start_mb"]
+            if growth > args.max_rss_growth_mb:
+                failures.append(f"RSS crecio {growth:.1f} MB > {args.max_rss_growth_mb} MB")
+        for failure in failures:
+            print(f"❌ {failure}")
+        if not failures:
+            print("✅ Soak OK")
+        return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Soak de latencia extremo a extremo: log -> run_service -> webhook local")
+    parser.add_argument("--replay", help="log grabado a reproducir (por defecto: lineas sinteticas)")
+    parser.add_argument("--speed", default="1", help="velocidad de reproduccion: 1, 10, ... o max")
+    parser.add_argument("--rate", type=float, default=50.0, help="lineas/s sinteticas (0 = maximo)")
+    parser.add_argument("--duration", type=float, default=60.0, help="segundos de escritura (0 = sin limite)")
+    parser.add_argument("--lines", type=int, default=0, help="maximo de lineas a escribir (0 = sin limite)")
+    parser.add_argument("--drain", type=float, default=15.0, help="segundos de espera final para eventos pendientes")
+    parser.add_argument("--interval", type=float, default=10.0, help="segundos entre muestras de latencia/RSS")
+    parser.add_argument("--entry", help='JSON extra para la entrada de settings.json (p.ej. \'{"sinks": [...]}\')')
+    parser.add_argument("--log", help="usar un servicio ya en marcha que vigila este archivo")
+    parser.add_argument("--port", type=int, default=0, help="puerto del receptor (con --log)")
+    parser.add_argument("--startup-timeout", type=float, default=15.0)
+    parser.add_argument("--emulate", action="store_true",
+                        help="responder como Discord (rate-limit, 429, latencia) con discord_emulator.py")
+    parser.add_argument("--emu-limit", type=int, default=5, help="peticiones por ventana (con --emulate)")
+    parser.add_argument("--emu-window", type=float, default=2.0, help="segundos por ventana (con --emulate)")
+    parser.add_argument("--emu-latency-ms", type=float, default=80.0)
+    parser.add_argument("--emu-jitter-ms", type=float, default=40.0)
+    parser.add_argument("--nodes", type=int, default=1, help="instancias SERVICE con un directorio de cluster comun")
+    parser.add_argument("--lease-seconds", type=float, default=6.0, help="caducidad de los leases (con --nodes)")
+    parser.add_argument("--kill-owner-after", type=float, default=0.0,
+                        help="segundos tras los que se mata el nodo que vigila el log (con --nodes)")
+    parser.add_argument("--report", help="guardar el resultado en JSON")
+    parser.add_argument("--max-p99-ms", type=float, default=0.0)
+    parser.add_argument("--max-dropped", type=int, default=None)
+    parser.add_argument("--max-rss-growth-mb", type=float, default=0.0)
+    parser.add_argument("--allow-duplicates", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="no borrar el directorio temporal")
+    parser.add_argument("--quiet", action="store_true")
+    return Soak(parser.parse_args(argv)).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
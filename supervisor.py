@@ -0,0 +1,287 @@
+import logging
+import threading
+import time
+
+from diagnostics import DIAG
+
+log = logging.getLogger("supervisor")
+
+
+# ==========================
+#  EVENTOS DE PARADA
+# ==========================
+
+class StopSignal(threading.Event):
+    """Evento de parada que puede llevar un plazo para vaciar colas.
+
+    ``stop(timeout)`` es la parada ordenada: los monitores dejan de leer y
+    sus sinks tienen hasta ``deadline`` para entregar lo pendiente.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.deadline = None
+
+    def stop(self, timeout):
+        self.deadline = time.monotonic() + float(timeout)
+        self.set()
+
+
+def time_left(stop_event, default=10.0):
+    # Segundos hasta el plazo de la parada (``default`` si no lo tiene)
+    deadline = getattr(stop_event, "deadline", None)
+    if deadline is None:
+        return default
+    return max(0.0, deadline - time.monotonic())
+
+
+class LinkedStop:
+    """Evento de parada de una ejecucion de un monitor.
+
+    Se considera activado si lo esta el suyo (el supervisor lo sustituye) o
+    el del padre (parada general o archivo retirado), sin esperar al
+    siguiente ciclo del supervisor.
+    """
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.own = threading.Event()
+
+    @property
+    def deadline(self):
+        return getattr(self.parent, "deadline", None)
+
+    def is_set(self):
+        return self.own.is_set() or self.parent.is_set()
+
+    def set(self):
+        self.own.set()
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.is_set():
+            remaining = 0.5 if deadline is None else min(0.5, deadline - time.monotonic())
+            if remaining <= 0:
+                break
+            self.own.wait(remaining)
+        return self.is_set()
+
+
+# ==========================
+#  MONITOR SUPERVISADO
+# ==========================
+
+class SupervisedMonitor:
+    """Un archivo vigilado y la ejecucion actual de su monitor.
+
+    Se usa en lugar del hilo (``is_alive``, ``join``, ``log_path``,
+    ``subscribers``): el resto del programa no ve los reinicios.
+    """
+
+    def __init__(self, launch, entries, stop_event, start_offset=None):
+        self.launch = launch
+        self.entries = entries
+        self.stop_event = stop_event
+        self.log_path = entries[0].get("logfile")
+        self.subscribers = len(entries)
+        self.offset = start_offset
+        self.thread = None
+        self.stop = None
+        self.started = 0.0
+        self.next_start = 0.0
+        self.failures = 0
+        self.restarts = 0
+        self.status = "iniciando"
+        self.last_error = None
+
+    def start(self, now=None):
+        self.stop = LinkedStop(self.stop_event)
+        self.thread = self.launch(self.entries, self.stop, self.offset)
+        # La ingestion por red no tiene archivo: se usa la etiqueta del hilo
+        self.log_path = getattr(self.thread, "log_path", None) or self.log_path
+        self.started = time.monotonic() if now is None else now
+        return self.thread
+
+    def is_alive(self):
+        thread = self.thread
+        return not self.stop_event.is_set() or (thread is not None and thread.is_alive())
+
+    def join(self, timeout=None):
+        # La ejecucion puede cambiar mientras se espera (reinicio en curso)
+        while True:
+            thread = self.thread
+            if thread is None:
+                return
+            thread.join(timeout)
+            if thread is self.thread or timeout is not None:
+                return
+
+    def describe(self):
+        thread = self.thread
+        uptime = time.monotonic() - self.started if self.started else 0.0
+        return {
+            "file": self.log_path,
+            "status": self.status if thread is None or not thread.is_alive() else thread.state,
+            "restarts": self.restarts,
+            "offset": thread.offset if thread is not None and thread.offset is not None else self.offset,
+            "uptime": round(uptime, 1),
+            "last_error": self.last_error,
+        }
+
+
+# ==========================
+#  SUPERVISOR
+# ==========================
+
+class Supervisor:
+    """Vigila los monitores y los reinicia cuando fallan.
+
+    Cada ``interval`` segundos comprueba por cada archivo:
+
+    * hilo terminado sin que se pidiera (excepcion en la lectura);
+    * monitor bloqueado: su latido no avanza en ``stall_after`` segundos;
+    * envio colgado: un sink no vuelve de un lote o un webhook lleva mas de
+      ``hang_after`` segundos con el mismo POST.
+
+    El monitor se sustituye por otro que sigue desde el ultimo offset
+    procesado. Con un envio colgado no se releen lineas: lo que el sink no
+    llego a enviar pasa a su spool y lo reenvia el sink nuevo. Va con espera
+    exponencial entre ``backoff_min`` y ``backoff_max`` que vuelve a cero
+    tras ``stable_after`` segundos sin fallos.
+    """
+
+    def __init__(self, interval=2.0, stall_after=60.0, hang_after=120.0, backoff_min=1.0, backoff_max=60.0,
+                 stable_after=60.0, notify=None):
+        self.interval = float(interval)
+        self.stall_after = float(stall_after)
+        self.hang_after = float(hang_after)
+        self.backoff_min = float(backoff_min)
+        self.backoff_max = float(backoff_max)
+        self.stable_after = float(stable_after)
+        self.notify = notify
+        self.monitors = []
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def wrap(self, launch):
+        # launch(entradas, stop_event, offset) -> hilo; devuelve la version supervisada
+        def supervised(entries, stop_event, start_offset=None):
+            return self.watch(launch, entries, stop_event, start_offset)
+        return supervised
+
+    def watch(self, launch, entries, stop_event, start_offset=None):
+        monitor = SupervisedMonitor(launch, entries, stop_event, start_offset)
+        monitor.start()
+        with self.lock:
+            self.monitors.append(monitor)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="supervisor", daemon=True)
+                self._thread.start()
+                DIAG.register("supervisor", self.stats)
+        return monitor
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                log.error(f"Supervisor: error en la comprobacion: {e}", exc_info=True)
+
+    def check(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            monitors = list(self.monitors)
+        for monitor in monitors:
+            if monitor.stop_event.is_set():
+                # Parada general o archivo retirado: no se reinicia
+                with self.lock:
+                    self.monitors.remove(monitor)
+                continue
+            thread = monitor.thread
+            if thread is None:
+                if now >= monitor.next_start:
+                    self._launch(monitor, now)
+                continue
+            if not thread.is_alive():
+                offset = thread.offset if thread.offset is not None else monitor.offset
+                self._fail(monitor, f"terminado: {thread.error or 'sin error'}", offset, now)
+                continue
+            if monitor.failures and now - monitor.started >= self.stable_after:
+                monitor.failures = 0
+            if now - thread.heartbeat > self.stall_after:
+                offset = thread.offset if thread.offset is not None else monitor.offset
+                self._fail(monitor, f"sin latido desde hace {now - thread.heartbeat:.0f}s", offset, now)
+                continue
+            hung = [sink for sink in thread.sinks if sink.stalled(self.hang_after, now)]
+            if hung:
+                # Un solo camino de recuperacion: lo pendiente de esos sinks va a su spool
+                # y el monitor sigue donde iba la lectura (releer duplicaria lo ya enviado)
+                for sink in hung:
+                    sink.abandon()
+                names = ", ".join(sink.name for sink in hung)
+                offset = thread.offset if thread.offset is not None else monitor.offset
+                self._fail(monitor, f"envio colgado en {names}", offset, now)
+
+    def _fail(self, monitor, reason, offset, now):
+        if monitor.stop is not None:
+            monitor.stop.set()
+        monitor.thread = None
+        monitor.offset = offset
+        monitor.failures += 1
+        delay = min(self.backoff_max, self.backoff_min * 2 ** (monitor.failures - 1))
+        monitor.next_start = now + delay
+        monitor.last_error = reason
+        monitor.status = f"reinicio en {delay:g}s"
+        self._alert(f"🔁 Monitor {monitor.log_path}: {reason}; se reinicia en {delay:g}s "
+                    f"desde el offset {offset}")
+
+    def _launch(self, monitor, now):
+        try:
+            monitor.start(now)
+            monitor.restarts += 1
+            monitor.status = "reiniciado"
+            log.info(f"Supervisor: monitor {monitor.log_path} reiniciado ({monitor.restarts} reinicios)")
+        except Exception as e:
+            self._fail(monitor, f"no se pudo reiniciar: {e}", monitor.offset, now)
+
+    def _alert(self, text):
+        log.warning(text)
+        if self.notify:
+            try:
+                self.notify(text)
+            except Exception as e:
+                log.error(f"Supervisor: error notificando: {e}", exc_info=True)
+
+    def status(self):
+        with self.lock:
+            return [monitor.describe() for monitor in self.monitors]
+
+    def stats(self):
+        monitors = self.status()
+        return {
+            "monitors": len(monitors),
+            "restarts": sum(m["restarts"] for m in monitors),
+            "files": monitors,
+        }
+
+    def close(self):
+        self._stop.set()
+        DIAG.unregister("supervisor")
+
+
+def supervisor_from_config(config, notify=None):
+    # [SUPERVISOR] enabled, interval, stall_after, hang_after, backoff_min, backoff_max, stable_after
+    if config is not None and config.get("SUPERVISOR", "enabled", "true").lower() != "true":
+        return None
+    get = (lambda key, default: config.get("SUPERVISOR", key, default)) if config is not None \
+        else (lambda key, default: default)
+    return Supervisor(
+        interval=get("interval", "2"),
+        stall_after=get("stall_after", "60"),
+        hang_after=get("hang_after", "120"),
+        backoff_min=get("backoff_min", "1"),
+        backoff_max=get("backoff_max", "60"),
+        stable_after=get("stable_after", "60"),
+        notify=notify,
+    )
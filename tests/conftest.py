@@ -0,0 +1,39 @@
+import os
+import sys
+import time
+
+import pytest
+
+# Los modulos del programa estan en la raiz del repositorio
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from discord_emulator import DiscordEmulator  # noqa: E402
+from pipeline import Event, EventType  # noqa: E402
+
+
+@pytest.fixture
+def discord():
+    # Webhooks de Discord en local, sin limite de tasa salvo que la prueba lo cambie
+    emulator = DiscordEmulator(limit=1000, window=1.0)
+    yield emulator
+    emulator.close()
+
+
+def make_event(type=EventType.JOIN, bot="bot", game="g", user="u", ip=None, offset=-1, message=None, ts=0.0):
+    ev = Event(type, bot=bot, source=bot, offset=offset, ts=ts)
+    ev.game = game
+    ev.user = user
+    ev.ip = ip
+    ev.message = message if message is not None else f"{user} -> {game}"
+    return ev
+
+
+def wait_for(predicate, timeout=5.0, interval=0.02):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(interval)
+    return predicate()
@@ -0,0 +1,95 @@
+import os
+import time
+
+from cluster import Checkpoint, ClusterNode, file_lease_key
+from conftest import wait_for
+
+
+class FakeMonitor:
+    def __init__(self, entries, stop, offset, checkpoint):
+        self.entries = entries
+        self.stop = stop
+        self.offset = offset
+        self.checkpoint = checkpoint
+
+    def is_alive(self):
+        return not self.stop.is_set()
+
+    def join(self, timeout=None):
+        pass
+
+
+def make_node(directory, name, files=4, lease=30.0):
+    node = ClusterNode(str(directory), node_id=name, lease_seconds=lease, heartbeat=0.05)
+    node.groups = {f"f{i}": [{"logfile": f"/logs/f{i}.log"}] for i in range(files)}
+    node.started = []
+
+    def start(entries, stop, offset, checkpoint):
+        node.started.append((entries[0]["logfile"], offset))
+        return FakeMonitor(entries, stop, offset, checkpoint)
+
+    node._start = start
+    return node
+
+
+def test_lease_is_exclusive_until_released(tmp_path):
+    a, b = make_node(tmp_path, "a"), make_node(tmp_path, "b")
+    token = a.acquire("f0")
+    assert token and b.acquire("f0") is None
+    assert a.renew("f0", token) and not b.renew("f0", "other")
+    a.release("f0", token)
+    assert b.acquire("f0")
+
+
+def test_expired_lease_is_taken_over_from_checkpoint(tmp_path):
+    a = make_node(tmp_path, "a", files=1, lease=0.2)
+    a.step()
+    assert list(a.owned) == ["f0"]
+    checkpoint = a.owned["f0"][3]
+    checkpoint.update(4096, force=True)
+    # El nodo "a" muere sin soltar el lease ni renovarlo
+    b = make_node(tmp_path, "b", files=1, lease=0.2)
+    b.step()
+    assert not b.owned
+    time.sleep(0.3)
+    b.step()
+    assert list(b.owned) == ["f0"] and b.started == [("/logs/f0.log", 4096)]
+    # El antiguo dueno ya no puede renovar: detiene su monitor sin soltar el lease ajeno
+    a.step()
+    assert not a.owned and a.started and b.renew("f0", b.owned["f0"][0])
+
+
+def test_files_are_shared_between_live_nodes(tmp_path):
+    a, b = make_node(tmp_path, "a"), make_node(tmp_path, "b")
+    a.step()
+    assert len(a.owned) == 4
+    b.beat()
+    for _ in range(4):
+        a.step()
+        assert wait_for(lambda: not a.draining)
+        b.step()
+    assert len(a.owned) == 2 and len(b.owned) == 2
+    assert set(a.owned).isdisjoint(b.owned)
+    a.close(1)
+    b.close(1)
+    assert not os.listdir(tmp_path / "leases")
+
+
+def test_checkpoint_saves_at_interval_and_on_force(tmp_path):
+    path = str(tmp_path / "cp.json")
+    checkpoint = Checkpoint(path, interval=60)
+    assert checkpoint.due()
+    checkpoint.update(10)
+    assert not checkpoint.due()
+    checkpoint.update(20)
+    assert Checkpoint(path).load() == 10
+    checkpoint.update(30, force=True)
+    assert Checkpoint(path).load() == 30
+
+
+def test_file_lease_key_is_stable_and_overridable():
+    entry = {"logfile": "/logs/a/bot.log"}
+    assert file_lease_key(entry) == file_lease_key(dict(entry))
+    assert file_lease_key(entry) != file_lease_key({"logfile": "/logs/b/bot.log"})
+    assert file_lease_key(entry).startswith("bot.log-")
+    assert file_lease_key(dict(entry, cluster_key="shared/bot")) == "shared_bot"
@@ -0,0 +1,75 @@
+import configparser
+
+from conftest import make_event
+from digest import STALE_AFTER, Digest
+from pipeline import EventType
+
+# Los instantes son time.monotonic(), nunca cero
+T = 1000.0
+
+
+class Watcher:
+    def __init__(self, **digest):
+        self.config = configparser.ConfigParser(interpolation=None)
+        self.config.read_dict({"DIGEST": digest})
+
+
+def make_digest(**digest):
+    digest.setdefault("events", "join, leave")
+    digest.setdefault("interval", "60")
+    return Digest("bot", "/logs/bot.log", Watcher(**digest))
+
+
+def test_join_and_leave_are_summarised_per_game():
+    digest = make_digest(messagedigest="{game}: {players} ({roster}) +{joined} -{left}")
+    for user in ("ana", "bea", "cris"):
+        assert digest.feed(make_event(EventType.JOIN, game="g1", user=user), now=T)
+    assert digest.feed(make_event(EventType.LEAVE, game="g1", user="bea"), now=T + 1)
+    assert digest.feed(make_event(EventType.JOIN, game="g2", user="dan"), now=T + 2)
+    assert digest.collect(now=T + 59) == []
+    events = digest.collect(now=T + 60)
+    assert [ev.text for ev in events] == ["g1: 2 (ana, cris) +3 -1"]
+    assert events[0].type == EventType.DIGEST and events[0].game == "g1"
+    # La lista de jugadores sigue; la ventana empieza de cero
+    digest.feed(make_event(EventType.LEAVE, game="g1", user="ana"), now=T + 70)
+    assert [ev.text for ev in digest.collect(now=T + 200)] == ["g1: 1 (cris) +0 -1", "g2: 1 (dan) +1 -0"]
+
+
+def test_settle_closes_quiet_windows_early():
+    digest = make_digest(settle="5")
+    digest.feed(make_event(EventType.JOIN, user="ana"), now=T)
+    digest.feed(make_event(EventType.JOIN, user="bea"), now=T + 3)
+    assert digest.collect(now=T + 7) == []
+    assert len(digest.collect(now=T + 8)) == 1
+
+
+def test_types_outside_the_digest_only_update_the_roster():
+    digest = make_digest(events="leave", messagedigest="{players}")
+    assert not digest.feed(make_event(EventType.JOIN, user="ana"), now=T)
+    assert not digest.feed(make_event(EventType.CHAT, user="ana"), now=T)
+    assert digest.feed(make_event(EventType.LEAVE, user="bob"), now=T + 1)
+    assert [ev.text for ev in digest.collect(now=T + 61)] == ["1"]
+
+
+def test_create_uses_its_own_template():
+    digest = make_digest(events="create, join", messagedigestcreate="new {game}: {roster}")
+    digest.feed(make_event(EventType.CREATE, game="g", user=None), now=T)
+    digest.feed(make_event(EventType.JOIN, game="g", user="ana"), now=T + 1)
+    assert [ev.text for ev in digest.collect(now=0, force=True)] == ["new g: ana"]
+
+
+def test_roster_without_changes_is_dropped_only_after_stale_period():
+    digest = make_digest(events="leave")
+    digest.feed(make_event(EventType.JOIN, user="ana"), now=T)
+    digest.feed(make_event(EventType.JOIN, user="bea"), now=T + STALE_AFTER - 10)
+    digest.collect(now=T + STALE_AFTER + 100)
+    assert "g" in digest.games
+    digest.collect(now=T + 2 * STALE_AFTER)
+    assert "g" not in digest.games
+
+
+def test_disabled_digest_marks_nothing():
+    digest = Digest("bot", "/logs/bot.log")
+    assert not digest.enabled
+    assert not digest.feed(make_event(EventType.JOIN), now=T)
+    assert digest.tick(now=T + 10) == []
@@ -0,0 +1,151 @@
+import json
+import socket
+
+import pytest
+
+from conftest import make_event, wait_for
+from engine import EngineClient, EngineServer, _Viewer, engine_client_from_config, engine_from_config, event_message
+from pipeline import EventType
+
+
+class Config:
+    # Misma firma que Config.get de main.py: get(section, key, fallback)
+    def __init__(self, **engine):
+        self.engine = engine
+
+    def get(self, section, key, fallback=None):
+        return self.engine.get(key, fallback) if section == "ENGINE" else fallback
+
+
+@pytest.fixture
+def server():
+    engine = EngineServer(port=0, history=10,
+                          commands={"status": lambda: {"bots": 2}, "reload": lambda: "ok", "stop": lambda: 1 / 0})
+    engine.start()
+    yield engine
+    engine.close()
+
+
+@pytest.fixture
+def clients():
+    started = []
+
+    def connect(port, token=""):
+        client = EngineClient(port=port, token=token).start()
+        started.append(client)
+        return client
+
+    yield connect
+    for client in started:
+        client.close()
+
+
+def collect(client, received, predicate, timeout=5.0):
+    # Acumula lo que llega por poll() hasta que se cumpla predicate
+    return wait_for(lambda: received.extend(client.poll()) or predicate(received), timeout)
+
+
+def test_event_message_for_events_and_text():
+    ev = make_event(EventType.JOIN, bot="b1", message="ana -> g1", ts=5.0)
+    assert event_message(ev) == {"t": "event", "bot": "b1", "type": "join", "text": "ana -> g1",
+                                 "alert": ev.alert, "ts": 5.0}
+    assert event_message("hola") == {"t": "log", "text": "hola"}
+
+
+def test_history_then_live_lines_in_order(server, clients):
+    server.put(make_event(offset=1, message="antes"))
+    server("estado")
+    client = clients(server.port)
+    received = []
+    assert collect(client, received, lambda r: any(m["t"] == "state" and m["connected"] for m in r))
+    assert wait_for(lambda: len(server.viewers) == 1)
+    server.put(make_event(offset=2, message="despues"))
+    assert collect(client, received, lambda r: any(m.get("text") == "despues" for m in r))
+    texts = [m["text"] for m in received if m["t"] in ("event", "log")]
+    assert texts == ["antes", "estado", "despues"]
+    assert server.stats()["published"] == 2 and server.stats()["viewers"] == 1
+
+
+def test_commands_reply_to_their_callback(server, clients):
+    client = clients(server.port)
+    assert wait_for(lambda: client.connected)
+    replies = {}
+    for cmd in ("status", "reload", "stop", "nada"):
+        assert client.request(cmd, callback=lambda m, cmd=cmd: replies.__setitem__(cmd, m))
+    assert wait_for(lambda: client.poll() is not None and len(replies) == 4)
+    assert replies["status"]["ok"] and replies["status"]["data"]["bots"] == 2
+    assert replies["status"]["data"]["viewers"] == 1
+    assert replies["reload"] == {"t": "reply", "id": 2, "ok": True, "data": "ok"}
+    assert not replies["stop"]["ok"] and "division" in replies["stop"]["error"]
+    assert replies["nada"]["error"] == "comando desconocido: nada"
+
+
+def test_request_without_connection_fails_through_callback():
+    client = EngineClient(port=1)
+    replies = []
+    assert not client.request("status", callback=replies.append)
+    assert replies and not replies[0]["ok"] and not client.callbacks
+
+
+def test_token_is_required_when_configured(clients):
+    engine = EngineServer(port=0, token="secreto")
+    engine.start()
+    try:
+        rejected = clients(engine.port, token="otro")
+        received = []
+        assert collect(rejected, received, lambda r: any(m["t"] == "error" for m in r))
+        assert not rejected.connected and not engine.viewers
+        accepted = clients(engine.port, token="secreto")
+        assert wait_for(lambda: accepted.connected)
+        assert wait_for(lambda: len(engine.viewers) == 1)
+    finally:
+        engine.close()
+
+
+def test_invalid_lines_are_ignored(server):
+    with socket.create_connection(("127.0.0.1", server.port), timeout=5) as sock:
+        rfile = sock.makefile("rb")
+        assert json.loads(rfile.readline())["t"] == "hello"
+        sock.sendall(b"no es json\n[1, 2]\n" + json.dumps({"id": 7, "cmd": "status"}).encode() + b"\n")
+        reply = json.loads(rfile.readline())
+        assert reply["t"] == "reply" and reply["id"] == 7 and reply["ok"]
+
+
+def test_slow_viewer_only_loses_its_own_lines():
+    viewer = _Viewer(sock=None, address=("127.0.0.1", 0), size=100)
+    for i in range(150):
+        viewer.push(f"linea {i}")
+    assert viewer.dropped == 50
+    assert list(viewer.pending)[0] == "linea 50"
+
+
+def test_client_reports_engine_unavailable(clients):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    client = clients(port)
+    received = []
+    assert collect(client, received, lambda r: any(m["t"] == "state" for m in r))
+    assert not received[0]["connected"] and "no disponible" in received[0]["text"]
+
+
+def test_client_reports_lost_connection(clients):
+    engine = EngineServer(port=0)
+    engine.start()
+    client = clients(engine.port)
+    assert wait_for(lambda: client.connected)
+    engine.close()
+    received = []
+    assert collect(client, received, lambda r: any(m.get("text") == "Conexion con el motor perdida" for m in r))
+    assert not client.connected
+
+
+def test_from_config():
+    assert engine_from_config(None) is None
+    assert engine_from_config(Config(port="0")) is None
+    engine = engine_from_config(Config(port="9000", token="t", history="5"))
+    assert (engine.port, engine.token, engine.history.maxlen) == (9000, "t", 5)
+    assert engine_client_from_config(Config(port="9000")) is None
+    assert engine_client_from_config(Config(attach="true")) is None
+    client = engine_client_from_config(Config(attach="true", port="9000"))
+    assert client.address == "127.0.0.1:9000"
@@ -0,0 +1,83 @@
+import json
+import os
+
+import pytest
+
+from entries import (entry_label, export_entries, import_entries, load_entries, parse_webhook, save_entries,
+                     validate_entry)
+
+HOOK = "https://discord.com/api/webhooks/1/a"
+HOOK2 = "https://discord.com/api/webhooks/2/b"
+
+
+@pytest.mark.parametrize("entry,problem", [
+    ({"logfile": "bot.log", "webhook": HOOK}, None),
+    ({"ingest": "d2n", "sinks": [{"type": "stdout"}]}, None),
+    ({"webhook": HOOK}, "falta logfile (o ingest)"),
+    ({"logfile": "bot.log"}, "sin webhook ni sinks"),
+    ({"logfile": "bot.log", "webhook": "ftp://x"}, "webhook no valido: ftp://x"),
+    ({"logfile": "bot.log", "sinks": [{"type": "fax"}]}, "sink desconocido: fax"),
+    ({"logfile": 3, "webhook": HOOK}, "logfile debe ser texto"),
+    ("texto", "no es un objeto"),
+])
+def test_validate_entry(entry, problem):
+    assert validate_entry(entry) == ([problem] if problem else [])
+
+
+def test_labels_and_webhook_lists():
+    assert entry_label({"logfile": "a.log"}) == "a.log"
+    assert entry_label({"ingest": ["D2N", "10.0.0.1"]}) == "ingest: d2n, 10.0.0.1"
+    assert parse_webhook(f"{HOOK}, {HOOK2}") == [HOOK, HOOK2]
+    assert parse_webhook(f" {HOOK} ") == HOOK and parse_webhook("") == ""
+
+
+def test_save_is_atomic_and_load_checks_shape(tmp_path):
+    path = str(tmp_path / "cfg" / "settings.json")
+    data = [{"logfile": "ñ.log", "webhook": HOOK}]
+    save_entries(path, data)
+    assert load_entries(path) == data
+    assert os.listdir(tmp_path / "cfg") == ["settings.json"]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"logfile": "a.log"}, f)
+    with pytest.raises(ValueError):
+        load_entries(path)
+
+
+def test_import_csv_skips_invalid_and_duplicate_rows(tmp_path):
+    path = tmp_path / "in.csv"
+    path.write_text("LogFile;Webhook;Ingest\n"
+                    f"a.log;{HOOK} {HOOK2};\n"
+                    f"b.log;{HOOK};\n"
+                    ";;\n"
+                    f"a.log;{HOOK},{HOOK2};\n"
+                    f";{HOOK};d2n, 10.0.0.1\n", encoding="utf-8")
+    existing = [{"logfile": "b.log", "webhook": HOOK}]
+    entries, errors = import_entries(str(path), existing)
+    assert entries == [{"logfile": "a.log", "webhook": [HOOK, HOOK2]},
+                       {"webhook": HOOK, "ingest": ["d2n", "10.0.0.1"]}]
+    assert errors == ["fila 4: falta logfile (o ingest); sin webhook ni sinks", "2 entradas repetidas omitidas"]
+
+
+def test_import_json_and_missing_header(tmp_path):
+    path = tmp_path / "in.json"
+    path.write_text(json.dumps({"monitors": [{"logfile": "a.log", "webhook": HOOK}, {"logfile": "x"}]}),
+                    encoding="utf-8")
+    entries, errors = import_entries(str(path))
+    assert entries == [{"logfile": "a.log", "webhook": HOOK}] and errors[0].startswith("fila 2:")
+    bad = tmp_path / "bad.csv"
+    bad.write_text("a,b\n1,2\n", encoding="utf-8")
+    assert import_entries(str(bad))[0] == [] and "falta la cabecera" in import_entries(str(bad))[1][0]
+
+
+def test_export_round_trip(tmp_path):
+    data = [{"logfile": "a.log", "webhook": [HOOK, HOOK2], "bot": "A"},
+            {"ingest": ["d2n"], "webhook": HOOK, "sinks": [{"type": "stdout"}]}]
+    csv_path = str(tmp_path / "out.csv")
+    assert export_entries(csv_path, data) == 2
+    entries, errors = import_entries(csv_path)
+    assert errors == []
+    assert entries == [{"logfile": "a.log", "webhook": [HOOK, HOOK2], "bot": "A"},
+                       {"webhook": HOOK, "ingest": ["d2n"]}]
+    json_path = str(tmp_path / "out.json")
+    export_entries(json_path, data)
+    assert load_entries(json_path) == data
@@ -0,0 +1,91 @@
+import pytest
+
+from conftest import make_event, wait_for
+from feed import MergedFeed
+from pipeline import EventType
+from sinks import Sink
+
+
+class ListSink(Sink):
+    kind = "list"
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("flush_interval", 0.02)
+        super().__init__(**kwargs)
+        self.events = []
+
+    def write_batch(self, events):
+        self.events.extend(events)
+
+
+def line(source, ts, type=EventType.JOIN, user=None):
+    ev = make_event(type, bot=source, user=user or f"{source}@{ts}", ts=ts)
+    ev.line_ts = ts
+    return ev
+
+
+@pytest.fixture
+def feed():
+    merged = MergedFeed(ListSink(), window=30.0).start()
+    yield merged
+    merged.close(2)
+
+
+def users(feed):
+    return [ev.user for ev in feed.sink.events]
+
+
+def test_merges_sources_in_timestamp_order(feed):
+    for ts in (1, 4, 6):
+        feed.put(line("a", ts))
+    for ts in (2, 3, 5):
+        feed.put(line("b", ts))
+    feed.close(2)
+    assert [ev.line_ts for ev in feed.sink.events] == [1, 2, 3, 4, 5, 6]
+    assert feed.stats()["late"] == 0
+
+
+def test_head_waits_until_every_active_source_has_an_event(feed):
+    feed.attach("b")
+    feed.put(line("a", 1))
+    feed.put(line("a", 2))
+    assert not wait_for(lambda: feed.sink.events, timeout=0.2)
+    feed.put(line("b", 1.5))
+    assert wait_for(lambda: users(feed) == ["a@1", "b@1.5"])
+    # Un archivo que deja de producir no frena la mezcla
+    feed.detach("b")
+    assert wait_for(lambda: users(feed) == ["a@1", "b@1.5", "a@2"])
+
+
+def test_window_releases_events_from_a_silent_peer():
+    feed = MergedFeed(ListSink(), window=0.1).start()
+    feed.attach("quiet")
+    feed.put(line("a", 1))
+    assert wait_for(lambda: users(feed) == ["a@1"], timeout=2)
+    feed.close(1)
+
+
+def test_filters_types_and_prefixes_a_copy(feed):
+    original = line("a", 1)
+    assert feed.put(original)
+    assert not feed.put(line("a", 2, type=EventType.LEAVE))
+    feed.close(2)
+    assert [ev.message for ev in feed.sink.events] == [f"[a] {original.message}"]
+    assert original.message == "a@1 -> g"
+
+
+def test_clock_going_back_keeps_read_order(feed):
+    for ts, user in ((5, "first"), (3, "second"), (6, "third")):
+        feed.put(line("a", ts, user=user))
+    feed.close(2)
+    assert users(feed) == ["first", "second", "third"]
+
+
+def test_per_source_limit_forces_output():
+    feed = MergedFeed(ListSink(), window=30.0, per_source=2).start()
+    feed.attach("b")
+    for ts in range(5):
+        feed.put(line("a", ts))
+    assert feed.stats()["forced"] == 2
+    assert wait_for(lambda: users(feed) == ["a@0", "a@1"])
+    feed.close(1)
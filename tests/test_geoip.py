@@ -0,0 +1,58 @@
+from conftest import make_event, wait_for
+from geoip import GeoIP, RangeDatabase, ip_to_int
+
+CSV = """start,end,country,asn
+1.0.0.0,1.0.0.255,AU,AS13335
+3232235520,3232301055,ZZ,
+"""
+
+CIDR_CSV = """network,country,asn
+8.8.8.0/24,US,AS15169
+10.0.0.0/8,,
+"""
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_ip_to_int_rejects_garbage():
+    assert ip_to_int("1.2.3.4") == 0x01020304
+    assert ip_to_int(" 10.0.0.1 ") == 0x0A000001
+    assert ip_to_int("300.1.1.1") is None and ip_to_int("::1") is None and ip_to_int(None) is None
+
+
+def test_ranges_from_text_and_integer_bounds(tmp_path):
+    db = RangeDatabase.from_csv(write(tmp_path, "geo.csv", CSV))
+    assert len(db) == 2
+    assert db.lookup("1.0.0.7") == ("AU", "AS13335")
+    assert db.lookup("192.168.100.1") == ("ZZ", "")
+    assert db.lookup("1.0.1.0") is None and db.lookup("0.255.255.255") is None
+
+
+def test_ranges_from_cidr(tmp_path):
+    db = RangeDatabase.from_csv(write(tmp_path, "geo.csv", CIDR_CSV))
+    assert db.lookup("8.8.8.8") == ("US", "AS15169")
+    assert db.lookup("10.200.0.1") == ("", "")
+    assert db.lookup("8.8.9.1") is None
+
+
+def test_enricher_fills_country_and_unknown(tmp_path):
+    geo = GeoIP(write(tmp_path, "geo.csv", CIDR_CSV))
+    assert wait_for(lambda: geo.db is not None)
+    known, private, missing = (make_event(ip=ip) for ip in ("8.8.8.8", "10.1.1.1", "9.9.9.9"))
+    for ev in (known, private, missing):
+        geo(ev)
+    assert (known.country, known.asn) == ("US", "AS15169")
+    assert (private.country, private.asn) == ("??", "??")
+    assert (missing.country, missing.asn) == ("??", "??")
+    geo(make_event(ip="8.8.8.8"))
+    assert geo.lookup.cache_info().hits == 1
+
+
+def test_events_pass_untouched_until_loaded(tmp_path):
+    geo = GeoIP(str(tmp_path / "missing.csv"))
+    ev = geo(make_event(ip="8.8.8.8"))
+    assert ev.country is None and ev.asn is None
@@ -0,0 +1,103 @@
+import socket
+
+import pytest
+
+from conftest import wait_for
+from ingest import MAX_LINE_BYTES, IngestListener, _Client, ingest_entries, ingest_keys, parse_syslog
+from supervisor import StopSignal
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("<34>1 2024-01-01T00:00:00Z host1 d2nbot 42 - - [Lobby] hola", ("host1", "d2nbot", "[Lobby] hola")),
+    ("<34>1 - - - - - [meta a=\"b\"] ﻿msg", (None, None, "msg")),
+    ("<13>Jan  5 10:00:00 host2 ghost[123]: linea", ("host2", "ghost", "linea")),
+    ("<13>ghost: linea", (None, "ghost", "linea")),
+    ("sin cabecera", (None, None, "sin cabecera")),
+])
+def test_parse_syslog(text, expected):
+    assert parse_syslog(text) == expected
+
+
+def feed(client, *chunks, final=False):
+    frames = []
+    for chunk in chunks:
+        client.buffer += chunk
+        frames += client.frames()
+    if final:
+        frames += client.frames(final=True)
+    return frames
+
+
+def test_newline_and_octet_counted_frames():
+    client = _Client(None, "ip", True)
+    assert feed(client, b"uno\n5 dos\n", b"x3 ab", b"c4 ", b"def", b"g") == [b"uno", b"dos\nx", b"abc", b"defg"]
+    assert client.buffer == b""
+
+
+def test_raw_clients_do_not_parse_lengths():
+    client = _Client(None, "ip", False)
+    assert feed(client, b"5 dos\nresto", final=True) == [b"5 dos", b"resto"]
+
+
+def test_oversized_octet_frame_is_skipped_across_reads():
+    client = _Client(None, "ip", True)
+    big = b"x" * (MAX_LINE_BYTES + 10)
+    data = f"{len(big)} ".encode() + big + b"4 next"
+    chunks = [data[i:i + 4096] for i in range(0, len(data), 4096)]
+    assert feed(client, *chunks) == [None, b"next"]
+
+
+def test_oversized_line_is_skipped_until_newline():
+    client = _Client(None, "ip", False)
+    data = b"a" * (MAX_LINE_BYTES + 5000) + b"\nsiguiente\n"
+    chunks = [data[i:i + 4096] for i in range(0, len(data), 4096)]
+    assert feed(client, *chunks) == [None, b"siguiente"]
+
+
+def test_ingest_keys_and_entries():
+    assert ingest_keys({"ingest": "D2NBot, 10.0.0.5"}) == ["d2nbot", "10.0.0.5"]
+    assert ingest_keys({"ingest": ["a", " "]}) == ["a"]
+    data = [{"ingest": "a", "webhook": "x"}, {"ingest": "b"}, {"logfile": "c.log", "webhook": "x"}]
+    assert ingest_entries(data) == data[:1]
+
+
+def free_port(kind):
+    with socket.socket(socket.AF_INET, kind) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def listener(tmp_path):
+    entries = [{"bot": "d2n", "ingest": "d2nbot, 127.0.0.9",
+                "sinks": [{"type": "jsonl", "path": str(tmp_path / "d2n.jsonl")}]},
+               {"bot": "other", "ingest": "*", "sinks": [{"type": "jsonl", "path": str(tmp_path / "o.jsonl")}]}]
+    stop = StopSignal()
+    thread = IngestListener(entries, stop, udp_port=free_port(socket.SOCK_DGRAM),
+                            tcp_port=free_port(socket.SOCK_STREAM))
+    thread.lines = {}
+    for channel in thread.channels:
+        channel.process = lambda line, bot=channel.bot: thread.lines.setdefault(bot, []).append(line)
+    yield thread
+    stop.stop(1)
+    if thread.is_alive():
+        thread.join(5)
+
+
+def test_routes_by_tag_host_ip_and_wildcard(listener):
+    listener.handle(b"<13>host ghost: por defecto", "1.1.1.1")
+    listener.handle(b"<13>1 - host D2NBOT - - - por tag", "1.1.1.1")
+    listener.handle(b"linea\r\nsin cabecera\n", "127.0.0.9", syslog=False)
+    assert listener.lines == {"other": ["por defecto"], "d2n": ["por tag", "linea", "sin cabecera"]}
+
+
+def test_udp_and_tcp_end_to_end(listener):
+    listener.start()
+    assert wait_for(lambda: listener.state == "escuchando")
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp:
+        udp.sendto(b"<13>d2nbot: por udp", ("127.0.0.1", listener.ports["udp"]))
+    with socket.create_connection(("127.0.0.1", listener.ports["tcp"])) as tcp:
+        tcp.sendall(b"<13>d2nbot: uno\n15 <13>d2nbot: dos")
+    assert wait_for(lambda: len(listener.lines.get("d2n", [])) == 3)
+    assert sorted(listener.lines["d2n"]) == ["dos", "por udp", "uno"]
+    assert listener.stats()["connections"] == 1
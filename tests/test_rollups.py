@@ -0,0 +1,80 @@
+import os
+
+from conftest import make_event
+from pipeline import EventType
+from rollups import Rollup, open_rollup, rollup_path
+
+# Inicio de un dia (UTC), para que minuto, hora y dia empiecen a la vez
+DAY = 1_700_006_400
+
+
+def fill(rollup):
+    rollup.add_event(make_event(EventType.CREATE, ts=DAY))
+    for i in range(3):
+        rollup.add_event(make_event(EventType.JOIN, user=f"u{i}", ip=f"10.0.0.{i}", ts=DAY + 10))
+    rollup.add_event(make_event(EventType.LEAVE, ts=DAY + 70))
+    chat = make_event(EventType.CHAT, ts=DAY + 70)
+    chat.channel = "Allies"
+    rollup.add_event(chat)
+
+
+def test_counts_per_level():
+    rollup = Rollup("bot")
+    fill(rollup)
+    assert rollup.get("minute", "joins", DAY) == 3
+    assert rollup.get("minute", "leaves", DAY) == 0
+    assert rollup.get("minute", "leaves", DAY + 60) == 1
+    assert rollup.get("hour", "games_created", DAY) == 1
+    assert rollup.get("day", "chat_allies", DAY) == 1
+    assert rollup.get("day", "players_peak", DAY) == 3
+    assert rollup.get("day", "unique_ips", DAY) == 3
+
+
+def test_series_and_recycled_buckets():
+    rollup = Rollup("bot")
+    fill(rollup)
+    assert rollup.series("minute", "joins", DAY, DAY + 120) == [(DAY, 3), (DAY + 60, 0), (DAY + 120, 0)]
+    # Dos dias despues el anillo de minutos reutiliza la misma posicion
+    later = DAY + 2 * 24 * 3600
+    rollup.add_event(make_event(EventType.JOIN, ts=later))
+    assert rollup.get("minute", "joins", later) == 1
+    assert rollup.get("minute", "joins", DAY) == 0
+    assert rollup.get("day", "joins", DAY) == 3
+
+
+def test_unique_ips_estimate_is_close():
+    rollup = Rollup("bot")
+    for i in range(2000):
+        rollup.add_event(make_event(EventType.JOIN, ip=f"10.{i // 256}.{i % 256}.1", ts=DAY))
+        rollup.add_event(make_event(EventType.LEAVE, ts=DAY))
+    assert abs(rollup.get("day", "unique_ips", DAY) - 2000) < 2000 * 0.2
+
+
+def test_save_and_load_round_trip(tmp_path):
+    rollup = Rollup("bot")
+    fill(rollup)
+    path = str(tmp_path / "bot.rollup")
+    rollup.save(path)
+    loaded = Rollup.load(path)
+    for level, metric in (("minute", "joins"), ("hour", "unique_ips"), ("day", "chat_allies")):
+        assert loaded.get(level, metric, DAY) == rollup.get(level, metric, DAY)
+
+
+def test_path_depends_on_full_log_path(tmp_path):
+    a = rollup_path(str(tmp_path), "bot", "/logs/a/bot.log")
+    assert a != rollup_path(str(tmp_path), "bot", "/logs/b/bot.log")
+    assert os.path.basename(a).startswith("bot-") and a.endswith(".rollup")
+
+
+def test_legacy_file_is_migrated_into_one_store(tmp_path):
+    directory = str(tmp_path)
+    legacy = Rollup("bot")
+    fill(legacy)
+    legacy.save(rollup_path(directory, "bot"))
+    first = open_rollup(directory, "bot", "/logs/a/bot.log")
+    second = open_rollup(directory, "bot", "/logs/b/bot.log")
+    assert first.get("day", "joins", DAY) == 3
+    assert second.get("day", "joins", DAY) == 0
+    assert os.path.exists(rollup_path(directory, "bot") + ".migrated")
+    assert not os.path.exists(rollup_path(directory, "bot"))
+    assert Rollup.load(rollup_path(directory, "bot", "/logs/a/bot.log")).get("day", "joins", DAY) == 3
@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+
+import pytest
+
+from conftest import make_event, wait_for
+from sinks import CallbackSink, JsonlSink, Sink, WebhookSink, build_sinks, sink_name
+
+
+class RecordingSink(Sink):
+    kind = "recording"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def write_batch(self, events):
+        self.release.wait(5)
+        self.batches.append([ev.offset for ev in events])
+
+
+def test_batches_by_size_and_keeps_order():
+    sink = RecordingSink(batch_size=3, flush_interval=10)
+    for i in range(7):
+        sink.put(make_event(offset=i))
+    sink.start().close(5)
+    assert [o for batch in sink.batches for o in batch] == list(range(7))
+    assert sink.batches[:2] == [[0, 1, 2], [3, 4, 5]]
+    assert sink.sent == 7 and sink.lost == 0
+
+
+def test_flush_interval_sends_partial_batch():
+    sink = RecordingSink(batch_size=100, flush_interval=0.1).start()
+    sink.put(make_event(offset=1))
+    assert wait_for(lambda: sink.batches == [[1]])
+    sink.close(1)
+
+
+def test_full_queue_drops_without_blocking():
+    sink = RecordingSink(queue_size=2)
+    assert sink.put(make_event()) and sink.put(make_event())
+    assert not sink.put(make_event())
+    assert sink.dropped == 1
+
+
+def test_abandon_counts_only_removed_events():
+    sink = RecordingSink(batch_size=1, flush_interval=0.05).start()
+    sink.release.clear()
+    sink.put(make_event(offset=10))
+    assert wait_for(lambda: sink._inflight == 10)
+    for i in range(11, 14):
+        sink.put(make_event(offset=i))
+    sink.abandon()
+    sink.release.set()
+    sink._thread.join(2)
+    # El lote en curso sale; lo que estaba en cola se pierde y ya no se escribe
+    assert sink.batches == [[10]]
+    assert sink.lost == 3 and sink.lost_offset == 11
+
+
+def test_pending_offset_covers_queue():
+    sink = RecordingSink()
+    for i in (5, 3, 8):
+        sink.put(make_event(offset=i))
+    assert sink.pending_offset() == 3
+
+
+def test_jsonl_sink_rotates(tmp_path):
+    path = str(tmp_path / "ev.jsonl")
+    sink = JsonlSink(path, max_bytes=200, backups=2, batch_size=1).start()
+    for i in range(20):
+        sink.put(make_event(user=f"user{i}"))
+    sink.close(5)
+    assert os.path.exists(path + ".1") and not os.path.exists(path + ".3")
+    with open(path + ".1", encoding="utf-8") as f:
+        assert json.loads(f.readline())["type"] == "join"
+
+
+def test_callback_sink_calls_once_per_batch():
+    calls = []
+    sink = CallbackSink(calls.append, batch_size=10, flush_interval=10)
+    for i in range(3):
+        sink.put(make_event(message=f"m{i}"))
+    sink.start().close(5)
+    assert calls == ["[bot] m0\n[bot] m1\n[bot] m2"]
+
+
+def test_sink_name_depends_on_origin_and_destination():
+    a = sink_name("bot", "webhook", "/logs/a/bot.log", "url")
+    assert a == sink_name("bot", "webhook", "/logs/a/bot.log", "url")
+    assert a.startswith("bot-webhook-") and len(a) == len("bot-webhook-") + 8
+    assert a != sink_name("bot", "webhook", "/logs/b/bot.log", "url")
+    assert a != sink_name("bot", "webhook", "/logs/a/bot.log", "url2")
+
+
+def test_build_sinks_rejects_duplicates(tmp_path):
+    entry = {"logfile": str(tmp_path / "bot.log"),
+             "sinks": [{"type": "jsonl", "path": str(tmp_path / "a.jsonl")},
+                       {"type": "jsonl", "path": str(tmp_path / "a.jsonl")},
+                       {"type": "jsonl", "path": str(tmp_path / "b.jsonl")}]}
+    taken = set()
+    sinks = build_sinks(entry, taken=taken)
+    assert [s.path for s in sinks] == [str(tmp_path / "a.jsonl"), str(tmp_path / "b.jsonl")]
+    assert len({s.name for s in sinks}) == 2 and taken == {s.name for s in sinks}
+    # Otra entrada del mismo archivo con el mismo destino tampoco lo comparte
+    assert build_sinks(dict(entry, sinks=entry["sinks"][:1]), taken=taken) == []
+
+
+@pytest.mark.parametrize("coalesce,posts", [(False, 3), (True, 1)])
+def test_webhook_sink_delivers(discord, tmp_path, coalesce, posts):
+    sink = WebhookSink(discord.url(), coalesce=coalesce, spool=str(tmp_path / "spool.jsonl"),
+                       name="bot-webhook-test", flush_interval=10)
+    for i in range(3):
+        sink.put(make_event(message=f"m{i}"))
+    sink.start().close(5)
+    delivered = discord.delivered()
+    assert len(delivered) == posts
+    assert "\n".join(p["content"] for p in delivered) == "m0\nm1\nm2"
+    assert all(p["allowed_mentions"] == {"parse": []} for p in delivered)
@@ -0,0 +1,130 @@
+import time
+
+import pytest
+
+from supervisor import LinkedStop, StopSignal, Supervisor
+
+
+class FakeRun:
+    """Ejecucion de un monitor: lo que el supervisor mira de MonitorThread."""
+
+    def __init__(self, entries, stop, offset):
+        self.log_path = entries[0]["logfile"]
+        self.stop = stop
+        self.start_offset = offset
+        self.offset = offset
+        self.heartbeat = time.monotonic()
+        self.sinks = []
+        self.error = None
+        self.state = "leyendo"
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+    def join(self, timeout=None):
+        pass
+
+
+class FakeSink:
+    def __init__(self, name, hung=False):
+        self.name = name
+        self.hung = hung
+        self.abandoned = False
+
+    def stalled(self, limit, now=None):
+        return self.hung
+
+    def abandon(self):
+        self.abandoned = True
+
+
+@pytest.fixture
+def supervisor():
+    alerts = []
+    sup = Supervisor(interval=3600, stall_after=60, hang_after=120, backoff_min=1, backoff_max=8,
+                     stable_after=60, notify=alerts.append)
+    sup.alerts = alerts
+    yield sup
+    sup.close()
+
+
+def watch(supervisor, offset=None):
+    runs = []
+
+    def launch(entries, stop, start_offset):
+        runs.append(FakeRun(entries, stop, start_offset))
+        return runs[-1]
+
+    monitor = supervisor.watch(launch, [{"logfile": "/logs/bot.log"}], StopSignal(), offset)
+    return monitor, runs
+
+
+def test_dead_monitor_restarts_from_its_offset(supervisor):
+    monitor, runs = watch(supervisor)
+    runs[0].offset = 1234
+    runs[0].alive = False
+    runs[0].error = "boom"
+    now = time.monotonic()
+    supervisor.check(now)
+    assert runs[0].stop.is_set() and monitor.thread is None
+    assert "boom" in supervisor.alerts[-1]
+    supervisor.check(now + 0.5)
+    assert len(runs) == 1
+    supervisor.check(now + 1)
+    assert len(runs) == 2 and runs[1].start_offset == 1234
+    assert supervisor.stats()["restarts"] == 1
+
+
+def test_backoff_doubles_and_resets_when_stable(supervisor):
+    monitor, runs = watch(supervisor)
+    now = time.monotonic()
+    delays = []
+    for _ in range(5):
+        runs[-1].alive = False
+        supervisor.check(now)
+        delays.append(monitor.next_start - now)
+        now = monitor.next_start
+        supervisor.check(now)
+    assert delays == [1, 2, 4, 8, 8]
+    runs[-1].heartbeat = now + 60
+    supervisor.check(now + 60)
+    assert monitor.failures == 0
+
+
+def test_stalled_heartbeat_restarts(supervisor):
+    monitor, runs = watch(supervisor, offset=10)
+    runs[0].offset = 50
+    supervisor.check(runs[0].heartbeat + 61)
+    assert runs[0].stop.is_set() and monitor.offset == 50
+    assert "sin latido" in monitor.last_error
+
+
+def test_hung_sink_is_abandoned_and_reading_continues(supervisor):
+    monitor, runs = watch(supervisor)
+    ok, hung = FakeSink("bot-jsonl-1"), FakeSink("bot-webhook-2", hung=True)
+    runs[0].sinks = [ok, hung]
+    runs[0].offset = 777
+    supervisor.check(time.monotonic())
+    assert hung.abandoned and not ok.abandoned
+    assert monitor.offset == 777 and "bot-webhook-2" in monitor.last_error
+
+
+def test_stopped_monitor_is_not_restarted(supervisor):
+    monitor, runs = watch(supervisor)
+    monitor.stop_event.stop(1)
+    runs[0].alive = False
+    supervisor.check(time.monotonic() + 100)
+    assert len(runs) == 1 and supervisor.stats()["monitors"] == 0
+    assert not monitor.is_alive()
+
+
+def test_linked_stop_follows_parent():
+    parent = StopSignal()
+    child = LinkedStop(parent)
+    assert not child.is_set()
+    parent.stop(3)
+    assert child.is_set() and child.deadline == parent.deadline
+    other = LinkedStop(StopSignal())
+    other.set()
+    assert other.wait(0) and not other.parent.is_set()
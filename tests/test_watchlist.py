@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from conftest import make_event, wait_for
+from pipeline import EventType
+from watchlist import CidrTrie, NameIndex, Watchlist, load_ranges
+
+
+def test_cidr_trie_returns_most_specific_range(tmp_path):
+    path = tmp_path / "ranges.txt"
+    path.write_text("# proxies\n10.0.0.0/8 # red interna\n10.1.0.0/16 # vpn\n8.8.8.8\nbogus/24\n",
+                    encoding="utf-8")
+    trie = load_ranges(str(path))
+    assert len(trie) == 3
+    assert trie.lookup("10.1.2.3") == "vpn"
+    assert trie.lookup("10.2.0.1") == "red interna"
+    assert trie.lookup("8.8.8.8") == "8.8.8.8"
+    assert trie.lookup("8.8.8.9") is None and trie.lookup("not an ip") is None
+
+
+def test_cidr_trie_default_route():
+    trie = CidrTrie()
+    trie.insert(0, 0, "todo")
+    assert trie.lookup("203.0.113.9") == "todo"
+
+
+@pytest.mark.parametrize("name,reason", [
+    ("Griefer", "exact"),
+    ("smurfBOT", "suffix"),
+    ("clan_x", "prefix"),
+    ("a1c", "general"),
+    ("nobody", None),
+])
+def test_name_index_kinds(name, reason):
+    index = NameIndex()
+    index.add("griefer", "exact")
+    index.add("clan_*", "prefix")
+    index.add("*bot", "suffix")
+    index.add("a?c", "general")
+    assert index.lookup(name) == reason
+    assert len(index) == 4
+
+
+def test_name_index_many_suffixes_stay_out_of_the_regex():
+    index = NameIndex()
+    for i in range(5000):
+        index.add(f"*tag{i}", i)
+    assert index.patterns == [] and index.lookup("playertag4999") == 4999
+
+
+def test_watchlist_alerts_through_its_webhook(discord, tmp_path):
+    names = tmp_path / "names.txt"
+    names.write_text("griefer # baneado\n", encoding="utf-8")
+    ranges = tmp_path / "ranges.txt"
+    ranges.write_text("203.0.113.0/24 # proxy\n", encoding="utf-8")
+    watch = Watchlist(str(names), str(ranges), webhook=discord.url(), mention="<@&1>")
+    try:
+        by_name = watch(make_event(EventType.JOIN, user="Griefer", ip="1.1.1.1"))
+        by_ip = watch(make_event(EventType.JOIN, user="ana", ip="203.0.113.5"))
+        clean = watch(make_event(EventType.JOIN, user="bea", ip="1.1.1.1"))
+        chat = watch(make_event(EventType.CHAT, user="griefer"))
+        assert by_name.alert == "nombre Griefer (baneado)" and by_ip.alert == "IP 203.0.113.5 (proxy)"
+        assert clean.alert is None and chat.alert is None
+        assert wait_for(lambda: len(discord.delivered()) == 2)
+        first = discord.delivered()[0]
+        assert first["content"].startswith("<@&1> 🚨 Watchlist") and first["allowed_mentions"]["parse"]
+    finally:
+        watch.close(2)
+
+
+def test_watchlist_reloads_changed_files(tmp_path):
+    names = tmp_path / "names.txt"
+    names.write_text("old\n", encoding="utf-8")
+    watch = Watchlist(str(names))
+    try:
+        assert watch.check("old", None)
+        names.write_text("new\n", encoding="utf-8")
+        os.utime(names, (1, 1))
+        watch.reload()
+        assert watch.check("new", None) and not watch.check("old", None)
+    finally:
+        watch.close()
@@ -0,0 +1,139 @@
+import json
+import time
+
+import webhooks
+from conftest import wait_for
+from webhooks import CircuitBreaker, RateLimitBucket, Spool, WebhookPool, pack_embeds
+
+
+def payload(text):
+    return {"content": text, "allowed_mentions": {"parse": []}}
+
+
+def contents(emulator, webhook_id=None):
+    return [p["content"] for p in emulator.delivered(webhook_id)]
+
+
+def test_breaker_opens_probes_and_recovers():
+    breaker = CircuitBreaker(threshold=2, probe_min=10, probe_max=40)
+    assert not breaker.failure("404", now=0)
+    assert breaker.failure("404", now=0) and breaker.state == CircuitBreaker.OPEN
+    assert not breaker.available(now=5) and not breaker.allow(now=5)
+    assert breaker.allow(now=10) and breaker.state == CircuitBreaker.HALF_OPEN
+    # La prueba falla: se reabre con el doble de espera
+    breaker.failure("404", now=10)
+    assert breaker.state == CircuitBreaker.OPEN and breaker.next_probe == 30
+    assert breaker.allow(now=30) and breaker.success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.backoff == 10
+
+
+def test_bucket_waits_for_reset_and_retry_after():
+    bucket = RateLimitBucket()
+    bucket.update({"X-RateLimit-Limit": "2", "X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "1.5"},
+                  now=100)
+    assert bucket.wait_time(now=100) == 1.5
+    assert bucket.available(now=102) == 2
+    bucket.block(3, now=102)
+    assert bucket.wait_time(now=102) == 3
+
+
+def test_pack_embeds_respects_discord_limits():
+    embeds = [{"description": "x" * 1000} for _ in range(25)]
+    packs = list(pack_embeds(embeds))
+    assert sum(len(p) for p in packs) == 25
+    assert all(len(p) <= 10 and sum(len(e["description"]) for e in p) <= 6000 for p in packs)
+
+
+def test_pool_spreads_over_urls_and_keeps_order_per_key(discord):
+    pool = WebhookPool([discord.url("1"), discord.url("2")], name="t")
+    for i in range(20):
+        pool.submit(f"game{i % 4}", payload(f"game{i % 4}:{i}"))
+    assert pool.drain(10)
+    pool.close()
+    sent = contents(discord)
+    assert sorted(sent) == sorted(f"game{i % 4}:{i}" for i in range(20))
+    for game in range(4):
+        own = [int(text.split(":")[1]) for text in sent if text.startswith(f"game{game}:")]
+        assert own == sorted(own)
+
+
+def test_pool_respects_429_without_losing_messages():
+    from discord_emulator import DiscordEmulator
+    emulator = DiscordEmulator(limit=3, window=0.3)
+    try:
+        pool = WebhookPool(emulator.url(), name="t")
+        for i in range(8):
+            pool.submit("k", payload(str(i)))
+        assert pool.drain(10)
+        pool.close()
+        assert contents(emulator) == [str(i) for i in range(8)]
+    finally:
+        emulator.close()
+
+
+def test_revoked_url_is_diverted_to_healthy_one(discord):
+    discord.revoke("1")
+    alerts = []
+    pool = WebhookPool([discord.url("1"), discord.url("2")], name="t", notify=alerts.append,
+                       breaker={"threshold": 1, "probe_min": 60})
+    for i in range(10):
+        pool.submit(f"k{i}", payload(str(i)))
+    assert pool.drain(10)
+    pool.close()
+    assert sorted(contents(discord, "2"), key=int) == [str(i) for i in range(10)]
+    assert pool.lanes[0].breaker.state == CircuitBreaker.OPEN
+    assert any("desactivado" in text for text in alerts)
+
+
+def test_fallback_takes_traffic_when_all_urls_fail(discord, tmp_path):
+    discord.revoke("1")
+    pool = WebhookPool(discord.url("1"), name="t", fallback=discord.url("9"), spool=str(tmp_path / "s.jsonl"),
+                       notify=lambda text: None, breaker={"threshold": 1, "probe_min": 60})
+    for i in range(5):
+        pool.submit("k", payload(str(i)))
+    assert pool.drain(10)
+    pool.close()
+    assert contents(discord, "9") == [str(i) for i in range(5)]
+    assert pool.spooled == 0 and pool.lost == 0
+
+
+def test_spool_keeps_messages_and_next_pool_replays_them(discord, tmp_path):
+    path = str(tmp_path / "s.jsonl")
+    discord.revoke("1")
+    dead = WebhookPool(discord.url("1"), name="t", spool=path, notify=lambda text: None,
+                       breaker={"threshold": 1, "probe_min": 60})
+    for i in range(5):
+        dead.submit("k", payload(str(i)))
+    assert dead.drain(10)
+    dead.close()
+    assert dead.spooled == 5 and len(Spool.open(path)) == 5
+    with open(path, encoding="utf-8") as f:
+        assert [json.loads(line)["payload"]["content"] for line in f] == [str(i) for i in range(5)]
+
+    alive = WebhookPool(discord.url("2"), name="t", spool=path)
+    assert wait_for(lambda: len(contents(discord, "2")) == 5)
+    alive.close()
+    assert contents(discord, "2") == [str(i) for i in range(5)]
+    assert len(Spool.open(path)) == 0
+
+
+def test_spool_is_shared_per_path(tmp_path):
+    path = str(tmp_path / "s.jsonl")
+    first = Spool.open(path)
+    assert Spool.open(str(tmp_path / "." / "s.jsonl")) is first
+    first.append("k", payload("x"))
+    assert Spool.open(path).take() == [("k", payload("x"))]
+
+
+def test_hard_failure_on_only_url_backs_off(discord, monkeypatch):
+    monkeypatch.setattr(webhooks, "RETRY_DELAY", 0.2)
+    discord.revoke("1")
+    pool = WebhookPool(discord.url("1"), name="t", notify=lambda text: None,
+                       breaker={"threshold": 3, "probe_min": 60})
+    start = time.monotonic()
+    pool.submit("k", payload("x"))
+    assert wait_for(lambda: pool.lanes[0].breaker.state == CircuitBreaker.OPEN)
+    # Dos reintentos con espera 0.2 y 0.4 antes de abrir, no tres POST seguidos
+    assert time.monotonic() - start >= 0.55
+    assert discord.stats()["requests"] == 3
+    pool.close(1)
@@ -0,0 +1,312 @@
+import array
+import fnmatch
+import logging
+import os
+import re
+import threading
+import time
+
+from geoip import ip_to_int
+from pipeline import EventType
+from sinks import close_pool
+from webhooks import WebhookPool
+
+log = logging.getLogger("watchlist")
+
+
+# ==========================
+#  TRIE DE PREFIJOS CIDR
+# ==========================
+
+class CidrTrie:
+    """Trie binario de prefijos IPv4 en arrays planos (sin un objeto por nodo).
+
+    ``lookup`` recorre como mucho un bit por nivel hasta el prefijo mas
+    largo almacenado: O(longitud del prefijo), independiente del numero de
+    rangos cargados.
+    """
+
+    def __init__(self):
+        self.left = array.array("i", [-1])
+        self.right = array.array("i", [-1])
+        self.value = array.array("i", [-1])
+        self.reasons = []
+
+    def _new_node(self):
+        self.left.append(-1)
+        self.right.append(-1)
+        self.value.append(-1)
+        return len(self.value) - 1
+
+    def insert(self, network, prefix_len, reason):
+        node = 0
+        for bit in range(prefix_len):
+            if (network >> (31 - bit)) & 1:
+                child = self.right[node]
+                if child < 0:
+                    child = self._new_node()
+                    self.right[node] = child
+            else:
+                child = self.left[node]
+                if child < 0:
+                    child = self._new_node()
+                    self.left[node] = child
+            node = child
+        self.reasons.append(reason)
+        self.value[node] = len(self.reasons) - 1
+
+    def lookup(self, ip):
+        # Devuelve el motivo del rango mas especifico que contiene la IP
+        n = ip if isinstance(ip, int) else ip_to_int(ip)
+        if n is None:
+            return None
+        node = 0
+        found = self.value[0]
+        for bit in range(32):
+            node = self.right[node] if (n >> (31 - bit)) & 1 else self.left[node]
+            if node < 0:
+                break
+            if self.value[node] >= 0:
+                found = self.value[node]
+        return self.reasons[found] if found >= 0 else None
+
+    def __len__(self):
+        return len(self.reasons)
+
+
+# ==========================
+#  NOMBRES
+# ==========================
+
+class NameIndex:
+    """Nombres sin distinguir mayusculas; admite comodines ``*`` y ``?``.
+
+    Los nombres exactos van a un conjunto (O(1)); los patrones ``prefijo*``
+    y ``*sufijo`` a sendos tries de caracteres (el de sufijos con las claves
+    invertidas), ambos O(longitud del nombre). Solo los comodines generales
+    (``?``, ``a*b``...) se compilan en una sola regex, cuyo coste crece con
+    el numero de patrones: conviene que sean pocos.
+    """
+
+    def __init__(self):
+        self.exact = {}
+        self.prefixes = {}
+        self.suffixes = {}
+        self.patterns = []
+        self._regex = None
+
+    def add(self, pattern, reason):
+        key = pattern.casefold()
+        if "*" not in key and "?" not in key:
+            self.exact[key] = reason
+        elif "?" in key or key.count("*") != 1 or key == "*":
+            self.patterns.append((key, reason))
+            self._regex = None
+        elif key.endswith("*"):
+            _trie_add(self.prefixes, key[:-1], reason)
+        elif key.startswith("*"):
+            _trie_add(self.suffixes, reversed(key[1:]), reason)
+        else:
+            self.patterns.append((key, reason))
+            self._regex = None
+
+    def _compiled(self):
+        if self._regex is None and self.patterns:
+            parts = [f"(?P<p{i}>{fnmatch.translate(p)})" for i, (p, _) in enumerate(self.patterns)]
+            self._regex = re.compile("|".join(parts))
+        return self._regex
+
+    def lookup(self, name):
+        key = name.casefold()
+        reason = self.exact.get(key)
+        if reason is not None:
+            return reason
+        reason = _trie_match(self.prefixes, key)
+        if reason is not None:
+            return reason
+        reason = _trie_match(self.suffixes, reversed(key))
+        if reason is not None:
+            return reason
+        regex = self._compiled()
+        if regex is not None:
+            m = regex.match(key)
+            if m:
+                return self.patterns[int(m.lastgroup[1:])][1]
+        return None
+
+    def __len__(self):
+        return (len(self.exact) + len(self.patterns)
+                + _count_prefixes(self.prefixes) + _count_prefixes(self.suffixes))
+
+
+def _trie_add(trie, chars, reason):
+    node = trie
+    for ch in chars:
+        node = node.setdefault(ch, {})
+    node[""] = reason
+
+
+def _trie_match(trie, chars):
+    # Devuelve el motivo del primer (mas corto) patron que casa como prefijo
+    node = trie
+    for ch in chars:
+        if "" in node:
+            return node[""]
+        node = node.get(ch)
+        if node is None:
+            return None
+    return node.get("")
+
+
+def _count_prefixes(node):
+    return sum(1 if k == "" else _count_prefixes(v) for k, v in node.items())
+
+
+# ==========================
+#  CARGA DE LISTAS
+# ==========================
+
+def _entries(path):
+    # Una entrada por linea; "# motivo" opcional al final; lineas "#" ignoradas
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            value, _, reason = line.partition("#")
+            yield value.strip(), reason.strip() or value.strip()
+
+
+def load_names(path):
+    index = NameIndex()
+    for value, reason in _entries(path):
+        index.add(value, reason)
+    return index
+
+
+def load_ranges(path):
+    trie = CidrTrie()
+    for value, reason in _entries(path):
+        network, _, length = value.partition("/")
+        n = ip_to_int(network)
+        if n is None:
+            log.warning(f"Rango no valido en {path}: {value}")
+            continue
+        prefix_len = int(length) if length.isdigit() else 32
+        prefix_len = max(0, min(32, prefix_len))
+        mask = (0xFFFFFFFF << (32 - prefix_len)) & 0xFFFFFFFF if prefix_len else 0
+        trie.insert(n & mask, prefix_len, reason)
+    return trie
+
+
+# ==========================
+#  WATCHLIST
+# ==========================
+
+class Watchlist:
+    """Etapa de enriquecimiento que comprueba cada entrada de jugador.
+
+    Si el nombre o la IP estan en las listas, marca ``ev.alert`` y envia una
+    alerta prioritaria a su propio webhook (pool independiente, no bloquea).
+    Las listas se recargan en caliente al cambiar los archivos.
+    """
+
+    def __init__(self, names_file=None, ranges_file=None, webhook=None, reload_interval=10.0, mention=""):
+        self.names_file = names_file
+        self.ranges_file = ranges_file
+        self.reload_interval = float(reload_interval)
+        self.mention = mention
+        self.names = NameIndex()
+        self.ranges = CidrTrie()
+        self.alerts = 0
+        self.dropped = 0
+        self._mtimes = {}
+        self.pool = None
+        if webhook:
+            self.pool = WebhookPool(webhook, name="watchlist")
+        self.reload()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._watch, name="watchlist-reload", daemon=True)
+        self._thread.start()
+
+    def _mtime(self, path):
+        try:
+            return os.path.getmtime(path) if path else None
+        except OSError:
+            return None
+
+    def reload(self):
+        # Las listas nuevas se construyen aparte y se cambian de una vez
+        for attr, path, loader in (("names", self.names_file, load_names),
+                                   ("ranges", self.ranges_file, load_ranges)):
+            mtime = self._mtime(path)
+            if mtime is None or self._mtimes.get(path) == mtime:
+                continue
+            try:
+                start = time.perf_counter()
+                index = loader(path)
+                setattr(self, attr, index)
+                self._mtimes[path] = mtime
+                log.info(f"Watchlist: {len(index)} entradas cargadas desde {path} "
+                         f"en {time.perf_counter() - start:.2f}s")
+            except Exception as e:
+                log.error(f"Watchlist: error cargando {path}: {e}", exc_info=True)
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            self.reload()
+
+    def check(self, user, ip):
+        reason = self.names.lookup(user) if user else None
+        if reason is not None:
+            return f"nombre {user} ({reason})"
+        reason = self.ranges.lookup(ip) if ip else None
+        if reason is not None:
+            return f"IP {ip} ({reason})"
+        return None
+
+    def __call__(self, ev):
+        if ev.type == EventType.JOIN and ev.user:
+            hit = self.check(ev.user, ev.ip)
+            if hit:
+                ev.alert = hit
+                self.alert(ev, hit)
+        return ev
+
+    def alert(self, ev, hit):
+        self.alerts += 1
+        text = f"🚨 Watchlist [{ev.bot}] {ev.game or ''}: {ev.user} ({ev.ip}) — {hit}"
+        log.warning(text)
+        if self.pool:
+            content = f"{self.mention} {text}".strip()
+            mentions = {"parse": ["everyone", "roles"]} if self.mention else {"parse": []}
+            # timeout=0: con el webhook limitado o caido la alerta se descarta,
+            # el hilo del monitor nunca espera a que haya sitio
+            if not self.pool.submit("watchlist", {"content": content[:2000], "allowed_mentions": mentions},
+                                    timeout=0):
+                self.dropped += 1
+                if self.dropped % 100 == 1:
+                    log.warning(f"Watchlist: cola del webhook llena, alertas descartadas: {self.dropped}")
+
+    def close(self, timeout=5.0):
+        self._stop.set()
+        self._thread.join(1.0)
+        if self.pool:
+            close_pool(self.pool, timeout)
+
+
+def watchlist_from_config(config):
+    # [WATCHLIST] names_file, ranges_file, webhook, mention, reload_interval
+    if config is None:
+        return None
+    names_file = config.get("WATCHLIST", "names_file", "")
+    ranges_file = config.get("WATCHLIST", "ranges_file", "")
+    if not names_file and not ranges_file:
+        return None
+    return Watchlist(
+        names_file=names_file or None,
+        ranges_file=ranges_file or None,
+        webhook=config.get("WATCHLIST", "webhook", "") or None,
+        reload_interval=config.get("WATCHLIST", "reload_interval", "10"),
+        mention=config.get("WATCHLIST", "mention", ""),
+    )
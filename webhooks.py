@@ -0,0 +1,713 @@
+import collections
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+
+import requests
+
+log = logging.getLogger("webhooks")
+
+MAX_RETRIES = 5
+
+# Espera antes de reintentar en la misma URL un fallo duro que aun no abre el
+# cortacircuitos (se duplica con cada fallo seguido, hasta probe_min)
+RETRY_DELAY = 1.0
+
+# Respuestas que indican un webhook borrado o con token invalido: reintentar no sirve
+HARD_FAILURES = (401, 403, 404)
+HARD = "hard"
+
+# Limites de la API de Discord para embeds
+EMBEDS_PER_MESSAGE = 10
+EMBED_TOTAL_CHARS = 6000
+
+
+def webhook_urls(value):
+    # "webhook" en settings.json puede ser una URL, una lista de URLs o
+    # varias URLs separadas por comas (como se muestran en la GUI)
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [url.strip() for url in value if url and url.strip()]
+
+
+def webhook_display(value):
+    return ", ".join(webhook_urls(value))
+
+
+def webhook_id(url):
+    # Identificador del webhook sin el token (para logs y estadisticas)
+    parts = url.rstrip("/").split("/")
+    return parts[-2] if len(parts) >= 2 else url
+
+
+# ==========================
+#  EMBEDS
+# ==========================
+
+# Colores por tipo de evento y, para el chat, por canal (como los emoji de las plantillas)
+EMBED_COLORS = {
+    "status": 0x7F8C8D,
+    "create": 0xF1C40F,
+    "join": 0x2ECC71,
+    "leave": 0x992D22,
+    "digest": 0x5865F2,
+}
+CHAT_COLORS = {
+    "All": 0xF39C12,      # 🔼
+    "Allies": 0x3498DB,   # 🟦
+    "Team": 0xE74C3C,     # 🟥
+    "Lobby": 0x95A5A6,
+    "Observer": 0x9B59B6,
+}
+EMBED_TITLES = {
+    "status": "Estado",
+    "create": "Partida creada",
+    "join": "Jugador conectado",
+    "leave": "Jugador desconectado",
+    "digest": "Resumen de partida",
+}
+
+
+def _field(name, value, inline=True):
+    return {"name": name, "value": str(value)[:1024], "inline": inline}
+
+
+def build_embed(ev):
+    # Un evento -> un embed de Discord (titulo, color y campos segun el tipo)
+    kind = ev.type.name.lower()
+    embed = {"footer": {"text": ev.bot or ""}}
+    if ev.ts:
+        embed["timestamp"] = datetime.datetime.fromtimestamp(ev.ts, datetime.timezone.utc).isoformat()
+    if kind == "chat":
+        embed["title"] = f"[{ev.channel}] {ev.game}"[:256]
+        embed["color"] = CHAT_COLORS.get(ev.channel, 0xFFFFFF)
+        embed["author"] = {"name": (ev.user or "?")[:256]}
+        embed["description"] = (ev.text or "")[:4096]
+        return embed
+    embed["title"] = EMBED_TITLES.get(kind, kind)
+    embed["color"] = EMBED_COLORS.get(kind, 0xFFFFFF)
+    embed["description"] = (ev.message or ev.text or "")[:4096]
+    fields = []
+    if ev.game and kind != "create":
+        fields.append(_field("Partida", ev.game, inline=False))
+    elif ev.game:
+        fields.append(_field("Partida", ev.game))
+    if ev.user:
+        fields.append(_field("Jugador", ev.user))
+    if ev.ip:
+        fields.append(_field("IP", ev.ip))
+    if ev.country:
+        fields.append(_field("País", ev.country))
+    if ev.asn:
+        fields.append(_field("ASN", ev.asn))
+    if fields:
+        embed["fields"] = fields
+    return embed
+
+
+def embed_size(embed):
+    # Caracteres que Discord cuenta para el limite de 6000 por mensaje
+    size = len(embed.get("title", "")) + len(embed.get("description", ""))
+    size += len(embed.get("footer", {}).get("text", "")) + len(embed.get("author", {}).get("name", ""))
+    for f in embed.get("fields", ()):
+        size += len(f["name"]) + len(f["value"])
+    return size
+
+
+def pack_embeds(embeds):
+    # Agrupa embeds en mensajes de hasta 10 embeds y 6000 caracteres
+    batch, total = [], 0
+    for embed in embeds:
+        size = embed_size(embed)
+        if batch and (len(batch) >= EMBEDS_PER_MESSAGE or total + size > EMBED_TOTAL_CHARS):
+            yield batch
+            batch, total = [], 0
+        batch.append(embed)
+        total += size
+    if batch:
+        yield batch
+
+
+# ==========================
+#  LIMITE DE TASA POR URL
+# ==========================
+
+class RateLimitBucket:
+    """Presupuesto de envios de un webhook segun las cabeceras de Discord.
+
+    Usa ``X-RateLimit-Remaining``/``X-RateLimit-Reset-After`` de cada
+    respuesta y ``retry_after`` de los 429.
+    """
+
+    def __init__(self, default_limit=5):
+        self.limit = default_limit
+        self.remaining = default_limit
+        self.reset_at = 0.0
+        self.blocked_until = 0.0
+
+    def update(self, headers, now=None):
+        now = time.monotonic() if now is None else now
+        try:
+            if "X-RateLimit-Limit" in headers:
+                self.limit = int(headers["X-RateLimit-Limit"])
+            if "X-RateLimit-Remaining" in headers:
+                self.remaining = int(headers["X-RateLimit-Remaining"])
+            if "X-RateLimit-Reset-After" in headers:
+                self.reset_at = now + float(headers["X-RateLimit-Reset-After"])
+        except (TypeError, ValueError):
+            pass
+
+    def block(self, seconds, now=None):
+        now = time.monotonic() if now is None else now
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.remaining = 0
+
+    def available(self, now=None):
+        now = time.monotonic() if now is None else now
+        if now >= self.reset_at and now >= self.blocked_until:
+            return self.limit
+        return self.remaining
+
+    def wait_time(self, now=None):
+        # Segundos hasta poder enviar el siguiente mensaje
+        now = time.monotonic() if now is None else now
+        wait = max(0.0, self.blocked_until - now)
+        if self.remaining <= 0 and now < self.reset_at:
+            wait = max(wait, self.reset_at - now)
+        return wait
+
+    def consume(self, now=None):
+        now = time.monotonic() if now is None else now
+        if now >= self.reset_at and now >= self.blocked_until:
+            self.remaining = self.limit
+        self.remaining -= 1
+
+
+# ==========================
+#  CORTACIRCUITOS POR URL
+# ==========================
+
+class CircuitBreaker:
+    """Salud de una URL: cerrado (normal), abierto (sin envios) o semiabierto.
+
+    Tras ``threshold`` fallos duros seguidos (401/403/404 o error de
+    conexion) se abre y deja de recibir mensajes. Pasado ``backoff``
+    segundos admite un envio de prueba: si funciona se cierra, si no vuelve
+    a abrirse con el doble de espera (hasta ``probe_max``).
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, threshold=3, probe_min=30.0, probe_max=1800.0):
+        self.threshold = max(1, int(threshold))
+        self.probe_min = float(probe_min)
+        self.probe_max = float(probe_max)
+        self.state = self.CLOSED
+        self.failures = 0
+        self.backoff = self.probe_min
+        self.next_probe = 0.0
+        self.opened = 0
+        self.last_error = ""
+
+    def available(self, now=None):
+        # Puede recibir mensajes nuevos del pool
+        now = time.monotonic() if now is None else now
+        return self.state == self.CLOSED or (self.state == self.OPEN and now >= self.next_probe)
+
+    def allow(self, now=None):
+        # Llamado por el hilo del carril antes de cada envio
+        now = time.monotonic() if now is None else now
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and now >= self.next_probe:
+            self.state = self.HALF_OPEN
+            return True
+        return False
+
+    def success(self):
+        # Devuelve True si el webhook se acaba de recuperar
+        recovered = self.state != self.CLOSED
+        self.state = self.CLOSED
+        self.failures = 0
+        self.backoff = self.probe_min
+        return recovered
+
+    def failure(self, error, now=None):
+        # Devuelve True solo al pasar de cerrado a abierto (una alerta por caida)
+        now = time.monotonic() if now is None else now
+        self.last_error = error
+        self.failures += 1
+        if self.state == self.HALF_OPEN:
+            self.backoff = min(self.backoff * 2, self.probe_max)
+            self.state = self.OPEN
+            self.next_probe = now + self.backoff
+            return False
+        if self.state == self.CLOSED and self.failures >= self.threshold:
+            self.state = self.OPEN
+            self.opened += 1
+            self.next_probe = now + self.backoff
+            return True
+        return False
+
+
+class Spool:
+    """Mensajes que no se pudieron entregar, en JSONL, para reenviarlos luego.
+
+    Usar ``Spool.open(ruta)``: un solo objeto (y un solo lock) por archivo en
+    todo el proceso, asi el pool de un monitor reiniciado y el del anterior,
+    que aun se esta cerrando, no se pisan al escribir y al reenviar.
+    """
+
+    _open = weakref.WeakValueDictionary()
+    _open_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path):
+        key = os.path.normcase(os.path.abspath(path))
+        with cls._open_lock:
+            spool = cls._open.get(key)
+            if spool is None:
+                spool = cls._open[key] = cls(path)
+            return spool
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.count = 0
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                self.count = sum(1 for _ in f)
+
+    def append(self, key, payload):
+        line = json.dumps({"key": key, "payload": payload, "ts": time.time()}, ensure_ascii=False)
+        with self.lock:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self.count += 1
+
+    def take(self):
+        # Saca todos los mensajes guardados (el archivo se borra)
+        with self.lock:
+            if not os.path.exists(self.path):
+                return []
+            items = []
+            with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        continue
+                    items.append((item.get("key"), item.get("payload")))
+            os.remove(self.path)
+            self.count = 0
+            return items
+
+    def __len__(self):
+        return self.count
+
+
+# ==========================
+#  CARRIL (UNA URL)
+# ==========================
+
+class WebhookLane:
+    # Una URL con su sesion HTTP, su presupuesto y su hilo de envio
+    def __init__(self, pool, url, index):
+        self.pool = pool
+        self.url = url
+        self.bucket = RateLimitBucket()
+        self.breaker = CircuitBreaker(**pool.breaker_options)
+        self.queue = collections.deque()
+        self.session = requests.Session()
+        self.busy = False
+        # Inicio del POST en curso (0 si no hay): las esperas por 429 no cuentan como envio colgado
+        self.posting_since = 0.0
+        self.sent = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self._thread = threading.Thread(target=self._run, name=f"webhook-{pool.name}-{index}", daemon=True)
+        self._thread.start()
+
+    def backlog(self):
+        return len(self.queue) + (1 if self.busy else 0)
+
+    def score(self, now):
+        # Menor es mejor: espera por limite de tasa y mensajes que exceden el presupuesto
+        backlog = self.backlog()
+        over = max(0, backlog + 1 - self.bucket.available(now))
+        return (self.bucket.wait_time(now) + over, backlog)
+
+    def _run(self):
+        cond = self.pool.cond
+        while True:
+            with cond:
+                while not self.queue and not self.pool.closed:
+                    cond.wait()
+                if not self.queue:
+                    return
+                key, payload = self.queue.popleft()
+                self.busy = True
+            result = HARD
+            recovered = False
+            try:
+                if self.breaker.allow():
+                    result = self._send(payload)
+                    if result is not HARD:
+                        # Cualquier respuesta que no sea 401/403/404 prueba que el webhook existe
+                        recovered = self.breaker.success()
+            finally:
+                with cond:
+                    self.busy = False
+                    if result is HARD:
+                        # Este mensaje y los que esperan en el carril van a otro destino
+                        self.pool.divert(self, key, payload)
+                    else:
+                        self.pool.release(key)
+                    cond.notify_all()
+            self.pool.flush_overflow()
+            if recovered:
+                self.pool.recovered(self)
+            if result is True and self.pool.spool is not None and len(self.pool.spool):
+                self.pool.replay_spool()
+
+    def _fail(self, error):
+        self.failed += 1
+        if self.breaker.failure(error):
+            self.pool.opened(self)
+        return HARD
+
+    def _send(self, payload):
+        for attempt in range(MAX_RETRIES):
+            wait = self.bucket.wait_time()
+            if wait > 0:
+                time.sleep(wait)
+            self.bucket.consume()
+            self.posting_since = time.monotonic()
+            try:
+                res = self.session.post(self.url, json=payload, timeout=self.pool.timeout)
+            except Exception as e:
+                log.error(f"Webhook {self.pool.name}: send error: {e}", exc_info=True)
+                return self._fail(f"error de conexion: {e}")
+            finally:
+                self.posting_since = 0.0
+            self.bucket.update(res.headers)
+            if res.status_code in (200, 204):
+                self.sent += 1
+                return True
+            if res.status_code == 429:
+                # Reintentar en este mismo carril para no romper el orden
+                self.rate_limited += 1
+                self.bucket.block(_retry_after(res))
+                continue
+            if res.status_code in HARD_FAILURES:
+                log.error(f"Webhook {self.pool.name} ({webhook_id(self.url)}): error {res.status_code}")
+                return self._fail(f"HTTP {res.status_code}")
+            self.failed += 1
+            log.error(f"Webhook {self.pool.name}: error {res.status_code}: {res.text}")
+            return False
+        self.failed += 1
+        log.error(f"Webhook {self.pool.name}: descartado tras {MAX_RETRIES} respuestas 429")
+        return False
+
+    def close(self):
+        self.session.close()
+
+
+def _retry_after(res):
+    try:
+        return float(res.json().get("retry_after", 1.0))
+    except Exception:
+        try:
+            return float(res.headers.get("Retry-After", 1.0))
+        except (TypeError, ValueError):
+            return 1.0
+
+
+# ==========================
+#  POOL DE WEBHOOKS
+# ==========================
+
+class WebhookPool:
+    """Reparte los envios de un bot entre varias URLs del mismo canal.
+
+    Cada mensaje lleva una clave (la partida). Mientras una clave tiene
+    mensajes pendientes queda fijada a su carril, asi se respeta el orden por
+    partida; cuando su carril se vacia, el siguiente mensaje va al carril con
+    mas presupuesto disponible.
+
+    Una URL con el cortacircuitos abierto (webhook borrado o revocado) deja
+    de recibir mensajes y los suyos pasan a las URLs sanas; si no queda
+    ninguna, al webhook ``fallback`` (si su cola tiene sitio) o, en su
+    defecto, al ``spool`` en disco, que se reenvia en cuanto alguna URL
+    vuelve a responder. El respaldo guarda lo suyo en otro spool
+    (``<spool>-fallback.jsonl``).
+    """
+
+    def __init__(self, urls, name="webhook", timeout=10, max_pending=1000, fallback=None, spool=None,
+                 notify=None, breaker=None):
+        self.name = name
+        self.timeout = float(timeout)
+        self.max_pending = int(max_pending)
+        self.cond = threading.Condition()
+        self.closed = False
+        self.notify = notify
+        self.breaker_options = dict(breaker or {})
+        self.spool = Spool.open(spool) if isinstance(spool, str) else spool
+        self.fallback = None
+        if webhook_urls(fallback):
+            # Spool propio: cada archivo guarda mensajes de un solo destino y un solo escritor
+            fallback_spool = None
+            if self.spool is not None:
+                root, ext = os.path.splitext(self.spool.path)
+                fallback_spool = f"{root}-fallback{ext}"
+            self.fallback = WebhookPool(fallback, name=f"{name}-fallback", timeout=timeout,
+                                        max_pending=max_pending, spool=fallback_spool, notify=notify,
+                                        breaker=breaker)
+        self.diverted = 0
+        self.spooled = 0
+        self.lost = 0
+        self._replaying = False
+        self._pins = {}
+        # Mensajes sin URL sana apartados con self.cond tomado; van al respaldo o al
+        # spool fuera de el (flush_overflow), en orden gracias a _overflow_lock
+        self._overflowed = collections.deque()
+        self._overflow_lock = threading.Lock()
+        self.lanes = [WebhookLane(self, url, i) for i, url in enumerate(webhook_urls(urls))]
+        if not self.lanes:
+            raise ValueError("WebhookPool necesita al menos una URL")
+        if self.spool is not None and len(self.spool):
+            # Mensajes que quedaron pendientes de una ejecucion anterior
+            self.replay_spool()
+
+    def submit(self, key, payload, timeout=None):
+        # Bloquea solo si el pool entero esta lleno (el hilo del sink, nunca el del parser)
+        with self.cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self.pending() >= self.max_pending and not self.closed:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+            if self.closed:
+                return False
+            self._dispatch(key, payload)
+            self.cond.notify_all()
+        self.flush_overflow()
+        return True
+
+    def _dispatch(self, key, payload, exclude=None):
+        # Llamado con self.cond tomado
+        pin = self._pins.get(key)
+        if pin is not None:
+            pin[0].queue.append((key, payload))
+            pin[1] += 1
+            return
+        now = time.monotonic()
+        healthy = [lane for lane in self.lanes if lane is not exclude and lane.breaker.available(now)]
+        if not healthy:
+            self._overflowed.append((key, payload))
+            return
+        lane = min(healthy, key=lambda ln: ln.score(now))
+        self._pins[key] = [lane, 1]
+        lane.queue.append((key, payload))
+
+    def release(self, key):
+        # Llamado con self.cond tomado
+        pin = self._pins.get(key)
+        if pin is not None:
+            pin[1] -= 1
+            if pin[1] <= 0:
+                del self._pins[key]
+
+    def divert(self, lane, key, payload):
+        # Llamado con self.cond tomado: el carril acaba de fallar (401/403/404
+        # o sin conexion); el mensaje y su cola se reparten en orden entre el resto
+        now = time.monotonic()
+        others = any(ln is not lane and ln.breaker.available(now) for ln in self.lanes)
+        if lane.breaker.state == CircuitBreaker.CLOSED and not others:
+            # Aun no llega al umbral y no hay otra URL: reintentar en este carril,
+            # pero tras una espera (el hilo la cumple en _send, fuera del cond)
+            breaker = lane.breaker
+            lane.bucket.block(min(RETRY_DELAY * 2 ** max(0, breaker.failures - 1), breaker.probe_min), now)
+            lane.queue.appendleft((key, payload))
+            return
+        self.release(key)
+        moved = [(key, payload)] + list(lane.queue)
+        lane.queue.clear()
+        for k in {k for k, _ in moved[1:]}:
+            self._pins.pop(k, None)
+        self.diverted += len(moved)
+        for k, p in moved:
+            self._dispatch(k, p, exclude=lane)
+
+    def flush_overflow(self):
+        # Sin self.cond tomado: los carriles siguen enviando mientras se escribe el spool
+        with self._overflow_lock:
+            while True:
+                with self.cond:
+                    if not self._overflowed:
+                        return
+                    key, payload = self._overflowed[0]
+                self.overflow(key, payload)
+                with self.cond:
+                    # Sigue contando como pendiente hasta quedar guardado (drain lo espera)
+                    self._overflowed.popleft()
+                    self.cond.notify_all()
+
+    def overflow(self, key, payload):
+        # Sin URLs sanas: webhook de respaldo (si tiene sitio, sin esperar), spool en disco o descarte
+        if self.fallback is not None and self.fallback.submit(key, payload, timeout=0):
+            return
+        self.store(key, payload)
+
+    def store(self, key, payload):
+        # Spool en disco o, sin el, descarte
+        if self.spool is not None:
+            try:
+                self.spool.append(key, payload)
+                self.spooled += 1
+                return
+            except Exception as e:
+                log.error(f"Webhook {self.name}: no se pudo guardar en spool: {e}", exc_info=True)
+        self.lost += 1
+
+    def replay_spool(self):
+        # Reenvia lo guardado en el spool desde un hilo aparte (submit puede bloquear)
+        with self.cond:
+            if self._replaying or self.spool is None or self.closed:
+                return
+            self._replaying = True
+
+        def run():
+            try:
+                items = self.spool.take()
+                if items:
+                    log.info(f"Webhook {self.name}: reenviando {len(items)} mensajes del spool")
+                for key, payload in items:
+                    if not self.submit(key, payload):
+                        self.spool.append(key, payload)
+            finally:
+                with self.cond:
+                    self._replaying = False
+
+        threading.Thread(target=run, name=f"webhook-{self.name}-spool", daemon=True).start()
+
+    def opened(self, lane):
+        healthy = sum(1 for ln in self.lanes if ln.breaker.state == CircuitBreaker.CLOSED)
+        if healthy:
+            target = f"se reparte entre {healthy} URL(s) sanas"
+        elif self.fallback is not None:
+            target = "se desvia al webhook de respaldo"
+        elif self.spool is not None:
+            target = f"se guarda en {self.spool.path}"
+        else:
+            target = "se descarta"
+        self._alert(f"⚠️ Webhook {self.name} ({webhook_id(lane.url)}) desactivado tras "
+                    f"{lane.breaker.failures} fallos ({lane.breaker.last_error}); "
+                    f"el trafico {target}. Se volvera a probar en {lane.breaker.backoff:.0f}s")
+
+    def recovered(self, lane):
+        self._alert(f"✅ Webhook {self.name} ({webhook_id(lane.url)}) responde de nuevo")
+
+    def _alert(self, text):
+        log.warning(text)
+        if self.notify:
+            try:
+                self.notify(text)
+            except Exception as e:
+                log.error(f"Webhook {self.name}: error notificando alerta: {e}", exc_info=True)
+
+    def pending(self):
+        return sum(lane.backlog() for lane in self.lanes) + len(self._overflowed)
+
+    def hung(self, limit, now=None):
+        # Carriles que llevan mas de ``limit`` segundos dentro de un mismo POST; un carril
+        # lento (esperando retry_after) o con el cortacircuitos abierto no esta colgado
+        now = time.monotonic() if now is None else now
+        return [lane for lane in self.lanes
+                if lane.posting_since and now - lane.posting_since > limit]
+
+    def abandon(self):
+        # Deja de usar el pool sin esperar: lo que aun no se envio va al spool
+        # (un pool nuevo con el mismo spool lo reenvia al arrancar)
+        with self.cond:
+            items = []
+            for lane in self.lanes:
+                items.extend(lane.queue)
+                lane.queue.clear()
+            self._pins.clear()
+            self.closed = True
+            self.cond.notify_all()
+        # El spool se escribe ya sin self.cond
+        for key, payload in items:
+            self.store(key, payload)
+        if self.fallback is not None:
+            self.fallback.abandon()
+
+    def drain(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while self.pending():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+        if self.fallback is not None:
+            return self.fallback.drain(max(0.0, deadline - time.monotonic()))
+        return True
+
+    def close(self, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        if not self.drain(timeout):
+            # Plazo agotado: lo que sigue en cola va al spool en vez de cortarse al salir
+            self.abandon()
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        for lane in self.lanes:
+            lane._thread.join(timeout=max(0.1, min(1.0, deadline - time.monotonic())))
+            if not lane._thread.is_alive():
+                lane.close()
+        if self.fallback is not None:
+            self.fallback.close(timeout=max(0.0, deadline - time.monotonic()))
+
+    def stats(self):
+        lanes = [{
+            "webhook": webhook_id(lane.url),
+            "state": lane.breaker.state,
+            "queued": lane.backlog(),
+            "sent": lane.sent,
+            "failed": lane.failed,
+            "rate_limited": lane.rate_limited,
+            "remaining": lane.bucket.remaining,
+            "opened": lane.breaker.opened,
+        } for lane in self.lanes]
+        if self.fallback is not None:
+            for item in self.fallback.stats():
+                item["fallback"] = True
+                lanes.append(item)
+        return lanes
+
+    def health(self):
+        health = {
+            "open": sum(1 for lane in self.lanes if lane.breaker.state != CircuitBreaker.CLOSED),
+            "diverted": self.diverted,
+            "spooled": self.spooled,
+            "spool_size": len(self.spool) if self.spool is not None else 0,
+            "lost": self.lost,
+        }
+        if self.fallback is not None:
+            # Lo que el respaldo guarda o pierde cuenta en el total del sink
+            fallback = self.fallback.health()
+            for field in ("spooled", "spool_size", "lost"):
+                health[field] += fallback[field]
+        return health